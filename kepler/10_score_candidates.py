@@ -0,0 +1,238 @@
+"""
+Script 10: Score Candidates
+Batch-score KOIs with the saved model and monitor feature drift inline
+
+Candidates in the kepler_raw.csv format are read in batches of --batch-size
+rows. Each batch is engineered (features.py), missing values are filled with
+the training medians as in training, and the batch is scored with the best
+model from script 4 (or --model). Before scoring, the batch's features are
+added to a DriftMonitor (drift_monitor.py) built on the training histograms
+saved by script 4, and alerts are printed as soon as a feature's PSI or KS
+distance crosses its threshold. A rise in missing values shows up as extra
+mass in the bin holding the median.
+
+With --cascade, batches are scored by the calibrated cascade of script 14
+(cascade.py): the logistic regression scores every row and only rows inside
+its uncertainty band go to the tree ensemble. An `escalated` column marks
+those rows.
+
+With --neighbours K, each batch is also queried against the neighbour index
+saved by script 13 (neighbours.py), and the K most similar CONFIRMED and
+FALSE POSITIVE KOIs in the scaled feature space are written next to the
+prediction. A KOI is never listed as its own neighbour.
+
+Outputs:
+- kepler/scored_candidates.csv: kepoi_name, koi_disposition, koi_period and
+  koi_prad (when present), exoplanet probability and predicted class per
+  candidate (plus escalated
+  with --cascade, and similar_confirmed / similar_false_positive names and
+  nearest distances with --neighbours)
+- kepler/candidate_store/: the same table in columns with precomputed sort
+  orders (candidate_store.py), served by the frontend's /api/candidates
+- kepler/drift_report.json: final PSI/KS per feature, every alert, and the
+  time spent scoring vs monitoring
+
+Usage:
+    python kepler/10_score_candidates.py [--input kepler/kepler_raw.csv] [--batch-size 1000] [--cascade] [--neighbours 5]
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from candidate_store import write_candidate_store, CANDIDATE_STORE_DIR
+from cascade import build_cascade, load_config
+from drift_monitor import DriftMonitor, load_reference
+from features import BASE_FEATURES, engineer_features
+from instrumentation import span
+from neighbours import load_index, NEIGHBOUR_INDEX_FILE
+from preprocessing import load_artifacts, transform_features, MODELS_DIR, DRIFT_REFERENCE_FILE
+
+ID_COLUMNS = ['kepoi_name', 'koi_disposition', 'koi_period', 'koi_prad']
+
+
+def engineer_batch(raw, medians):
+    """
+    Engineered features for a batch of raw candidates.
+
+    Args:
+        raw (pd.DataFrame): Rows in kepler_raw.csv format.
+        medians (pd.Series): Training medians used for missing values.
+
+    Returns:
+        pd.DataFrame: Engineered features (inf kept; cleaning handles it).
+    """
+    df_work = raw[BASE_FEATURES].copy()
+    engineer_features(df_work, verbose=False)
+    return df_work.fillna(medians)
+
+
+def neighbour_columns(index, X, k, exclude=None):
+    """
+    Similar labelled KOIs for a scaled batch, as output columns.
+
+    Returns:
+        dict: similar_<disposition> (';'-joined kepoi_names, nearest first)
+            and similar_<disposition>_distance (distance of the nearest).
+    """
+    columns = {}
+    for disposition, (distances, names) in index.query(X, k, exclude=exclude).items():
+        prefix = 'similar_' + disposition.lower().replace(' ', '_')
+        columns[prefix] = [';'.join(row) for row in names]
+        columns[prefix + '_distance'] = distances[:, 0]
+    return columns
+
+
+def main(input_path, output_path, batch_size, model_name=None, n_neighbours=0, use_cascade=False):
+    print("=" * 80)
+    print("CANDIDATE SCORING")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    cascade = None
+    if use_cascade:
+        config = load_config()
+        cascade = build_cascade(models, config)
+        model_name = f"cascade ({config['first']} -> {config['second']})"
+    else:
+        model_name = model_name or preprocessing['best_model']
+    model = cascade or models[model_name]
+    medians = preprocessing['cleaning']['medians']
+    monitor = DriftMonitor(load_reference(os.path.join(MODELS_DIR, DRIFT_REFERENCE_FILE)))
+    index = None
+    if n_neighbours:
+        index = load_index()
+        if not index.matches(preprocessing):
+            print(f"\n[WARNING] {MODELS_DIR}/{NEIGHBOUR_INDEX_FILE} was built for other models - "
+                  f"rerun kepler/13_neighbour_index.py; scoring without neighbours")
+            index = None
+
+    print(f"\nModel: {model_name}")
+    if cascade is not None:
+        print(f"  Uncertainty band: [{cascade.low:.4f}, {cascade.high:.4f}] "
+              f"({config['escalated_fraction']*100:.1f}% of test rows escalated at calibration)")
+    print(f"Input: {input_path} (batches of {batch_size})")
+    print(f"Drift monitor: {len(monitor.reference.columns)} features, "
+          f"PSI >= {monitor.psi_threshold} or KS >= {monitor.ks_threshold} alerts")
+    if index is not None:
+        print(f"Neighbours: {n_neighbours} per disposition from {index.size} labelled KOIs ({index.kind} index)")
+
+    alerts = []
+    score_seconds = monitor_seconds = neighbour_seconds = 0.0
+    n_rows = n_batches = n_escalated = 0
+    positive_index = list(model.classes_).index(1)
+
+    for batch in pd.read_csv(input_path, chunksize=batch_size):
+        if batch.empty:
+            # A header-only file yields one empty chunk
+            continue
+        start = time.perf_counter()
+        with span('score_batch', model=model_name, rows=len(batch)):
+            features = engineer_batch(batch, medians)
+            X = transform_features(features, preprocessing)
+            if cascade is not None:
+                proba, escalated = cascade.score(X)
+            else:
+                proba = model.predict_proba(X)[:, positive_index]
+        score_seconds += time.perf_counter() - start
+
+        similar = {}
+        if index is not None:
+            start = time.perf_counter()
+            with span('neighbours', rows=len(batch), k=n_neighbours):
+                exclude = batch['kepoi_name'].astype(str).to_numpy() if 'kepoi_name' in batch else None
+                similar = neighbour_columns(index, X, n_neighbours, exclude=exclude)
+            neighbour_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with span('drift_update', rows=len(batch)):
+            new_alerts = monitor.update(features)
+        monitor_seconds += time.perf_counter() - start
+
+        for alert in new_alerts:
+            alert['batch'] = n_batches
+            print(f"  [ALERT] batch {n_batches}: {alert['feature']} drifted "
+                  f"(PSI {alert['psi']:.3f}, KS {alert['ks']:.3f}, {alert['rows_seen']} rows seen)")
+        alerts.extend(new_alerts)
+
+        scored = batch[[col for col in ID_COLUMNS if col in batch.columns]].copy()
+        scored['exoplanet_probability'] = proba
+        scored['predicted_exoplanet'] = (proba >= 0.5).astype(int)
+        if cascade is not None:
+            scored['escalated'] = escalated.astype(int)
+            n_escalated += int(escalated.sum())
+        for name, values in similar.items():
+            scored[name] = values
+        scored.to_csv(output_path, mode='w' if n_batches == 0 else 'a',
+                      header=n_batches == 0, index=False)
+
+        n_rows += len(batch)
+        n_batches += 1
+
+    if n_rows == 0:
+        # Nothing to report; keep the previous output and candidate store
+        print(f"\n[WARNING] No candidates in {input_path} - nothing scored")
+        print("=" * 80)
+        return
+
+    print(f"\nScored {n_rows} candidates in {n_batches} batches")
+    print(f"  Scoring:    {score_seconds:.3f}s")
+    if cascade is not None:
+        print(f"  Escalated:  {n_escalated} ({n_escalated / n_rows * 100:.1f}%) to {config['second']}")
+    print(f"  Monitoring: {monitor_seconds:.3f}s ({monitor_seconds / score_seconds * 100:.1f}% of scoring)")
+    if index is not None:
+        print(f"  Neighbours: {neighbour_seconds:.3f}s ({neighbour_seconds / n_rows * 1e6:.0f} us per candidate)")
+
+    scores = monitor.scores()
+    print(f"\nTop 5 features by PSI:")
+    print(f"  {'Feature':<30} {'PSI':>8} {'KS':>8}")
+    for entry in scores[:5]:
+        flag = '  ALERT' if entry['alert'] else ''
+        print(f"  {entry['feature']:<30} {entry['psi']:>8.4f} {entry['ks']:>8.4f}{flag}")
+    drifting = [entry['feature'] for entry in scores if entry['alert']]
+    if drifting:
+        print(f"\n[WARNING] {len(drifting)} features drifting: {drifting}")
+    else:
+        print(f"\n[OK] No feature drift above the thresholds")
+
+    report = {
+        'input': input_path,
+        'model': model_name,
+        'rows': n_rows,
+        'batches': n_batches,
+        'score_seconds': score_seconds,
+        'monitor_seconds': monitor_seconds,
+        'neighbour_seconds': neighbour_seconds,
+        'escalated_rows': n_escalated if cascade is not None else None,
+        'thresholds': {'psi': monitor.psi_threshold, 'ks': monitor.ks_threshold},
+        'alerts': alerts,
+        'features': scores
+    }
+    with open('kepler/drift_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    with span('candidate_store', rows=n_rows):
+        write_candidate_store(pd.read_csv(output_path))
+
+    print(f"\n[+] Saved: {output_path}")
+    print(f"[+] Saved: {CANDIDATE_STORE_DIR}/")
+    print(f"[+] Saved: kepler/drift_report.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-score candidates with inline drift monitoring")
+    parser.add_argument('--input', default='kepler/kepler_raw.csv',
+                        help="Candidates in kepler_raw.csv format")
+    parser.add_argument('--output', default='kepler/scored_candidates.csv')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--model', default=None, help="Model name (default: best model from script 4)")
+    parser.add_argument('--cascade', action='store_true',
+                        help="Score with the calibrated cascade from script 14 instead of one model")
+    parser.add_argument('--neighbours', type=int, default=0,
+                        help="Similar CONFIRMED / FALSE POSITIVE KOIs to list per candidate (needs script 13)")
+    args = parser.parse_args()
+    main(args.input, args.output, args.batch_size, model_name=args.model,
+         n_neighbours=args.neighbours, use_cascade=args.cascade)
@@ -0,0 +1,214 @@
+"""
+Script 11: Feature Selection
+Rank features by mRMR and report the accuracy / cost of each reduced set
+
+The pairwise feature correlations and the feature-target relevance of the
+training rows are computed once and cached (feature_selection.py). From
+them the features are ranked by max-relevance min-redundancy, and the first
+k of the ranking form the reduced set of size k.
+
+For each subset size, the redundancy-pruned set, and each model saved by
+script 4, a model with the same hyperparameters is measured on:
+- CV accuracy: out-of-fold accuracy over the training rows (CV_FOLDS folds)
+- training time of a single fit on the training rows (also for the full set,
+  so every row of the report is comparable)
+- inference latency: one candidate per call, and per row of a test-set batch
+
+The smallest set whose CV accuracy is within --tolerance of the full set is
+reported as the recommended set for each model. The test set plays no part
+in that choice: it is scored once, for the recommended and the full set.
+
+Results are saved to kepler/feature_selection.json.
+
+Usage:
+    python kepler/11_feature_selection.py [--sizes 5 10 15 20 30 40] [--tolerance 0.005]
+"""
+import argparse
+import json
+import time
+
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.preprocessing import StandardScaler
+
+from cv_engine import FoldEnsemble, cross_validate_oof
+from feature_selection import load_correlations, mrmr_rank, prune_redundant, REDUNDANCY_THRESHOLD
+from feature_store import open_store
+from instrumentation import span, time_call
+from preprocessing import load_artifacts, apply_cleaning
+
+DEFAULT_SIZES = [5, 10, 15, 20, 30, 40]
+
+# Accuracy a reduced set may lose against the full set and still be recommended
+ACCURACY_TOLERANCE = 0.005
+
+# Folds of the CV accuracy the subset size is chosen on (as in script 4)
+CV_FOLDS = 3
+
+
+def evaluate_subset(template, columns, X_train, y_train, X_test):
+    """
+    Fits a fresh copy of template on a feature subset and measures it.
+
+    Args:
+        template: Unfitted estimator with the script 4 hyperparameters.
+        columns (list): Features to use.
+        X_train, X_test (pd.DataFrame): Cleaned features.
+        y_train (pd.Series): Training target.
+
+    Returns:
+        tuple: (dict of CV accuracy, fit seconds, single-row and per-row batch
+            latency; function returning the fitted model's predictions for
+            cleaned features)
+    """
+    scaler = StandardScaler()
+    train = scaler.fit_transform(X_train[columns])
+    test = scaler.transform(X_test[columns])
+    cv = cross_validate_oof(template, train, y_train, n_splits=CV_FOLDS)
+
+    model = clone(template)
+    start = time.perf_counter()
+    model.fit(train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    single = test[:1]
+    row = {
+        'n_features': len(columns),
+        'cv_accuracy': cv.oof_accuracy(y_train),
+        'fit_seconds': fit_seconds,
+        'single_row_ms': time_call(lambda: model.predict_proba(single)) * 1e3,
+        'batch_row_us': time_call(lambda: model.predict_proba(test)) / len(test) * 1e6,
+    }
+    return row, lambda X: model.predict(scaler.transform(X[columns]))
+
+
+def main(sizes, tolerance, threshold):
+    print("=" * 80)
+    print("FEATURE SELECTION")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    store = open_store()
+    cleaning = preprocessing['cleaning']
+    X_train = apply_cleaning(store.frame(rows=preprocessing['train_rows']), cleaning)
+    X_test = apply_cleaning(store.frame(rows=preprocessing['test_rows']), cleaning)
+    y_train = store.target(rows=preprocessing['train_rows'])
+    y_test = store.target(rows=preprocessing['test_rows'])
+    print(f"\nTrain set: {X_train.shape[0]} rows, test set: {X_test.shape[0]} rows, {X_train.shape[1]} features")
+
+    start = time.perf_counter()
+    with span('correlations', rows=X_train.shape[0], cols=X_train.shape[1]):
+        cache, hit = load_correlations(X_train, y_train)
+    print(f"Correlation matrix: {'cached' if hit else 'computed and cached'} "
+          f"({(time.perf_counter() - start) * 1e3:.1f} ms)")
+
+    pairs = cache.redundant_pairs(threshold)
+    print(f"\n{len(pairs)} feature pairs with |rho| >= {threshold}:")
+    for a, b, rho in pairs[:15]:
+        print(f"  {a:<28} {b:<28} {rho:.4f}")
+    if len(pairs) > 15:
+        print(f"  ... and {len(pairs) - 15} more")
+
+    # ========================================================================
+    # Ranking
+    # ========================================================================
+
+    order, scores = mrmr_rank(cache.corr, cache.relevance)
+    ranking = [cache.columns[j] for j in order]
+    kept, dropped = prune_redundant(order, cache.corr, threshold)
+
+    print(f"\n" + "=" * 80)
+    print("mRMR RANKING")
+    print("=" * 80)
+    print(f"\n{'Rank':<6} {'Feature':<30} {'Relevance':>10} {'mRMR':>10}")
+    print("-" * 60)
+    for rank, (j, score) in enumerate(zip(order[:20], scores[:20]), 1):
+        print(f"{rank:<6} {cache.columns[j]:<30} {cache.relevance[j]:>10.4f} {score:>10.4f}")
+    print(f"\nRedundancy pruning at |rho| >= {threshold}: {len(kept)} of {len(order)} features kept")
+    for j, k in dropped.items():
+        print(f"  - {cache.columns[j]:<28} duplicates {cache.columns[k]} ({cache.corr[j, k]:.3f})")
+
+    # ========================================================================
+    # Accuracy / cost per subset size
+    # ========================================================================
+
+    print(f"\n" + "=" * 80)
+    print("ACCURACY AND COST PER SUBSET SIZE")
+    print("=" * 80)
+
+    sizes = sorted({k for k in sizes if 0 < k < len(ranking)} | {len(ranking)})
+    subsets = {str(k): ranking[:k] for k in sizes}
+    subsets['pruned'] = [cache.columns[j] for j in kept]
+    report = {}
+    recommended = {}
+    for name, model in models.items():
+        template = model.fold_models[0] if isinstance(model, FoldEnsemble) else model
+        print(f"\n>>> {name}")
+        print(f"  {'Subset':>8}   {'Features':>8}   {'CV acc':>7}   {'Fit (s)':>8}   {'1 row (ms)':>10}   "
+              f"{'Batch (us/row)':>14}")
+        rows = []
+        predictors = {}
+        for subset, columns in subsets.items():
+            with span('evaluate_subset', model=name, cols=len(columns)):
+                row, predictors[subset] = evaluate_subset(template, columns, X_train, y_train, X_test)
+            row['subset'] = subset
+            rows.append(row)
+            print(f"  {subset:>8}   {row['n_features']:>8}   {row['cv_accuracy']*100:>6.2f}%   "
+                  f"{row['fit_seconds']:>8.3f}   {row['single_row_ms']:>10.3f}   {row['batch_row_us']:>14.2f}")
+
+        full = next(row for row in rows if row['subset'] == str(len(ranking)))
+        best = min((row for row in rows if row['cv_accuracy'] >= full['cv_accuracy'] - tolerance),
+                   key=lambda row: row['n_features'])
+        best_test = accuracy_score(y_test, predictors[best['subset']](X_test))
+        full_test = accuracy_score(y_test, predictors[full['subset']](X_test))
+        recommended[name] = {
+            'subset': best['subset'],
+            'n_features': best['n_features'],
+            'features': subsets[best['subset']],
+            'cv_accuracy_delta': best['cv_accuracy'] - full['cv_accuracy'],
+            'test_accuracy': best_test,
+            'full_test_accuracy': full_test,
+            'accuracy_delta': best_test - full_test,
+            'fit_speedup': full['fit_seconds'] / best['fit_seconds'],
+            'batch_speedup': full['batch_row_us'] / best['batch_row_us'],
+        }
+        report[name] = rows
+        print(f"  Recommended: {best['n_features']} features{' (pruned set)' if best['subset'] == 'pruned' else ''}, "
+              f"chosen on CV accuracy "
+              f"({recommended[name]['cv_accuracy_delta']*100:+.2f}%)")
+        print(f"  Test accuracy: {best_test*100:.2f}% vs {full_test*100:.2f}% with all features "
+              f"({recommended[name]['accuracy_delta']*100:+.2f}%), "
+              f"{recommended[name]['fit_speedup']:.1f}x faster fit, "
+              f"{recommended[name]['batch_speedup']:.1f}x faster batch scoring")
+
+    # ========================================================================
+    # Save
+    # ========================================================================
+
+    results = {
+        'ranking': [{'feature': cache.columns[j], 'relevance': float(cache.relevance[j]), 'mrmr_score': float(s)}
+                    for j, s in zip(order, scores)],
+        'redundancy_threshold': threshold,
+        'redundant_pairs': [{'features': [a, b], 'rho': rho} for a, b, rho in pairs],
+        'subsets': subsets,
+        'tolerance': tolerance,
+        'report': report,
+        'recommended': recommended,
+    }
+    with open('kepler/feature_selection.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n[+] Saved: kepler/feature_selection.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="mRMR feature ranking with an accuracy/latency report per subset size")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Subset sizes to evaluate (the full set is always added)")
+    parser.add_argument('--tolerance', type=float, default=ACCURACY_TOLERANCE,
+                        help="CV accuracy a reduced set may lose and still be recommended")
+    parser.add_argument('--threshold', type=float, default=REDUNDANCY_THRESHOLD,
+                        help="|rho| above which features count as redundant")
+    args = parser.parse_args()
+    main(args.sizes, args.tolerance, args.threshold)
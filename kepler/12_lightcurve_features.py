@@ -0,0 +1,160 @@
+"""
+Script 12: Light-Curve Features
+BLS transit search and phase-folded shape features from local Kepler light curves
+
+For every star in the catalog with light-curve files in --lc-dir
+(lightcurves.py for the accepted formats), a worker process:
+- loads and detrends the photometry
+- runs a box-least-squares search over a log-spaced period grid
+- folds at the catalog ephemeris of each of the star's KOIs (koi_period,
+  koi_time0bk, koi_duration) and measures depth, odd/even depth difference,
+  secondary eclipse depth and transit shape (V vs U)
+
+Stars are spread over a process pool. The features are keyed by kepoi_name,
+the row id of the feature store, so they join onto the engineered features.
+
+Outputs:
+- kepler/lightcurve_features.csv: one row per KOI with a light curve
+- kepler/lightcurve_report.json: throughput, BLS vs catalog period agreement,
+  median shape features per disposition
+
+Usage:
+    python kepler/12_lightcurve_features.py [--lc-dir kepler/lightcurves] [--workers 8]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from lightcurves import find_lightcurves, process_star, LIGHTCURVE_DIR, MAX_PERIODS
+
+CATALOG_COLUMNS = ['kepid', 'kepoi_name', 'koi_disposition', 'koi_period', 'koi_time0bk', 'koi_duration']
+
+# BLS period within this fraction of the catalog period (or of 1/2x, 2x) counts as recovered
+PERIOD_TOLERANCE = 0.01
+
+SHAPE_FEATURES = ['lc_depth_snr', 'lc_odd_even_sigma', 'lc_secondary_snr', 'lc_transit_shape']
+
+
+def build_tasks(catalog, files, search):
+    """One task per star that has both catalog rows and light-curve files."""
+    catalog = catalog.dropna(subset=['koi_period', 'koi_time0bk', 'koi_duration'])
+    tasks = []
+    for kepid, kois in catalog.groupby('kepid', sort=True):
+        if int(kepid) in files:
+            tasks.append({
+                'kepid': int(kepid),
+                'paths': files[int(kepid)],
+                'kois': kois[['kepoi_name', 'koi_period', 'koi_time0bk', 'koi_duration']].to_dict('records'),
+                'search': search,
+            })
+    return tasks
+
+
+def period_recovered(ratio):
+    """BLS period matches the catalog period or its first harmonic / subharmonic."""
+    return np.min([np.abs(ratio / h - 1) for h in (1.0, 0.5, 2.0)], axis=0) < PERIOD_TOLERANCE
+
+
+def main(lc_dir, catalog_path, output_path, workers, max_periods, limit=None):
+    print("=" * 80)
+    print("LIGHT-CURVE FEATURES")
+    print("=" * 80)
+
+    catalog = pd.read_csv(catalog_path, usecols=CATALOG_COLUMNS)
+    files = find_lightcurves(lc_dir)
+    tasks = build_tasks(catalog, files, {'max_periods': max_periods})
+    if limit:
+        tasks = tasks[:limit]
+    n_kois = sum(len(task['kois']) for task in tasks)
+    n_files = sum(len(task['paths']) for task in tasks)
+
+    print(f"\nLight curves: {lc_dir} ({len(files)} stars with files)")
+    print(f"Processing {len(tasks)} stars, {n_kois} KOIs, {n_files} files with {workers} workers")
+    if not tasks:
+        print(f"\n[WARNING] No catalog star has light-curve files in {lc_dir}")
+        print("=" * 80)
+        return
+
+    rows = []
+    start = time.perf_counter()
+    with span('lightcurves', stars=len(tasks), workers=workers):
+        # The pool shuts down (workers included) even if a star raises mid-loop
+        with ProcessPoolExecutor(max_workers=workers) if workers != 1 else nullcontext() as executor:
+            if executor is None:
+                results = map(process_star, tasks)
+            else:
+                results = executor.map(process_star, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+            for i, star_rows in enumerate(results, 1):
+                rows.extend(star_rows)
+                if i % max(1, len(tasks) // 10) == 0 or i == len(tasks):
+                    elapsed = time.perf_counter() - start
+                    print(f"  {i:>6}/{len(tasks)} stars   {elapsed:>8.1f}s   {i / elapsed * 3600:>10.0f} stars/hour")
+    elapsed = time.perf_counter() - start
+
+    features = pd.DataFrame(rows)
+    failed = features['error'].notna() if 'error' in features else pd.Series(False, index=features.index)
+    ok = features[~failed].drop(columns=['error'], errors='ignore')
+
+    print(f"\nDone in {elapsed:.1f}s: {len(tasks) / elapsed * 3600:.0f} stars/hour, "
+          f"{n_kois / elapsed * 3600:.0f} KOIs/hour")
+    if len(ok):
+        print(f"  Per star: {ok.groupby('kepid')['star_seconds'].first().median():.2f}s median, "
+              f"{ok['lc_points'].median():.0f} points, {ok['bls_periods_searched'].median():.0f} trial periods")
+    if failed.any():
+        print(f"  [WARNING] {failed.sum()} KOIs failed, e.g. {features.loc[failed, 'error'].iloc[0]}")
+
+    # ========================================================================
+    # Agreement with the catalog and separation by disposition
+    # ========================================================================
+
+    report = {
+        'lc_dir': lc_dir,
+        'stars': len(tasks),
+        'kois': n_kois,
+        'failed_kois': int(failed.sum()),
+        'workers': workers,
+        'seconds': elapsed,
+        'stars_per_hour': len(tasks) / elapsed * 3600,
+        'kois_per_hour': n_kois / elapsed * 3600,
+    }
+    if len(ok):
+        merged = ok.merge(catalog[['kepoi_name', 'koi_disposition', 'koi_period']], on='kepoi_name')
+        if 'bls_period_ratio' in merged:
+            recovered = period_recovered(merged['bls_period_ratio'].to_numpy())
+            report['bls_period_recovered'] = float(recovered.mean())
+            print(f"\nBLS recovers the catalog period (or 2x / 0.5x) for {recovered.mean()*100:.1f}% of KOIs")
+
+        by_class = merged.groupby('koi_disposition')[SHAPE_FEATURES].median()
+        report['median_by_disposition'] = by_class.to_dict(orient='index')
+        print(f"\nMedian shape features by disposition:")
+        print(f"  {'Disposition':<16}" + "".join(f"{name:>20}" for name in SHAPE_FEATURES))
+        for disposition, values in by_class.iterrows():
+            print(f"  {disposition:<16}" + "".join(f"{v:>20.3f}" for v in values))
+
+    features.to_csv(output_path, index=False)
+    with open('kepler/lightcurve_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n[+] Saved: {output_path}")
+    print(f"[+] Saved: kepler/lightcurve_report.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BLS search and transit shape features from local light curves")
+    parser.add_argument('--lc-dir', default=LIGHTCURVE_DIR, help="Directory of FITS/CSV light curves")
+    parser.add_argument('--catalog', default='kepler/kepler_raw.csv')
+    parser.add_argument('--output', default='kepler/lightcurve_features.csv')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--max-periods', type=int, default=MAX_PERIODS,
+                        help="Cap on BLS trial periods per star")
+    parser.add_argument('--limit', type=int, default=None, help="Process only the first N stars")
+    args = parser.parse_args()
+    main(args.lc_dir, args.catalog, args.output, args.workers, args.max_periods, limit=args.limit)
@@ -0,0 +1,151 @@
+"""
+Script 13: Neighbour Index
+Build the "similar known KOIs" index and benchmark build time, latency and recall
+
+Builds the nearest-neighbour index of CONFIRMED and FALSE POSITIVE KOIs in
+the scaled feature space of script 4 (neighbours.py) and measures, for each
+index kind (balltree, brute, approx):
+- build time
+- query latency for one row and per row of a batch (the script 4 test set)
+- recall@k against the exact neighbours
+
+To see how the kinds scale to larger catalogs, the benchmark is repeated on
+the catalog replicated --scale times with small Gaussian jitter.
+
+The index of --kind (by default the exact kind with the fastest batch
+queries on the real catalog) is saved to kepler/models/neighbour_index.joblib,
+where script 10 (--neighbours) picks it up. Results are saved to
+kepler/neighbour_benchmark.json.
+
+Usage:
+    python kepler/13_neighbour_index.py [--kind auto] [--k 5] [--scale 1 10]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from feature_store import open_store
+from instrumentation import span, time_call
+from neighbours import NeighbourIndex, build_index, labelled_rows, DISPOSITIONS, KINDS, NEIGHBOUR_INDEX_FILE
+from preprocessing import load_artifacts, transform_features, MODELS_DIR
+
+DEFAULT_SCALES = [1, 10]
+
+# Standard deviation of the jitter added to replicated rows (scaled units)
+JITTER = 0.05
+
+
+def recall_at_k(found, truth):
+    """Fraction of the true k nearest ids that the index returned, over all rows."""
+    hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def benchmark(X, ids, dispositions, X_query, k):
+    """Build time, latency and recall of every index kind on one catalog."""
+    results = {'rows': len(X)}
+    truth = None
+    for kind in KINDS:
+        start = time.perf_counter()
+        with span('build_neighbour_index', kind=kind, rows=len(X)):
+            index = NeighbourIndex(X, ids, dispositions, kind=kind)
+        build_seconds = time.perf_counter() - start
+
+        single = X_query[:1]
+        single_ms = time_call(lambda: index.query(single, k)) * 1e3
+        start = time.perf_counter()
+        with span('query_neighbour_index', kind=kind, rows=len(X_query)):
+            found = index.query(X_query, k)
+        batch_us = (time.perf_counter() - start) / len(X_query) * 1e6
+        # Both exact kinds return the true neighbours; balltree comes first
+        truth = truth or found
+        recall = np.mean([recall_at_k(found[d][1], truth[d][1]) for d in DISPOSITIONS])
+
+        results[kind] = {'build_seconds': build_seconds, 'single_row_ms': single_ms,
+                         'batch_row_us': batch_us, 'recall_at_k': float(recall)}
+        print(f"  {kind:<8}   {build_seconds:>10.3f}   {single_ms:>10.3f}   {batch_us:>14.1f}   {recall:>8.4f}")
+    return results
+
+
+def main(kind, k, scales):
+    print("=" * 80)
+    print("NEIGHBOUR INDEX")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    store = open_store()
+    rows, ids, dispositions = labelled_rows(store)
+    X = transform_features(store.frame(rows=rows), preprocessing)
+    X_query = transform_features(store.frame(rows=preprocessing['test_rows']), preprocessing)
+    query_ids = store.row_ids[preprocessing['test_rows']]
+
+    print(f"\nIndexed KOIs: {len(ids)} ({', '.join(f'{(dispositions == d).sum()} {d}' for d in DISPOSITIONS)})")
+    print(f"Features: {X.shape[1]} (scaled with the script 4 scaler)")
+    print(f"Queries: {len(X_query)} test-set rows, k = {k} per disposition")
+
+    # ========================================================================
+    # Benchmark
+    # ========================================================================
+
+    rng = np.random.default_rng(42)
+    benchmarks = {}
+    for scale in sorted(set(scales)):
+        if scale == 1:
+            X_scaled, ids_scaled, disp_scaled = X, ids, dispositions
+        else:
+            X_scaled = np.tile(X, (scale, 1)) + rng.normal(0, JITTER, (len(X) * scale, X.shape[1]))
+            ids_scaled = np.array([f"{name}#{copy}" for copy in range(scale) for name in ids])
+            disp_scaled = np.tile(dispositions, scale)
+
+        print(f"\n>>> Catalog x{scale}: {len(X_scaled)} indexed rows")
+        print(f"  {'Index':<8}   {'Build (s)':>10}   {'1 row (ms)':>10}   {'Batch (us/row)':>14}   {'Recall@k':>8}")
+        benchmarks[str(scale)] = benchmark(X_scaled, ids_scaled, disp_scaled, X_query, k)
+
+    if kind == 'auto':
+        real = benchmarks[str(min(scales))]
+        kind = min(('balltree', 'brute'), key=lambda name: real[name]['batch_row_us'])
+
+    # ========================================================================
+    # Sanity check: do neighbours agree with the labels?
+    # ========================================================================
+
+    index = build_index(store, preprocessing, kind=kind)
+    labelled_query = np.isin(query_ids, ids)
+    found = index.query(X_query[labelled_query], k, exclude=query_ids[labelled_query])
+    nearest = np.column_stack([found[d][0][:, 0] for d in DISPOSITIONS])
+    predicted = np.array(DISPOSITIONS)[nearest.argmin(axis=1)]
+    label = dict(zip(ids, dispositions))
+    actual = np.array([label[name] for name in query_ids[labelled_query]])
+    agreement = float((predicted == actual).mean())
+    print(f"\nNearest labelled neighbour has the query's disposition for "
+          f"{agreement*100:.1f}% of {labelled_query.sum()} labelled test KOIs")
+
+    index.save()
+    results = {
+        'kind': kind,
+        'k': k,
+        'indexed_rows': len(ids),
+        'features': X.shape[1],
+        'queries': len(X_query),
+        'benchmarks': benchmarks,
+        'nearest_label_agreement': agreement,
+    }
+    with open('kepler/neighbour_benchmark.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n[+] Saved: {MODELS_DIR}/{NEIGHBOUR_INDEX_FILE} ({kind})")
+    print(f"[+] Saved: kepler/neighbour_benchmark.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and benchmark the similar-KOI neighbour index")
+    parser.add_argument('--kind', choices=['auto'] + list(KINDS), default='auto',
+                        help="Index kind to save for scoring (auto: fastest exact kind)")
+    parser.add_argument('--k', type=int, default=5, help="Neighbours per disposition")
+    parser.add_argument('--scale', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help="Catalog replication factors to benchmark")
+    args = parser.parse_args()
+    main(args.kind, args.k, args.scale)
@@ -0,0 +1,160 @@
+"""
+Script 14: Cascade Report
+Calibrate the logistic-regression -> tree-ensemble cascade and measure its throughput
+
+The uncertainty band is calibrated on the out-of-fold probabilities saved by
+script 4 (cascade.py) for a range of accuracy tolerances. For each band the
+cascade is measured on rows it never saw in training:
+- test accuracy (script 4 test set) and the fraction of rows escalated
+- throughput on the whole catalog, against the linear model alone and the
+  tree ensemble alone (sklearn and compiled, tree_compiler.py)
+
+The band for --tolerance is saved to kepler/models/cascade.json, with the
+second stage compiled if that makes the cascade faster. Script 10 uses it
+with --cascade. The report is saved to kepler/cascade_report.json.
+
+Usage:
+    python kepler/14_cascade_report.py [--second "Gradient Boosting"] [--tolerance 0.002]
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+
+from cascade import Cascade, LinearScorer, calibrate_band, save_config, CASCADE_FILE, DEFAULT_TOLERANCE
+from feature_store import open_store
+from instrumentation import span, time_call
+from preprocessing import load_artifacts, transform_features, MODELS_DIR
+from tree_compiler import compile_model
+
+FIRST_STAGE = 'Logistic Regression'
+
+TOLERANCES = [0.0, 0.001, 0.002, 0.005, 0.01, 0.02]
+
+# Large batches: each timing runs at least this long (instrumentation default: 0.2 s)
+TIMING_SECONDS = 0.5
+
+
+def main(second_name, tolerance):
+    print("=" * 80)
+    print("CASCADE INFERENCE REPORT")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    if second_name is None:
+        best = preprocessing['best_model']
+        second_name = best if best != FIRST_STAGE else next(name for name in models if name != FIRST_STAGE)
+    first, second = models[FIRST_STAGE], models[second_name]
+    compiled = compile_model(second)
+
+    oof = pd.read_csv('kepler/oof_predictions.csv', index_col='row')
+    store = open_store()
+    X_all = transform_features(store.frame(), preprocessing)
+    test_rows = preprocessing['test_rows']
+    X_test, y_test = X_all[test_rows], store.target(rows=test_rows).to_numpy()
+
+    print(f"\nFirst stage:  {FIRST_STAGE}")
+    print(f"Second stage: {second_name}")
+    print(f"Calibration:  {len(oof)} out-of-fold rows; test: {len(X_test)} rows; throughput: {len(X_all)} rows")
+
+    # ========================================================================
+    # Single-stage baselines
+    # ========================================================================
+
+    linear = LinearScorer(first)
+    max_diff = np.max(np.abs(linear.predict_positive(X_test) - first.predict_proba(X_test)[:, 1]))
+    print(f"\nLinear scorer vs {FIRST_STAGE}.predict_proba: max |diff| = {max_diff:.2e}")
+
+    baselines = {
+        FIRST_STAGE: (lambda X: linear.predict_positive(X) >= 0.5),
+        f"{second_name} (sklearn)": (lambda X: second.predict(X)),
+        f"{second_name} (compiled)": (lambda X: compiled.predict(X)),
+    }
+    print(f"\n{'Scorer':<40} {'Test acc':>9} {'Escalated':>10} {'Rows/s':>12} {'vs sklearn':>11}")
+    print("-" * 86)
+    rows = []
+    for name, predict in baselines.items():
+        with span('time_scorer', model=name, rows=len(X_all)):
+            seconds = time_call(lambda: predict(X_all), TIMING_SECONDS)
+        rows.append({'scorer': name, 'test_accuracy': accuracy_score(y_test, predict(X_test)),
+                     'escalated_fraction': None, 'rows_per_second': len(X_all) / seconds})
+    reference = rows[1]['rows_per_second']
+    for row in rows:
+        row['speedup'] = row['rows_per_second'] / reference
+        print(f"{row['scorer']:<40} {row['test_accuracy']*100:>8.2f}% {'-':>10} "
+              f"{row['rows_per_second']:>12.0f} {row['speedup']:>10.1f}x")
+
+    # ========================================================================
+    # Cascade per tolerance
+    # ========================================================================
+
+    print(f"\n{'Tolerance / band':<40} {'Test acc':>9} {'Escalated':>10} {'Rows/s':>12} {'vs sklearn':>11}")
+    print("-" * 86)
+    bands = []
+    chosen = None
+    for tol in sorted(set(TOLERANCES) | {tolerance}):
+        band = calibrate_band(oof[FIRST_STAGE].to_numpy(), oof[second_name].to_numpy(),
+                              oof['is_exoplanet'].to_numpy(), tolerance=tol)
+        for stage_name, stage in (('sklearn', second), ('compiled', compiled)):
+            cascade = Cascade(first, stage, band['low'], band['high'])
+            with span('time_scorer', model=f'cascade_{stage_name}', rows=len(X_all)):
+                seconds = time_call(lambda: cascade.score(X_all), TIMING_SECONDS)
+            proba, escalated = cascade.score(X_test)
+            row = {
+                'scorer': f"cascade ({stage_name})",
+                'tolerance': tol,
+                'low': band['low'],
+                'high': band['high'],
+                'oof_accuracy': band['oof_accuracy'],
+                'test_accuracy': accuracy_score(y_test, (proba >= 0.5).astype(int)),
+                'escalated_fraction': float(escalated.mean()),
+                'rows_per_second': len(X_all) / seconds,
+            }
+            row['speedup'] = row['rows_per_second'] / reference
+            bands.append(row)
+            label = f"{tol:.3f} [{band['low']:.3f}, {band['high']:.3f}] {stage_name}"
+            print(f"{label:<40} {row['test_accuracy']*100:>8.2f}% {row['escalated_fraction']*100:>9.1f}% "
+                  f"{row['rows_per_second']:>12.0f} {row['speedup']:>10.1f}x")
+            if tol == tolerance and (chosen is None or row['rows_per_second'] > chosen['rows_per_second']):
+                chosen = dict(row, compiled=stage_name == 'compiled')
+
+    # ========================================================================
+    # Save
+    # ========================================================================
+
+    config = {
+        'first': FIRST_STAGE,
+        'second': second_name,
+        'low': chosen['low'],
+        'high': chosen['high'],
+        'tolerance': tolerance,
+        'compiled': chosen['compiled'],
+        'oof_accuracy': chosen['oof_accuracy'],
+        'test_accuracy': chosen['test_accuracy'],
+        'escalated_fraction': chosen['escalated_fraction'],
+    }
+    save_config(config)
+    with open('kepler/cascade_report.json', 'w') as f:
+        json.dump({'config': config, 'baselines': rows, 'bands': bands,
+                   'linear_scorer_max_abs_diff': float(max_diff)}, f, indent=2)
+
+    print(f"\nChosen (tolerance {tolerance}): band [{config['low']:.4f}, {config['high']:.4f}], "
+          f"{config['escalated_fraction']*100:.1f}% escalated, "
+          f"{'compiled' if config['compiled'] else 'sklearn'} second stage, "
+          f"{chosen['speedup']:.1f}x the throughput of {second_name} "
+          f"({(chosen['test_accuracy'] - rows[1]['test_accuracy'])*100:+.2f}% test accuracy)")
+    print(f"\n[+] Saved: {MODELS_DIR}/{CASCADE_FILE}")
+    print(f"[+] Saved: kepler/cascade_report.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate and benchmark cascade inference")
+    parser.add_argument('--second', default=None,
+                        help="Second-stage model (default: best model from script 4 unless it is the linear one)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="OOF accuracy the cascade may lose against the second stage alone")
+    args = parser.parse_args()
+    main(args.second, args.tolerance)
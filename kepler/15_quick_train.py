@@ -0,0 +1,210 @@
+"""
+Script 15: Quick Train
+Fit the models on a stratified coreset and estimate their accuracy with confidence intervals
+
+A fast alternative to script 4 for feature experiments. After script 3 has
+written the feature store, each model is fitted once on a class-balanced
+coreset of the training split, with importance weights (coreset.py), instead
+of running 3-fold CV on every training row. It is then scored on a
+stratified sample of the test split, drawn with the same split and seed as
+script 4. The accuracy on that sample estimates the accuracy on the whole
+catalog. It is reported with a Wilson confidence interval, which depends on
+the sample size only.
+
+With --hard, the coreset leans toward rows a pilot model finds hard. Several
+--size values give a small learning curve: when accuracy has stopped moving
+between sizes, a larger coreset will not change the answer.
+
+The latest full run of script 4 in the experiment store
+(experiment_store.py) serves as the reference. For each model the report
+shows the accuracy difference, whether the full-run accuracy lies inside the
+interval, and the speedup against the full run's training time. Results are
+saved to kepler/quick_train.json.
+
+Usage:
+    python kepler/15_quick_train.py [--size 2000] [--eval-size 2000] [--hard]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from coreset import stratified_coreset, stratified_sample, wilson_interval
+from cv_engine import FoldEnsemble
+from experiment_store import ExperimentStore, EXPERIMENTS_DB
+from feature_store import open_store
+from instrumentation import span
+from preprocessing import fit_cleaning, apply_cleaning, load_artifacts, PREPROCESSING_FILE, MODELS_DIR
+
+# Same split as script 4
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+# Script 4's models, used when it has not saved any yet
+DEFAULT_MODELS = {
+    'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
+    'Random Forest': RandomForestClassifier(n_estimators=50, max_depth=10, random_state=42, n_jobs=-1),
+    'Gradient Boosting': GradientBoostingClassifier(n_estimators=50, max_depth=5, random_state=42)
+}
+
+DEFAULT_SIZES = [2000]
+DEFAULT_EVAL_SIZE = 2000
+CONFIDENCE = 0.95
+
+
+def model_templates():
+    """Unfitted models with the hyperparameters of the models script 4 saved."""
+    if not os.path.exists(os.path.join(MODELS_DIR, PREPROCESSING_FILE)):
+        return {name: clone(model) for name, model in DEFAULT_MODELS.items()}
+    models, _ = load_artifacts()
+    return {name: clone(model.fold_models[0] if isinstance(model, FoldEnsemble) else model)
+            for name, model in models.items()}
+
+
+def reference_run(db_path):
+    """Latest script 4 run in the experiment store, or None."""
+    if not os.path.exists(db_path):
+        return None
+    with ExperimentStore(db_path) as experiments:
+        return experiments.run(None)
+
+
+def main(sizes, eval_size, hard, db_path):
+    run_started = time.perf_counter()
+    print("=" * 80)
+    print("QUICK TRAIN (STRATIFIED CORESET)")
+    print("=" * 80)
+
+    store = open_store()
+    y = np.asarray(store.y)
+    # The split only looks at the target; no feature row is read here
+    train_rows, test_rows = train_test_split(np.arange(len(y)), test_size=TEST_SIZE,
+                                             random_state=RANDOM_STATE, stratify=y)
+    eval_rows = stratified_sample(y, test_rows, eval_size)
+    X_eval_raw = store.frame(rows=eval_rows)
+    y_eval = y[eval_rows]
+    templates = model_templates()
+
+    print(f"\nCatalog: {len(y)} rows, {store.shape[1]} features "
+          f"({len(train_rows)} train / {len(test_rows)} test, script 4 split)")
+    print(f"Evaluation sample: {len(eval_rows)} test rows (stratified, {y_eval.mean()*100:.1f}% positive)")
+    print(f"Coreset sampling: class-balanced{', hard-example weighted' if hard else ''}")
+
+    # ========================================================================
+    # Fit on each coreset size
+    # ========================================================================
+
+    curve = []
+    for size in sorted(set(sizes)):
+        start = time.perf_counter()
+        with span('coreset', rows=size, hard=hard):
+            rows, weights = stratified_coreset(y, train_rows, size, X=lambda r: store.frame(rows=r), hard=hard)
+            X_core = store.frame(rows=rows)
+            cleaning = fit_cleaning(X_core)
+            scaler = StandardScaler()
+            X_core = scaler.fit_transform(apply_cleaning(X_core, cleaning))
+            X_eval = scaler.transform(apply_cleaning(X_eval_raw, cleaning))
+        sample_seconds = time.perf_counter() - start
+
+        positives = int(y[rows].sum())
+        print(f"\n>>> Coreset: {len(rows)} rows ({positives} positive / {len(rows) - positives} negative), "
+              f"sampled in {sample_seconds:.2f} s")
+        print(f"  {'Model':<22} {'Fit (s)':>8} {'Accuracy':>9} {f'{CONFIDENCE:.0%} CI':>19}")
+        print("  " + "-" * 62)
+        models = {}
+        for name, template in templates.items():
+            model = clone(template)
+            start = time.perf_counter()
+            with span('fit', model=name, rows=len(rows)):
+                model.fit(X_core, y[rows], sample_weight=weights)
+            fit_seconds = time.perf_counter() - start
+            correct = int((model.predict(X_eval) == y_eval).sum())
+            low, high = wilson_interval(correct, len(y_eval), CONFIDENCE)
+            models[name] = {'fit_seconds': fit_seconds, 'accuracy': correct / len(y_eval),
+                            'ci_low': low, 'ci_high': high}
+            print(f"  {name:<22} {fit_seconds:>8.3f} {correct / len(y_eval)*100:>8.2f}% "
+                  f"  [{low*100:6.2f}%, {high*100:6.2f}%]")
+        curve.append({'size': len(rows), 'hard': hard, 'sample_seconds': sample_seconds, 'models': models})
+
+    quick_seconds = time.perf_counter() - run_started
+
+    # ========================================================================
+    # Against the latest full run
+    # ========================================================================
+
+    final = curve[-1]
+    reference = reference_run(db_path)
+    comparison = {}
+    print(f"\n" + "=" * 80)
+    print("AGAINST THE LATEST FULL RUN")
+    print("=" * 80)
+    if reference is None:
+        print(f"\n[WARNING] No script 4 run in {db_path}: accuracy and speedup not compared")
+    else:
+        same_features = reference['config'].get('features') == list(store.columns)
+        print(f"\nReference: run #{reference['run_id']} ({reference['started_at']}), "
+              f"{reference['config'].get('cv_folds')}-fold CV on {len(train_rows)} rows, "
+              f"{reference['duration_seconds']:.1f} s in total")
+        if not same_features:
+            print("  (trained on a different feature set: the accuracy difference is the effect of the feature change)")
+        print(f"\n  {'Model':<22} {'Full acc':>9} {'Quick acc':>10} {'Diff':>8} {'In CI':>6} {'Train speedup':>14}")
+        print("  " + "-" * 74)
+        for name, quick in final['models'].items():
+            full = reference['metrics'].get(name)
+            full_seconds = reference['timings'].get(f'train:{name}')
+            if full is None or full_seconds is None:
+                continue
+            entry = {
+                'full_accuracy': full['test_accuracy'],
+                'accuracy_diff': quick['accuracy'] - full['test_accuracy'],
+                'full_in_ci': quick['ci_low'] <= full['test_accuracy'] <= quick['ci_high'],
+                'full_train_seconds': full_seconds,
+                'train_speedup': full_seconds / quick['fit_seconds'],
+            }
+            comparison[name] = entry
+            print(f"  {name:<22} {entry['full_accuracy']*100:>8.2f}% {quick['accuracy']*100:>9.2f}% "
+                  f"{entry['accuracy_diff']*100:>+7.2f}% {'yes' if entry['full_in_ci'] else 'no':>6} "
+                  f"{entry['train_speedup']:>13.1f}x")
+        print(f"\nWall time: {quick_seconds:.1f} s vs {reference['duration_seconds']:.1f} s "
+              f"({reference['duration_seconds'] / quick_seconds:.1f}x faster)")
+
+    # ========================================================================
+    # Save
+    # ========================================================================
+
+    results = {
+        'catalog_rows': len(y),
+        'train_rows': len(train_rows),
+        'eval_rows': len(eval_rows),
+        'confidence': CONFIDENCE,
+        'hard': hard,
+        'curve': curve,
+        'wall_seconds': quick_seconds,
+        'reference_run': None if reference is None else reference['run_id'],
+        'reference_seconds': None if reference is None else reference['duration_seconds'],
+        'comparison': comparison,
+    }
+    with open('kepler/quick_train.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n[+] Saved: kepler/quick_train.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quick training on a stratified coreset with accuracy bounds")
+    parser.add_argument('--size', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Coreset size(s); several sizes give a learning curve")
+    parser.add_argument('--eval-size', type=int, default=DEFAULT_EVAL_SIZE,
+                        help="Test rows the accuracy is estimated on")
+    parser.add_argument('--hard', action='store_true', help="Lean the coreset toward hard examples")
+    parser.add_argument('--db', default=EXPERIMENTS_DB, help="Experiment store with the reference run")
+    args = parser.parse_args()
+    main(args.size, args.eval_size, args.hard, args.db)
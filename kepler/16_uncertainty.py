@@ -0,0 +1,191 @@
+"""
+Script 16: Uncertainty
+Monte Carlo exoplanet probability distributions from the catalog error bars
+
+Each candidate is scored --draws times with its inputs perturbed within
+their asymmetric *_err1 / *_err2 error bars (uncertainty.py), using the best
+model from script 4 or --model (--compiled: the flat-array predictor from
+tree_compiler.py). The draws of many candidates go through feature
+engineering and the model as one batch of at most --max-batch rows.
+
+Outputs:
+- kepler/uncertainty_scores.csv: kepoi_name, koi_disposition (when
+  present), the unperturbed probability, mean, std and 5/16/50/84/95th
+  percentiles of the probability, and the fraction of draws classified as
+  exoplanets
+- kepler/uncertainty_draws.npy with --save-draws: every draw, float32
+  (candidates x draws)
+- kepler/uncertainty_report.json: draws per second (overall and per stage),
+  how many predictions an error bar could flip, and with --benchmark the
+  throughput for several --max-batch sizes
+
+Usage:
+    python kepler/16_uncertainty.py [--draws 200] [--max-batch 100000] [--compiled] [--benchmark]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import BASE_FEATURES
+from instrumentation import span
+from preprocessing import load_artifacts
+from tree_compiler import compile_model, is_compilable
+from uncertainty import MonteCarloScorer, error_columns, DEFAULT_DRAWS, DEFAULT_MAX_BATCH
+
+ID_COLUMNS = ['kepoi_name', 'koi_disposition']
+
+BENCHMARK_ROWS = 2000
+BENCHMARK_BATCHES = [1_000, 10_000, 100_000, 300_000]
+
+
+def benchmark(model, preprocessing, raw, n_draws):
+    """Draws per second, overall and per stage, for each max-batch size."""
+    results = []
+    print(f"\n  {'Max batch':>10} {'Draws/s':>12} {'Draw':>8} {'Engineer':>9} {'Model':>8}")
+    for max_batch in [size for size in BENCHMARK_BATCHES if size >= n_draws]:
+        scorer = MonteCarloScorer(model, preprocessing, n_draws=n_draws, max_batch=max_batch)
+        start = time.perf_counter()
+        with span('benchmark_draws', rows=len(raw), max_batch=max_batch):
+            for _ in scorer.draws(raw):
+                pass
+        seconds = time.perf_counter() - start
+        total = len(raw) * n_draws
+        shares = {stage: t / seconds for stage, t in scorer.timings.items()}
+        results.append({'max_batch': max_batch, 'draws': total, 'seconds': seconds,
+                        'draws_per_second': total / seconds, 'stage_share': shares})
+        print(f"  {max_batch:>10} {total / seconds:>12.0f} {shares['draw']*100:>7.1f}% "
+              f"{shares['engineer']*100:>8.1f}% {shares['model']*100:>7.1f}%")
+    return results
+
+
+def main(input_path, output_path, n_draws, max_batch, batch_size, model_name=None, compiled=False,
+         save_draws=False, run_benchmark=False):
+    print("=" * 80)
+    print("MONTE CARLO UNCERTAINTY")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    model_name = model_name or preprocessing['best_model']
+    if compiled and not is_compilable(models[model_name]):
+        print(f"\n[WARNING] {model_name} is not a tree ensemble - scoring with sklearn instead of --compiled")
+        compiled = False
+    model = compile_model(models[model_name]) if compiled else models[model_name]
+    scorer = MonteCarloScorer(model, preprocessing, n_draws=n_draws, max_batch=max_batch)
+
+    header = pd.read_csv(input_path, nrows=0)
+    errors = error_columns(header.columns)
+    print(f"\nModel: {model_name}{' (compiled)' if compiled else ''}")
+    print(f"Input: {input_path} (batches of {batch_size})")
+    print(f"Perturbed features: {len(errors)} of {len(BASE_FEATURES)} "
+          f"({sum(1 for up, low in errors.values() if up != low)} asymmetric)")
+    print(f"Draws: {n_draws} per candidate, at most {max_batch} rows per model call "
+          f"({scorer.chunk_rows} candidates)")
+
+    # ========================================================================
+    # Score
+    # ========================================================================
+
+    start = time.perf_counter()
+    n_rows = 0
+    draw_parts = []
+    for n_batches, batch in enumerate(pd.read_csv(input_path, chunksize=batch_size)):
+        summary, draws = scorer.summarize(batch, keep_draws=save_draws)
+        scored = pd.concat([batch[[col for col in ID_COLUMNS if col in batch.columns]], summary], axis=1)
+        scored.to_csv(output_path, mode='w' if n_batches == 0 else 'a', header=n_batches == 0, index=False)
+        if save_draws:
+            draw_parts.append(draws)
+        n_rows += len(batch)
+    seconds = time.perf_counter() - start
+    total_draws = n_rows * n_draws
+
+    if n_rows == 0:
+        # Header-only input: the output holds just the header row
+        print(f"\n[WARNING] No candidates in {input_path} - nothing scored")
+        print("=" * 80)
+        return
+
+    print(f"\nScored {n_rows} candidates x {n_draws} draws = {total_draws} rows in {seconds:.1f}s "
+          f"({total_draws / seconds:.0f} draws/s)")
+    for stage, stage_seconds in scorer.timings.items():
+        print(f"  {stage.capitalize():<10} {stage_seconds:>8.2f}s ({stage_seconds / seconds * 100:.1f}%)")
+
+    # ========================================================================
+    # Summary
+    # ========================================================================
+
+    scores = pd.read_csv(output_path)
+    flips = (scores['fraction_exoplanet'] > 0) & (scores['fraction_exoplanet'] < 1)
+    crosses = (scores['probability_q05'] < 0.5) & (scores['probability_q95'] >= 0.5)
+    print(f"\nMedian probability std: {scores['probability_std'].median():.4f}")
+    print(f"Candidates whose class flips in some draws: {flips.sum()} ({flips.mean()*100:.1f}%)")
+    print(f"Candidates whose 90% interval contains 0.5: {crosses.sum()} ({crosses.mean()*100:.1f}%)")
+
+    print(f"\nMost uncertain candidates:")
+    cols = [col for col in ['kepoi_name', 'koi_disposition'] if col in scores.columns]
+    top = scores.sort_values('probability_std', ascending=False).head(10)
+    print(f"  {'Candidate':<14} {'Disposition':<16} {'Nominal':>8} {'Mean':>7} {'90% interval':>17} {'Exoplanet':>10}")
+    for _, row in top.iterrows():
+        name = row[cols[0]] if cols else row.name
+        disposition = row['koi_disposition'] if 'koi_disposition' in cols else '-'
+        print(f"  {name:<14} {disposition:<16} {row['probability_nominal']:>8.3f} {row['probability_mean']:>7.3f} "
+              f"  [{row['probability_q05']:.3f}, {row['probability_q95']:.3f}] {row['fraction_exoplanet']*100:>9.1f}%")
+
+    bench = None
+    if run_benchmark:
+        print(f"\n" + "=" * 80)
+        print(f"BENCHMARK ({BENCHMARK_ROWS} candidates x {n_draws} draws)")
+        print("=" * 80)
+        bench = benchmark(model, preprocessing, pd.read_csv(input_path, nrows=BENCHMARK_ROWS), n_draws)
+
+    if save_draws:
+        np.save('kepler/uncertainty_draws.npy', np.concatenate(draw_parts))
+
+    report = {
+        'input': input_path,
+        'model': model_name,
+        'compiled': compiled,
+        'rows': n_rows,
+        'draws_per_candidate': n_draws,
+        'max_batch': max_batch,
+        'perturbed_features': {feature: list(columns) for feature, columns in errors.items()},
+        'seconds': seconds,
+        'draws_per_second': total_draws / seconds,
+        'stage_seconds': scorer.timings,
+        'median_probability_std': float(scores['probability_std'].median()),
+        'class_flip_candidates': int(flips.sum()),
+        'interval_contains_threshold': int(crosses.sum()),
+        'benchmark': bench,
+    }
+    with open('kepler/uncertainty_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n[+] Saved: {output_path}")
+    if save_draws:
+        print(f"[+] Saved: kepler/uncertainty_draws.npy")
+    print(f"[+] Saved: kepler/uncertainty_report.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo probability distributions from the catalog error bars")
+    parser.add_argument('--input', default='kepler/kepler_raw.csv',
+                        help="Candidates in kepler_raw.csv format, with their *_err columns")
+    parser.add_argument('--output', default='kepler/uncertainty_scores.csv')
+    parser.add_argument('--draws', type=int, default=DEFAULT_DRAWS, help="Perturbed copies per candidate")
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH,
+                        help="Rows (candidates x draws) per engineering/model call; bounds memory")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Candidates read from the input at a time")
+    parser.add_argument('--model', default=None, help="Model name (default: best model from script 4)")
+    parser.add_argument('--compiled', action='store_true', help="Score with the compiled tree predictor")
+    parser.add_argument('--save-draws', action='store_true', help="Also save every draw as .npy")
+    parser.add_argument('--benchmark', action='store_true', help="Measure draws/s for several --max-batch sizes")
+    args = parser.parse_args()
+    if args.draws < 1 or args.max_batch < 1:
+        parser.error("--draws and --max-batch must be at least 1")
+    if args.draws > args.max_batch:
+        parser.error(f"--draws ({args.draws}) must not exceed --max-batch ({args.max_batch})")
+    main(args.input, args.output, args.draws, args.max_batch, args.batch_size, model_name=args.model,
+         compiled=args.compiled, save_draws=args.save_draws, run_benchmark=args.benchmark)
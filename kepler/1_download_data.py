@@ -5,6 +5,8 @@ Downloads the Kepler cumulative dataset from NASA Exoplanet Archive
 import requests
 import pandas as pd
 
+from instrumentation import span
+
 print("=" * 80)
 print("DOWNLOADING KEPLER CUMULATIVE DATASET")
 print("=" * 80)
@@ -15,8 +17,10 @@ url = "https://exoplanetarchive.ipac.caltech.edu/TAP/sync?query=select+*+from+cu
 print(f"\nFetching data from NASA Exoplanet Archive...")
 print(f"URL: {url}\n")
 
-response = requests.get(url)
-response.raise_for_status()
+with span('download') as s:
+    response = requests.get(url)
+    response.raise_for_status()
+    s.set(bytes=len(response.content))
 
 # Save raw data
 with open('kepler/kepler_raw.csv', 'wb') as f:
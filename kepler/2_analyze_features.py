@@ -7,16 +7,26 @@ import numpy as np
 from scipy import stats
 import json
 
+from instrumentation import span
+from profiler import profile_frame
+
 print("=" * 80)
 print("INTELLIGENT FEATURE ANALYSIS")
 print("=" * 80)
 
 # Load data
-df = pd.read_csv('kepler/kepler_raw.csv')
+with span('load', path='kepler/kepler_raw.csv') as s:
+    df = pd.read_csv('kepler/kepler_raw.csv')
+    s.set(rows=df.shape[0], cols=df.shape[1])
 
 # Create binary target for analysis
 df['is_exoplanet'] = (df['koi_disposition'] == 'CONFIRMED').astype(int)
 
+# One profiling pass gives every null/inf count, range and quantile used below
+with span('profile', rows=df.shape[0], cols=df.shape[1]):
+    profile = profile_frame(df)
+profile.save('kepler/raw_profile.json')
+
 print(f"\nDataset: {df.shape[0]} rows x {df.shape[1]} columns")
 print(f"Target distribution:")
 print(df['koi_disposition'].value_counts())
@@ -65,7 +75,7 @@ for col in df.columns:
         continue
 
     # High nulls (>50%)
-    null_pct = df[col].isnull().sum() / len(df) * 100
+    null_pct = profile.null_pct(col)
     if null_pct > 50:
         excluded_features['high_nulls'].append((col, f"{null_pct:.1f}%"))
         continue
@@ -109,8 +119,7 @@ for category, features in potential_features.items():
     if features:
         print(f"\n{category.upper().replace('_', ' ')} ({len(features)}):")
         for feat in features:
-            null_pct = df[feat].isnull().sum() / len(df) * 100
-            print(f"   - {feat} (nulls: {null_pct:.1f}%)")
+            print(f"   - {feat} (nulls: {profile.null_pct(feat):.1f}%)")
 
 # Analyze correlations for potential features
 print(f"\n" + "=" * 80)
@@ -123,10 +132,10 @@ for feats in potential_features.values():
 
 # Filter to numeric columns with <30% nulls
 numeric_features = []
+numeric_columns = set(profile.numeric_columns)
 for col in all_potential:
-    if pd.api.types.is_numeric_dtype(df[col]):
-        null_pct = df[col].isnull().sum() / len(df) * 100
-        if null_pct < 30:
+    if col in numeric_columns:
+        if profile.null_pct(col) < 30:
             numeric_features.append(col)
 
 print(f"\nAnalyzing {len(numeric_features)} numeric features with <30% nulls")
@@ -134,33 +143,34 @@ print(f"\nAnalyzing {len(numeric_features)} numeric features with <30% nulls")
 # Calculate different correlation types
 correlations = {}
 
-for feat in numeric_features:
-    # Remove nulls for correlation
-    valid_data = df[[feat, 'is_exoplanet']].dropna()
+with span('correlations', rows=len(df), cols=len(numeric_features)):
+    for feat in numeric_features:
+        # Remove nulls for correlation
+        valid_data = df[[feat, 'is_exoplanet']].dropna()
 
-    if len(valid_data) < 100:
-        continue
+        if len(valid_data) < 100:
+            continue
 
-    X = valid_data[feat].values
-    y = valid_data['is_exoplanet'].values
+        X = valid_data[feat].values
+        y = valid_data['is_exoplanet'].values
 
-    # Pearson (linear)
-    pearson_r, pearson_p = stats.pearsonr(X, y)
+        # Pearson (linear)
+        pearson_r, pearson_p = stats.pearsonr(X, y)
 
-    # Spearman (monotonic, non-linear)
-    spearman_r, spearman_p = stats.spearmanr(X, y)
+        # Spearman (monotonic, non-linear)
+        spearman_r, spearman_p = stats.spearmanr(X, y)
 
-    # Point-biserial (for binary target)
-    pointbiserial_r, pointbiserial_p = stats.pointbiserialr(y, X)
+        # Point-biserial (for binary target)
+        pointbiserial_r, pointbiserial_p = stats.pointbiserialr(y, X)
 
-    correlations[feat] = {
-        'pearson': abs(pearson_r),
-        'spearman': abs(spearman_r),
-        'pointbiserial': abs(pointbiserial_r),
-        'null_pct': df[feat].isnull().sum() / len(df) * 100,
-        'mean_exoplanet': valid_data[valid_data['is_exoplanet'] == 1][feat].mean(),
-        'mean_not_exoplanet': valid_data[valid_data['is_exoplanet'] == 0][feat].mean()
-    }
+        correlations[feat] = {
+            'pearson': abs(pearson_r),
+            'spearman': abs(spearman_r),
+            'pointbiserial': abs(pointbiserial_r),
+            'null_pct': profile.null_pct(feat),
+            'mean_exoplanet': valid_data[valid_data['is_exoplanet'] == 1][feat].mean(),
+            'mean_not_exoplanet': valid_data[valid_data['is_exoplanet'] == 0][feat].mean()
+        }
 
 # Sort by best correlation (using max of all methods)
 sorted_correlations = sorted(
@@ -190,4 +200,5 @@ with open('kepler/feature_analysis.json', 'w') as f:
     json.dump(analysis_results, f, indent=2, default=str)
 
 print(f"\n\nAnalysis saved to: kepler/feature_analysis.json")
+print(f"Data profile saved to: kepler/raw_profile.json")
 print("=" * 80)
@@ -6,69 +6,116 @@ CRITICAL CHECKS:
 - If training accuracy = 100%, something is WRONG (data leakage)
 - Training vs Test accuracy should be reasonable (not > 15% difference)
 - Use cross-validation to ensure robustness
+
+Each CV fold is fitted once (cv_engine.py). With USE_FOLD_ENSEMBLE the fold
+models are averaged for train/test scoring instead of refitting on the full
+training set, so each model costs CV_FOLDS fits instead of CV_FOLDS + 1.
+
+Every run is also appended to the experiment store (experiment_store.py):
+config, data hash, metrics, stage timings and artifact paths.
 """
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 import json
+import os
+import time
 import matplotlib
 matplotlib.use('Agg')  # Non-interactive backend
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from cv_engine import cross_validate_oof
+from instrumentation import span
+from preprocessing import fit_cleaning, apply_cleaning, save_artifacts, MODELS_DIR
+from profiler import load_profile, profile_frame
+from drift_monitor import build_reference
+from feature_store import open_store, STORE_DIR
+from experiment_store import ExperimentStore, data_hash, EXPERIMENTS_DB
+
+# Cross-validation settings
+CV_FOLDS = 3
+USE_FOLD_ENSEMBLE = True  # Score with the averaged fold models instead of a full refit
+
+# Train/test split
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+# Written by script 3 alongside the feature store
+PROFILE_PATH = 'kepler/engineered_profile.json'
+
 print("=" * 80)
 print("MODEL TRAINING AND VALIDATION")
 print("=" * 80)
 
-# Load engineered data
-df = pd.read_csv('kepler/kepler_engineered.csv')
-
-print(f"\nDataset: {df.shape}")
+run_started = time.time()
+timings = {}  # stage -> seconds, for the experiment store
+
+# Load engineered data (memory-mapped float32 matrix, no parsing)
+stage_start = time.perf_counter()
+with span('load', path=STORE_DIR) as s:
+    store = open_store()
+    X = store.frame()
+    y = store.target()
+    s.set(rows=X.shape[0], cols=X.shape[1])
+timings['load'] = time.perf_counter() - stage_start
+
+profile = load_profile(PROFILE_PATH) if os.path.exists(PROFILE_PATH) else None
+if profile is None or not profile.matches(X):
+    print(f"\n[WARNING] {PROFILE_PATH} missing or stale - profiling the data now")
+    with span('profile', rows=X.shape[0], cols=X.shape[1]):
+        profile = profile_frame(X)
+
+print(f"\nDataset: {(X.shape[0], X.shape[1] + 1)}")
 print(f"Target distribution:")
-print(df['is_exoplanet'].value_counts())
-print(f"  Positive rate: {df['is_exoplanet'].mean()*100:.1f}%")
-
-# Prepare data
-X = df.drop(['is_exoplanet'], axis=1)
-y = df['is_exoplanet']
+print(y.value_counts())
+print(f"  Positive rate: {y.mean()*100:.1f}%")
 
 print(f"\nFeatures: {X.shape[1]}")
 print(f"Samples: {len(y)}")
 
 # Clean data - replace inf and very large values
+feature_profile = profile.select(list(X.columns))
 print(f"\nCleaning data...")
-print(f"  Inf values: {np.isinf(X).sum().sum()}")
-print(f"  NaN values: {np.isnan(X).sum().sum()}")
-
-# Replace inf with NaN, then fill with median
-X = X.replace([np.inf, -np.inf], np.nan)
-X = X.fillna(X.median())
-
-# Clip extreme values (beyond 99.9th percentile)
-for col in X.columns:
-    q99 = X[col].quantile(0.999)
-    q01 = X[col].quantile(0.001)
-    X[col] = X[col].clip(q01, q99)
+print(f"  Inf values: {feature_profile.total_infs()}")
+print(f"  NaN values: {feature_profile.total_nulls()}")
+
+X_engineered = X  # uncleaned, for the drift reference
+stage_start = time.perf_counter()
+with span('clean', rows=X.shape[0], cols=X.shape[1]):
+    # Replace inf with NaN, fill with median, clip beyond the 0.1/99.9th percentiles.
+    # The statistics come from the profile and are saved with the models so
+    # later stages clean identically.
+    cleaning = fit_cleaning(X, profile=feature_profile)
+    X = apply_cleaning(X, cleaning)
+timings['clean'] = time.perf_counter() - stage_start
 
 print(f"  After cleaning - Inf: {np.isinf(X).sum().sum()}, NaN: {np.isnan(X).sum().sum()}")
 
 # Train/test split
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42, stratify=y
-)
+with span('split', rows=X.shape[0]):
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
+    )
 
 print(f"\nTrain set: {X_train.shape[0]} samples")
 print(f"Test set: {X_test.shape[0]} samples")
 
+# Histograms of the uncleaned training features; scored batches are compared
+# against them (drift_monitor.py)
+with span('drift_reference', rows=X_train.shape[0], cols=X_train.shape[1]):
+    drift_reference = build_reference(profile_frame(X_engineered.loc[X_train.index]))
+
 # Scale features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
+with span('scale', rows=X.shape[0], cols=X.shape[1]):
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
 
 # ============================================================================
 # Train multiple models
@@ -85,33 +132,55 @@ models = {
 }
 
 results = {}
+fitted_models = {}
+oof_predictions = pd.DataFrame({'is_exoplanet': y_train}, index=X_train.index)
 
 for name, model in models.items():
     print(f"\n>>> Training {name}...")
-
-    # Train
-    model.fit(X_train_scaled, y_train)
-
-    # Predictions
-    y_train_pred = model.predict(X_train_scaled)
-    y_test_pred = model.predict(X_test_scaled)
+    stage_start = time.perf_counter()
+
+    # Cross-validation: each fold is fitted once and its predictions are kept
+    with span('cross_validate', model=name, folds=CV_FOLDS, rows=X_train_scaled.shape[0]):
+        cv = cross_validate_oof(model, X_train_scaled, y_train, n_splits=CV_FOLDS,
+                                X_test=X_test_scaled if USE_FOLD_ENSEMBLE else None, name=name)
+    cv_mean = cv.cv_mean
+    cv_std = cv.cv_std
+    oof_acc = cv.oof_accuracy(y_train)
+    oof_predictions[name] = cv.oof_proba[:, 1]
+
+    if USE_FOLD_ENSEMBLE:
+        # Fold models already scored the test set inside the CV run
+        fitted = cv.ensemble()
+        with span('predict', model=name, rows=X_train_scaled.shape[0]):
+            y_train_pred = fitted.predict(X_train_scaled)
+        y_test_pred = fitted.classes_[np.argmax(cv.test_proba, axis=1)]
+        fit_count = CV_FOLDS
+    else:
+        fitted = model
+        with span('fit', model=name, rows=X_train_scaled.shape[0], cols=X_train_scaled.shape[1]):
+            fitted.fit(X_train_scaled, y_train)
+        with span('predict', model=name, rows=X_train_scaled.shape[0] + X_test_scaled.shape[0]):
+            y_train_pred = fitted.predict(X_train_scaled)
+            y_test_pred = fitted.predict(X_test_scaled)
+        fit_count = CV_FOLDS + 1
+    fitted_models[name] = fitted
+    timings[f'train:{name}'] = time.perf_counter() - stage_start
 
     # Accuracy
     train_acc = accuracy_score(y_train, y_train_pred)
     test_acc = accuracy_score(y_test, y_test_pred)
 
-    # Cross-validation (reduced folds for speed)
-    cv_scores = cross_val_score(model, X_train_scaled, y_train, cv=3, n_jobs=-1)
-    cv_mean = cv_scores.mean()
-    cv_std = cv_scores.std()
-
     # OVERFITTING CHECK
     overfit_gap = train_acc - test_acc
+    # Fold models scored on their own training rows vs on held-out rows
+    fold_gap = cv.fold_train_scores.mean() - cv_mean
 
     print(f"  Train Accuracy: {train_acc*100:.2f}%")
     print(f"  Test Accuracy:  {test_acc*100:.2f}%")
     print(f"  CV Accuracy:    {cv_mean*100:.2f}% (+/- {cv_std*100:.2f}%)")
-    print(f"  Overfit Gap:    {overfit_gap*100:.2f}%")
+    print(f"  OOF Accuracy:   {oof_acc*100:.2f}%")
+    print(f"  Overfit Gap:    {overfit_gap*100:.2f}% (fold train vs OOF: {fold_gap*100:.2f}%)")
+    print(f"  Fits:           {fit_count} ({cv.fit_seconds.sum():.2f}s in CV folds)")
 
     # WARNING FLAGS
     if train_acc >= 0.99:
@@ -126,7 +195,11 @@ for name, model in models.items():
         'test_accuracy': test_acc,
         'cv_mean': cv_mean,
         'cv_std': cv_std,
-        'overfit_gap': overfit_gap
+        'overfit_gap': overfit_gap,
+        'oof_accuracy': oof_acc,
+        'fold_overfit_gap': fold_gap,
+        'fit_count': fit_count,
+        'fit_seconds': float(cv.fit_seconds.sum())
     }
 
 # ============================================================================
@@ -138,7 +211,7 @@ print("BEST MODEL ANALYSIS")
 print("=" * 80)
 
 best_model_name = max(results, key=lambda x: results[x]['test_accuracy'])
-best_model = models[best_model_name]
+best_model = fitted_models[best_model_name]
 
 print(f"\nBest Model: {best_model_name}")
 print(f"  Test Accuracy: {results[best_model_name]['test_accuracy']*100:.2f}%")
@@ -180,13 +253,14 @@ if hasattr(best_model, 'feature_importances_'):
         print(f"{i:<6} {feature_names[idx]:<35} {importances[idx]:<12.6f}")
 
     # Save feature importance plot
-    plt.figure(figsize=(10, 8))
-    plt.barh(range(20), importances[indices[:20]][::-1])
-    plt.yticks(range(20), feature_names[indices[:20]][::-1])
-    plt.xlabel('Feature Importance')
-    plt.title(f'Top 20 Features - {best_model_name}')
-    plt.tight_layout()
-    plt.savefig('kepler/feature_importance.png', dpi=150)
+    with span('plot', figure='feature_importance'):
+        plt.figure(figsize=(10, 8))
+        plt.barh(range(20), importances[indices[:20]][::-1])
+        plt.yticks(range(20), feature_names[indices[:20]][::-1])
+        plt.xlabel('Feature Importance')
+        plt.title(f'Top 20 Features - {best_model_name}')
+        plt.tight_layout()
+        plt.savefig('kepler/feature_importance.png', dpi=150)
     print(f"\n[+] Saved feature importance plot: kepler/feature_importance.png")
 
 # ============================================================================
@@ -202,6 +276,20 @@ comparison_df = pd.DataFrame(results).T
 comparison_df.to_csv('kepler/model_comparison.csv')
 print(f"[+] Saved: kepler/model_comparison.csv")
 
+# Save fitted models with the preprocessing they were trained with
+save_artifacts(fitted_models, {
+    'columns': list(X.columns),
+    'cleaning': cleaning,
+    'scaler': scaler,
+    'train_rows': X_train.index.to_numpy(),
+    'test_rows': X_test.index.to_numpy(),
+}, best_model=best_model_name, drift_reference=drift_reference)
+print(f"[+] Saved: {MODELS_DIR}/ (models + preprocessing + drift reference)")
+
+# Save out-of-fold probabilities (indexed by row of kepler_engineered.csv / the feature store)
+oof_predictions.to_csv('kepler/oof_predictions.csv', index_label='row')
+print(f"[+] Saved: kepler/oof_predictions.csv")
+
 # Save detailed results
 detailed_results = {
     'best_model': best_model_name,
@@ -211,11 +299,13 @@ detailed_results = {
                                                    output_dict=True),
     'confusion_matrix': cm.tolist(),
     'dataset_info': {
-        'total_samples': len(df),
+        'total_samples': len(y),
         'train_samples': len(X_train),
         'test_samples': len(X_test),
         'num_features': X.shape[1],
-        'positive_rate': float(df['is_exoplanet'].mean())
+        'cv_folds': CV_FOLDS,
+        'fold_ensemble': USE_FOLD_ENSEMBLE,
+        'positive_rate': float(y.mean())
     }
 }
 
@@ -224,6 +314,31 @@ with open('kepler/training_results.json', 'w') as f:
 
 print(f"[+] Saved: kepler/training_results.json")
 
+# Append the run to the experiment store
+config = {
+    'cv_folds': CV_FOLDS,
+    'fold_ensemble': USE_FOLD_ENSEMBLE,
+    'test_size': TEST_SIZE,
+    'random_state': RANDOM_STATE,
+    'num_features': X.shape[1],
+    'features': list(X.columns),
+    'models': {name: model.get_params() for name, model in models.items()},
+}
+artifacts = {
+    'models_dir': MODELS_DIR,
+    'model_comparison': 'kepler/model_comparison.csv',
+    'training_results': 'kepler/training_results.json',
+    'oof_predictions': 'kepler/oof_predictions.csv',
+}
+if hasattr(best_model, 'feature_importances_'):
+    artifacts['feature_importance'] = 'kepler/feature_importance.png'
+with ExperimentStore() as experiments:
+    run_id = experiments.log_run(
+        'train_and_validate', config, results, timings=timings, artifacts=artifacts,
+        data_hash=data_hash(store.X, store.y), best_model=best_model_name,
+        duration_seconds=time.time() - run_started, started_at=run_started)
+print(f"[+] Logged run #{run_id} to {EXPERIMENTS_DB}")
+
 # ============================================================================
 # FINAL SUMMARY
 # ============================================================================
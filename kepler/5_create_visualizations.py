@@ -2,7 +2,6 @@
 Script 5: Create Correlation Visualizations
 Creates correlation matrix and heatmap for documentation
 """
-import pandas as pd
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')
@@ -10,27 +9,33 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import spearmanr
 
+from feature_store import open_store, STORE_DIR
+from instrumentation import span
+
 print("=" * 80)
 print("CREATING CORRELATION VISUALIZATIONS")
 print("=" * 80)
 
-# Load engineered data
-df = pd.read_csv('kepler/kepler_engineered.csv')
-
-print(f"\nDataset: {df.shape}")
+# Load engineered data (memory-mapped float32 matrix, no parsing)
+with span('load', path=STORE_DIR) as s:
+    store = open_store()
+    s.set(rows=store.shape[0], cols=store.shape[1])
 
 # Separate features and target
-X = df.drop(['is_exoplanet'], axis=1)
-y = df['is_exoplanet']
+X = store.frame()
+y = store.target()
+
+print(f"\nDataset: {(X.shape[0], X.shape[1] + 1)}")
 
 # Calculate correlation with target
 print(f"\nCalculating correlations with target...")
 correlations = {}
 
-for col in X.columns:
-    # Spearman correlation (handles non-linear relationships)
-    corr, _ = spearmanr(X[col], y)
-    correlations[col] = corr
+with span('correlations', rows=X.shape[0], cols=X.shape[1]):
+    for col in X.columns:
+        # Spearman correlation (handles non-linear relationships)
+        corr, _ = spearmanr(X[col], y)
+        correlations[col] = corr
 
 # Sort by absolute correlation
 sorted_corr = sorted(correlations.items(), key=lambda x: abs(x[1]), reverse=True)
@@ -62,7 +67,8 @@ for i, (bar, val) in enumerate(zip(bars, corr_values)):
              va='center', ha='left' if val > 0 else 'right', fontsize=9)
 
 plt.tight_layout()
-plt.savefig('kepler/correlation_bar_chart.png', dpi=150, bbox_inches='tight')
+with span('plot', figure='correlation_bar_chart'):
+    plt.savefig('kepler/correlation_bar_chart.png', dpi=150, bbox_inches='tight')
 print(f"[+] Saved: kepler/correlation_bar_chart.png")
 
 # ============================================================================
@@ -77,7 +83,8 @@ df_top = X[top_25_features].copy()
 df_top['is_exoplanet'] = y
 
 # Calculate correlation matrix
-corr_matrix = df_top.corr()
+with span('correlation_matrix', rows=df_top.shape[0], cols=df_top.shape[1]):
+    corr_matrix = df_top.corr()
 
 # Create heatmap
 plt.figure(figsize=(16, 14))
@@ -96,7 +103,8 @@ plt.title('Correlation Heatmap - Top 25 Features + Target\n(Green = Positive Cor
 plt.xticks(rotation=45, ha='right', fontsize=10)
 plt.yticks(rotation=0, fontsize=10)
 plt.tight_layout()
-plt.savefig('kepler/correlation_heatmap.png', dpi=150, bbox_inches='tight')
+with span('plot', figure='correlation_heatmap'):
+    plt.savefig('kepler/correlation_heatmap.png', dpi=150, bbox_inches='tight')
 print(f"[+] Saved: kepler/correlation_heatmap.png")
 
 # ============================================================================
@@ -147,7 +155,8 @@ for i, val in enumerate(vals):
     plt.text(val + 0.005, i, f'{val:.3f}', va='center', fontsize=9)
 
 plt.tight_layout()
-plt.savefig('kepler/correlation_by_category.png', dpi=150, bbox_inches='tight')
+with span('plot', figure='correlation_by_category'):
+    plt.savefig('kepler/correlation_by_category.png', dpi=150, bbox_inches='tight')
 print(f"[+] Saved: kepler/correlation_by_category.png")
 
 # ============================================================================
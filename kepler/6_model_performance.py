@@ -1,35 +1,48 @@
 #!/usr/bin/env python3
 """
-Plots model performance metrics from a CSV file.
+Plots model performance from the experiment store.
 
-The script reads a CSV file with columns:
-  model, train_accuracy, test_accuracy, cv_mean, cv_std, overfit_gap
+Two figures are produced from the runs script 4 appended to the experiment
+store (experiment_store.py):
 
-It then generates a bar chart comparing model accuracies with
-cross-validation error bars.
+- model_performance.png: train, test and CV accuracy of every model in one
+  run (the latest by default), with cross-validation error bars and the
+  overfit gap annotated
+- model_history.png: one metric of every model across the matching runs
+
+Runs can be filtered by model, data hash, config value (--param key=value,
+keys as flattened by the store, e.g. cv_folds=5) or the last N runs. Without
+an experiment store, the latest model_comparison.csv is plotted instead.
 
 Usage:
-    python3 plot_model_performance.py
+    python kepler/6_model_performance.py [--metric test_accuracy] [--last 50] [--param cv_folds=3]
 """
+import argparse
+import json
+import os
 
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Non-interactive backend
 import matplotlib.pyplot as plt
 import numpy as np
 
+from experiment_store import ExperimentStore, EXPERIMENTS_DB
+from instrumentation import span
+
 
-def plot_performance(csv_path: str, save_path: str = "model_performance.png") -> None:
+def plot_performance(df: pd.DataFrame, save_path: str, title: str = "Model Performance Comparison") -> None:
     """
-    Plots train, test, and CV mean accuracies from a CSV file.
+    Plots train, test, and CV mean accuracies of one run.
 
     Args:
-        csv_path (str): Path to the input CSV file.
+        df (pd.DataFrame): One row per model with train_accuracy, test_accuracy,
+            cv_mean, cv_std and overfit_gap columns, indexed by model name.
         save_path (str): Output path for the saved image.
+        title (str): Figure title.
     """
-    # Load data
-    df = pd.read_csv(csv_path)
-
     # Extract model names and metrics
-    models = df.iloc[:, 0].values
+    models = df.index.values
     train_acc = df["train_accuracy"].values
     test_acc = df["test_accuracy"].values
     cv_mean = df["cv_mean"].values
@@ -48,7 +61,7 @@ def plot_performance(csv_path: str, save_path: str = "model_performance.png") ->
 
     # Labels and formatting
     ax.set_ylabel("Accuracy")
-    ax.set_title("Model Performance Comparison")
+    ax.set_title(title)
     ax.set_xticks(x)
     ax.set_xticklabels(models, rotation=20)
     ax.set_ylim(0.85, 1.0)
@@ -60,11 +73,93 @@ def plot_performance(csv_path: str, save_path: str = "model_performance.png") ->
         ax.text(x[i], test_acc[i] + 0.005, f"Δ={gap:.3f}", ha="center", fontsize=9)
 
     plt.tight_layout()
-    plt.savefig(save_path, dpi=300)
+    with span('plot', figure='model_performance'):
+        plt.savefig(save_path, dpi=300)
     plt.close()
     print(f"✅ Saved performance plot as: {save_path}")
 
 
+def plot_history(df: pd.DataFrame, metric: str, save_path: str) -> None:
+    """
+    Plots one metric of every model against the run id.
+
+    Args:
+        df (pd.DataFrame): Output of ExperimentStore.query() for one metric.
+        metric (str): Metric name (axis label).
+        save_path (str): Output path for the saved image.
+    """
+    history = df.pivot_table(index="run_id", columns="model", values="value")
+
+    fig, ax = plt.subplots(figsize=(10, 5))
+    for model in history.columns:
+        series = history[model].dropna()
+        ax.plot(series.index, series.values, marker="o", markersize=3, label=model)
+
+    ax.set_xlabel("Run")
+    ax.set_ylabel(metric.replace("_", " ").title())
+    ax.set_title(f"{metric} across {len(history)} runs")
+    ax.legend()
+    ax.grid(linestyle="--", alpha=0.7)
+
+    plt.tight_layout()
+    with span('plot', figure='model_history'):
+        plt.savefig(save_path, dpi=300)
+    plt.close()
+    print(f"✅ Saved history plot as: {save_path}")
+
+
+def _parse_params(pairs):
+    """['cv_folds=5', 'fold_ensemble=true'] -> {'cv_folds': 5, 'fold_ensemble': True}"""
+    params = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        try:
+            params[key] = json.loads(value)
+        except json.JSONDecodeError:
+            params[key] = value
+    return params
+
+
+def main(db_path, metric, model=None, params=None, data_hash=None, last=None, run_id=None):
+    if not os.path.exists(db_path):
+        # No experiment store yet: plot the latest snapshot written by script 4
+        csv_path = os.path.join("kepler", "model_comparison.csv")
+        print(f"[WARNING] {db_path} not found - plotting {csv_path}")
+        plot_performance(pd.read_csv(csv_path, index_col=0), os.path.join("kepler", "model_performance.png"))
+        return
+
+    with ExperimentStore(db_path) as store:
+        print(f"Experiment store: {db_path} ({store.count()} runs)")
+        history = store.query(metric=metric, model=model, params=params, data_hash=data_hash, last=last)
+        if history.empty:
+            print("[WARNING] No runs match the filters")
+            return
+        run = store.run(run_id if run_id is not None else int(history["run_id"].max()))
+        if run is None:
+            print(f"[WARNING] Run #{run_id} not found")
+            return
+
+    print(f"Matching runs: {history['run_id'].nunique()}")
+    best = history.loc[history["value"].idxmax()]
+    print(f"Best {metric}: {best['value']:.4f} ({best['model']}, run #{best['run_id']}, {best['started_at']})")
+
+    snapshot = pd.DataFrame(run["metrics"]).T
+    plot_performance(snapshot, os.path.join("kepler", "model_performance.png"),
+                     title=f"Model Performance Comparison (run #{run['run_id']}, {run['started_at']})")
+    plot_history(history, metric, os.path.join("kepler", "model_history.png"))
+
+
 if __name__ == "__main__":
-    temp_csv = "kepler\model_comparison.csv"
-    plot_performance(temp_csv, "kepler\model_performance.png")
+    parser = argparse.ArgumentParser(description="Plot model performance across training runs")
+    parser.add_argument("--db", default=EXPERIMENTS_DB, help="Experiment store written by script 4")
+    parser.add_argument("--metric", default="test_accuracy", help="Metric plotted across runs")
+    parser.add_argument("--model", default=None, help="Only this model")
+    parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                        help="Only runs with this config value (repeatable)")
+    parser.add_argument("--data-hash", default=None, help="Only runs on this training data")
+    parser.add_argument("--last", type=int, default=None, help="Only the last N runs")
+    parser.add_argument("--run", type=int, default=None,
+                        help="Run shown in the per-model bar chart (default: latest matching run)")
+    args = parser.parse_args()
+    main(args.db, args.metric, model=args.model, params=_parse_params(args.param),
+         data_hash=args.data_hash, last=args.last, run_id=args.run)
@@ -0,0 +1,312 @@
+"""
+Script 7: Incremental Model Update
+Warm-start the trained models after a catalog delta instead of retraining
+
+When the archive reclassifies a few hundred KOIs, the delta (rows in the
+kepler_raw.csv format, keyed by kepoi_name) is merged into the catalog and
+the models saved by script 4 are updated in place:
+- Logistic Regression continues from its previous coefficients (warm_start)
+- Random Forest replaces its oldest trees with trees grown on the updated data
+  (seeded per update, so no tree is a copy of an earlier one)
+- Gradient Boosting appends boosting stages fitted on the updated data
+  (warm_start); n_estimators keeps script 4's value and the appended stages
+  are counted in appended_stages_
+
+The persisted cleaning statistics and scaler are reused unless the updated
+training data drifts more than DRIFT_THRESHOLD standard deviations from the
+scaler's means. Past that point the models live in a stale feature space,
+so the script falls back to a full retrain.
+
+A benchmark compares update time and test accuracy against a full retrain.
+
+Usage:
+    python kepler/7_incremental_update.py --delta kepler/kepler_delta.csv [--save]
+"""
+import argparse
+import copy
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.preprocessing import StandardScaler
+
+from cv_engine import FoldEnsemble, cross_validate_oof
+from features import BASE_FEATURES, engineer_features
+from drift_monitor import build_reference
+from instrumentation import span
+from preprocessing import (fit_cleaning, apply_cleaning, mean_shift,
+                           load_artifacts, save_artifacts, MODELS_DIR)
+from profiler import profile_frame
+
+# Largest standardized mean shift (any feature) that still reuses the saved preprocessing
+DRIFT_THRESHOLD = 0.25
+
+# Fraction of Random Forest trees replaced per update
+RF_REPLACE_FRACTION = 0.2
+
+# Boosting stages appended per update
+GB_APPEND_STAGES = 10
+
+
+def merge_delta(raw, delta):
+    """
+    Applies a catalog delta to the raw table.
+
+    Rows whose kepoi_name already exists are replaced in place (so their row
+    index, and therefore their train/test assignment, is unchanged); new KOIs
+    are appended.
+
+    Args:
+        raw (pd.DataFrame): Current catalog (kepler_raw.csv).
+        delta (pd.DataFrame): Changed rows, same columns.
+
+    Returns:
+        tuple: (merged catalog, index of changed/appended rows)
+    """
+    position = pd.Series(raw.index, index=raw['kepoi_name'])
+    known = delta['kepoi_name'].isin(position.index)
+
+    merged = raw.copy()
+    replacement = delta.loc[known].copy()
+    replacement.index = position[replacement['kepoi_name']].to_numpy()
+    merged.loc[replacement.index, list(delta.columns)] = replacement
+    replaced_rows = replacement.index.to_numpy()
+
+    appended = delta.loc[~known].copy()
+    appended.index = np.arange(len(merged), len(merged) + len(appended))
+    merged = pd.concat([merged, appended])
+
+    changed_rows = np.concatenate([replaced_rows, appended.index.to_numpy()])
+    return merged, changed_rows
+
+
+def build_features(raw):
+    """
+    Engineers and imputes features exactly as script 3 does.
+
+    Returns:
+        tuple: (X features, y target)
+    """
+    df_work = raw[BASE_FEATURES].copy()
+    df_work['is_exoplanet'] = (raw['koi_disposition'] == 'CONFIRMED').astype(int)
+    engineer_features(df_work, verbose=False)
+
+    numeric_cols = df_work.select_dtypes(include=[np.number]).columns
+    df_work[numeric_cols] = df_work[numeric_cols].fillna(df_work[numeric_cols].median())
+    return df_work.drop(['is_exoplanet'], axis=1), df_work['is_exoplanet']
+
+
+def _update_estimator(model, X, y):
+    """
+    Warm-starts a single fitted estimator on the updated training data.
+
+    Hyperparameters are left as script 4 set them, so cloning an updated
+    model (full_retrain, scripts 11 and 15) still gives script 4's setup.
+    The number of updates is kept in `n_updates_`, and for Gradient Boosting
+    the stages added so far in `appended_stages_`.
+    """
+    n_updates = getattr(model, 'n_updates_', 0) + 1
+
+    if isinstance(model, LogisticRegression):
+        # lbfgs starts from the previous coef_/intercept_
+        model.set_params(warm_start=True)
+        model.fit(X, y)
+        model.set_params(warm_start=False)
+
+    elif isinstance(model, RandomForestClassifier):
+        n_trees = model.n_estimators
+        n_new = max(1, int(round(RF_REPLACE_FRACTION * n_trees)))
+        random_state = model.random_state
+        # With a fixed int seed, warm start hands the new trees the same seeds on
+        # every update; a seed per update keeps the forest free of duplicate trees
+        if isinstance(random_state, (int, np.integer)):
+            model.set_params(random_state=int(np.random.SeedSequence([random_state, n_updates]).generate_state(1)[0]))
+        model.set_params(warm_start=True, n_estimators=n_trees + n_new)
+        model.fit(X, y)
+        # Drop the oldest trees so the forest keeps its size
+        model.estimators_ = model.estimators_[n_new:]
+        model.set_params(warm_start=False, n_estimators=n_trees, random_state=random_state)
+
+        seeds = [tree.random_state for tree in model.estimators_]
+        if len(set(seeds)) != len(seeds):
+            raise RuntimeError(f"Random Forest update produced {len(seeds) - len(set(seeds))} duplicate trees")
+
+    elif isinstance(model, GradientBoostingClassifier):
+        # New stages fit the residuals of the existing ensemble on the new data
+        n_estimators = model.n_estimators
+        model.set_params(warm_start=True, n_estimators=model.n_estimators_ + GB_APPEND_STAGES)
+        model.fit(X, y)
+        # predict() uses every fitted stage; the hyperparameter keeps script 4's value
+        model.set_params(warm_start=False, n_estimators=n_estimators)
+        model.appended_stages_ = getattr(model, 'appended_stages_', 0) + GB_APPEND_STAGES
+
+    else:
+        raise TypeError(f"No incremental update for {type(model).__name__}")
+
+    model.n_updates_ = n_updates
+    return model
+
+
+def incremental_update(model, X, y):
+    """
+    Updates a fitted model (or every member of a fold ensemble) in place.
+
+    Args:
+        model: Fitted estimator or FoldEnsemble from script 4.
+        X (np.ndarray): Scaled updated training features.
+        y (np.ndarray): Updated training labels.
+
+    Returns:
+        The updated model.
+    """
+    members = model.fold_models if isinstance(model, FoldEnsemble) else [model]
+    for member in members:
+        _update_estimator(member, X, y)
+    return model
+
+
+def full_retrain(model, X, y):
+    """
+    Retrains a model from scratch with the same hyperparameters and layout
+    (fold ensemble or single model) script 4 produced.
+    """
+    if isinstance(model, FoldEnsemble):
+        template = clone(model.fold_models[0])
+        cv = cross_validate_oof(template, X, y, n_splits=len(model.fold_models))
+        return cv.ensemble()
+    retrained = clone(model)
+    retrained.fit(X, y)
+    return retrained
+
+
+def main(delta_path, save=False):
+    print("=" * 80)
+    print("INCREMENTAL MODEL UPDATE")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    raw = pd.read_csv('kepler/kepler_raw.csv')
+    delta = pd.read_csv(delta_path)
+
+    print(f"\nCatalog: {len(raw)} rows")
+    print(f"Delta:   {len(delta)} rows ({delta_path})")
+
+    with span('merge_delta', rows=len(delta)):
+        raw, changed_rows = merge_delta(raw, delta)
+    with span('engineer_features', rows=len(raw)):
+        X, y = build_features(raw)
+
+    # Existing rows keep their split; appended KOIs join the training set
+    test_rows = preprocessing['test_rows']
+    train_rows = np.setdiff1d(X.index.to_numpy(), test_rows)
+    print(f"Changed rows: {len(changed_rows)} "
+          f"({np.isin(changed_rows, test_rows).sum()} in the test set)")
+
+    # ------------------------------------------------------------------------
+    # Preprocessing: reuse unless the data drifted
+    # ------------------------------------------------------------------------
+    cleaning = preprocessing['cleaning']
+    scaler = preprocessing['scaler']
+    X_clean = apply_cleaning(X, cleaning)
+    shift = mean_shift(X_clean.loc[train_rows], scaler)
+
+    print(f"\nLargest feature mean shift: {shift.max():.3f} std ({shift.idxmax()})")
+    reuse_preprocessing = shift.max() <= DRIFT_THRESHOLD
+    if reuse_preprocessing:
+        print(f"[OK] Below drift threshold ({DRIFT_THRESHOLD}) - reusing saved preprocessing")
+    else:
+        print(f"[WARNING] Drift above {DRIFT_THRESHOLD} - refitting preprocessing, full retrain required")
+        cleaning = fit_cleaning(X)
+        X_clean = apply_cleaning(X, cleaning)
+        scaler = StandardScaler().fit(X_clean.loc[train_rows])
+
+    X_train = scaler.transform(X_clean.loc[train_rows])
+    X_test = scaler.transform(X_clean.loc[test_rows])
+    y_train = y.loc[train_rows].to_numpy()
+    y_test = y.loc[test_rows].to_numpy()
+
+    # ------------------------------------------------------------------------
+    # Benchmark: incremental update vs full retrain
+    # ------------------------------------------------------------------------
+    print(f"\n" + "=" * 80)
+    print("UPDATE vs FULL RETRAIN")
+    print("=" * 80)
+
+    updated_models = {}
+    benchmark = {}
+    for name, model in models.items():
+        print(f"\n>>> {name}")
+        before_acc = accuracy_score(y_test, model.predict(X_test))
+
+        entry = {'accuracy_before': before_acc}
+        if reuse_preprocessing:
+            start = time.perf_counter()
+            with span('incremental_update', model=name, rows=len(y_train)):
+                updated = incremental_update(copy.deepcopy(model), X_train, y_train)
+            entry['update_seconds'] = time.perf_counter() - start
+            entry['update_accuracy'] = accuracy_score(y_test, updated.predict(X_test))
+            member = updated.fold_models[0] if isinstance(updated, FoldEnsemble) else updated
+            if hasattr(member, 'appended_stages_'):
+                entry['appended_stages'] = member.appended_stages_
+            updated_models[name] = updated
+
+        start = time.perf_counter()
+        with span('full_retrain', model=name, rows=len(y_train)):
+            retrained = full_retrain(model, X_train, y_train)
+        entry['retrain_seconds'] = time.perf_counter() - start
+        entry['retrain_accuracy'] = accuracy_score(y_test, retrained.predict(X_test))
+        if not reuse_preprocessing:
+            updated_models[name] = retrained
+
+        print(f"  Before update:   {before_acc*100:.2f}%")
+        if reuse_preprocessing:
+            speedup = entry['retrain_seconds'] / entry['update_seconds']
+            entry['speedup'] = speedup
+            print(f"  Incremental:     {entry['update_accuracy']*100:.2f}% in {entry['update_seconds']:.2f}s")
+            print(f"  Full retrain:    {entry['retrain_accuracy']*100:.2f}% in {entry['retrain_seconds']:.2f}s")
+            print(f"  Speedup:         {speedup:.1f}x, accuracy delta "
+                  f"{(entry['update_accuracy'] - entry['retrain_accuracy'])*100:+.2f}%")
+        else:
+            print(f"  Full retrain:    {entry['retrain_accuracy']*100:.2f}% in {entry['retrain_seconds']:.2f}s")
+        benchmark[name] = entry
+
+    results = {
+        'delta_path': delta_path,
+        'delta_rows': int(len(delta)),
+        'changed_rows': int(len(changed_rows)),
+        'max_mean_shift': float(shift.max()),
+        'reused_preprocessing': bool(reuse_preprocessing),
+        'models': benchmark
+    }
+    with open('kepler/incremental_update_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[+] Saved: kepler/incremental_update_results.json")
+
+    if save:
+        # The training rows changed, so the drift histograms are rebuilt too
+        drift_reference = build_reference(profile_frame(X.loc[train_rows]))
+        save_artifacts(updated_models, {
+            'columns': preprocessing['columns'],
+            'cleaning': cleaning,
+            'scaler': scaler,
+            'train_rows': train_rows,
+            'test_rows': test_rows,
+        }, best_model=preprocessing['best_model'], drift_reference=drift_reference)
+        print(f"[+] Saved updated models: {MODELS_DIR}/")
+
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-start the saved models after a catalog delta")
+    parser.add_argument('--delta', default='kepler/kepler_delta.csv',
+                        help="CSV of changed KOIs in kepler_raw.csv format")
+    parser.add_argument('--save', action='store_true',
+                        help="Overwrite kepler/models/ with the updated models")
+    args = parser.parse_args()
+    main(args.delta, save=args.save)
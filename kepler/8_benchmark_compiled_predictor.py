@@ -0,0 +1,133 @@
+"""
+Script 8: Benchmark Compiled Tree Predictor
+Compare sklearn predict_proba against the flat-array compiled ensembles
+
+For every tree model saved by script 4 this script:
+- compiles it with tree_compiler.compile_model()
+- checks the compiled probabilities are bit-identical to sklearn's on the test set
+- times both predictors for batch sizes 1 to 100k (single rows use predict_proba_one)
+
+Results are saved to kepler/compiled_predictor_benchmark.json.
+
+Usage:
+    python kepler/8_benchmark_compiled_predictor.py
+"""
+import json
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from feature_store import open_store
+from instrumentation import span, time_call
+from preprocessing import load_artifacts, transform_features
+from tree_compiler import compile_model, is_compilable, members
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+
+# Large batches: each timing runs at least this long (instrumentation default: 0.2 s)
+TIMING_SECONDS = 0.5
+
+
+def check_bit_compatibility(model, compiled, X):
+    """
+    Compares compiled and sklearn probabilities.
+
+    Forests are switched to n_jobs=1 for the comparison: with threads, sklearn
+    adds tree outputs in completion order and can differ from itself by an ulp.
+
+    Returns:
+        dict: identical flag and max absolute difference.
+    """
+    saved_jobs = []
+    for member in members(model):
+        if isinstance(member, RandomForestClassifier):
+            saved_jobs.append((member, member.n_jobs))
+            member.n_jobs = 1
+    try:
+        expected = model.predict_proba(X)
+    finally:
+        for member, n_jobs in saved_jobs:
+            member.n_jobs = n_jobs
+
+    actual = compiled.predict_proba(X)
+    single = np.array([compiled.predict_proba_one(row) for row in X[:200]])
+    return {
+        'identical': bool(np.array_equal(expected, actual) and np.array_equal(expected[:200], single)),
+        'max_abs_diff': float(np.max(np.abs(expected - actual)))
+    }
+
+
+def benchmark_latency(model, compiled, X):
+    """Median latency per batch size for sklearn and the compiled predictor."""
+    rows = []
+    for batch_size in BATCH_SIZES:
+        batch = X[np.arange(batch_size) % len(X)]
+        if batch_size == 1:
+            compiled_fn = lambda: compiled.predict_proba_one(batch[0])
+        else:
+            compiled_fn = lambda: compiled.predict_proba(batch)
+
+        sklearn_s = time_call(lambda: model.predict_proba(batch), TIMING_SECONDS)
+        compiled_s = time_call(compiled_fn, TIMING_SECONDS)
+        rows.append({
+            'batch_size': batch_size,
+            'sklearn_seconds': sklearn_s,
+            'compiled_seconds': compiled_s,
+            'speedup': sklearn_s / compiled_s
+        })
+        print(f"  {batch_size:>7}   {sklearn_s*1e3:>12.3f}   {compiled_s*1e3:>12.3f}   {sklearn_s/compiled_s:>7.1f}x")
+    return rows
+
+
+def main():
+    print("=" * 80)
+    print("COMPILED TREE PREDICTOR BENCHMARK")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    X_test = transform_features(open_store().frame(rows=preprocessing['test_rows']), preprocessing)
+    print(f"\nTest set: {X_test.shape[0]} rows x {X_test.shape[1]} features")
+
+    results = {}
+    for name, model in models.items():
+        if not is_compilable(model):
+            print(f"\n>>> {name}: not a tree ensemble, skipped")
+            continue
+
+        print(f"\n>>> {name}")
+        start = time.perf_counter()
+        with span('compile', model=name):
+            compiled = compile_model(model)
+        compile_s = time.perf_counter() - start
+
+        parts = getattr(compiled, 'members', [compiled])
+        n_nodes = sum(p.n_nodes for p in parts)
+        n_trees = sum(p.n_trees for p in parts)
+        print(f"  Compiled {n_trees} trees / {n_nodes} nodes in {compile_s*1e3:.1f} ms")
+
+        check = check_bit_compatibility(model, compiled, X_test)
+        print(f"  Bit-identical to sklearn: {'YES' if check['identical'] else 'NO'} "
+              f"(max abs diff {check['max_abs_diff']:.3g})")
+
+        print(f"\n  {'Batch':>7}   {'sklearn (ms)':>12}   {'compiled (ms)':>12}   {'Speedup':>8}")
+        print("  " + "-" * 50)
+        with span('latency_benchmark', model=name):
+            latency = benchmark_latency(model, compiled, X_test)
+
+        results[name] = {
+            'n_trees': n_trees,
+            'n_nodes': n_nodes,
+            'compile_seconds': compile_s,
+            'bit_compatibility': check,
+            'latency': latency
+        }
+
+    with open('kepler/compiled_predictor_benchmark.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[+] Saved: kepler/compiled_predictor_benchmark.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Script 9: Compact Model Report
+Convert the saved tree models to the compact format and compare them
+
+For every tree model saved by script 4 this script:
+- writes kepler/models/<model>.kmf with model_format.save_compact()
+- reports pickled vs compact size, node counts before/after pruning and
+  the number of distinct leaf values
+- scores the test set with the memory-mapped model and reports accuracy and
+  probability deltas against sklearn (float64 leaf values are exact; the
+  float32 leaf variant is reported for comparison but not saved)
+- on Linux, starts --workers scoring processes per format and reads
+  /proc/self/smaps to show how much of each model is private to a worker
+
+Results are saved to kepler/compact_model_report.json.
+
+Usage:
+    python kepler/9_compact_model_report.py [--workers 4]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import joblib
+import numpy as np
+from sklearn.metrics import accuracy_score
+
+from feature_store import open_store
+from instrumentation import span
+from model_format import load_compact, save_compact, compact_filename
+from preprocessing import load_artifacts, transform_features, MODELS_DIR
+from tree_compiler import is_compilable
+
+
+def _smaps_kb(fields, path='/proc/self/smaps_rollup', mapping=None):
+    """
+    Sums smaps fields (kB), optionally only for mappings of one file.
+    """
+    totals = dict.fromkeys(fields, 0)
+    in_mapping = mapping is None
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if '-' in parts[0] and not parts[0].endswith(':'):
+                # Mapping header line: address perms offset dev inode [path]
+                in_mapping = mapping is None or (len(parts) > 5 and parts[5] == mapping)
+            elif in_mapping and parts[0].rstrip(':') in totals:
+                totals[parts[0].rstrip(':')] += int(parts[1])
+    return totals
+
+
+def _private_kb():
+    usage = _smaps_kb(['Private_Clean', 'Private_Dirty'])
+    return usage['Private_Clean'] + usage['Private_Dirty']
+
+
+def _memory_worker(fmt, path, X, barrier, queue):
+    """Loads one model, scores X, then reports its memory once all workers have."""
+    before = _private_kb()
+    model = load_compact(path) if fmt == 'compact' else joblib.load(path)
+    model.predict_proba(X)
+    barrier.wait()
+
+    result = {'private_growth_kb': _private_kb() - before}
+    if fmt == 'compact':
+        # A freshly written file can still be dirty in the page cache, so
+        # count clean and dirty pages together
+        mapped = _smaps_kb(['Rss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'],
+                           path='/proc/self/smaps', mapping=os.path.abspath(path))
+        result.update({
+            'mapping_rss_kb': mapped['Rss'],
+            'mapping_shared_kb': mapped['Shared_Clean'] + mapped['Shared_Dirty'],
+            'mapping_private_kb': mapped['Private_Clean'] + mapped['Private_Dirty']
+        })
+    barrier.wait()  # keep every mapping alive until all workers have measured
+    queue.put(result)
+
+
+def measure_worker_memory(fmt, path, X, n_workers):
+    """
+    Runs n_workers fresh processes that each load a model file and score X.
+
+    Returns:
+        dict: Mean per-worker measurements.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(n_workers)
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=_memory_worker, args=(fmt, path, X, barrier, queue))
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return {key: float(np.mean([r[key] for r in results])) for key in results[0]}
+
+
+def compare_predictions(model, compact, X, y):
+    """Accuracy and probability deltas of a compact model against the original."""
+    expected = model.predict_proba(X)
+    actual = compact.predict_proba(X)
+    labels = model.classes_[np.argmax(expected, axis=1)]
+    compact_labels = compact.classes_[np.argmax(actual, axis=1)]
+    return {
+        'accuracy': accuracy_score(y, labels),
+        'compact_accuracy': accuracy_score(y, compact_labels),
+        'max_abs_proba_diff': float(np.max(np.abs(expected - actual))),
+        'changed_predictions': int(np.sum(labels != compact_labels))
+    }
+
+
+def main(n_workers):
+    print("=" * 80)
+    print("COMPACT MODEL REPORT")
+    print("=" * 80)
+
+    models, preprocessing = load_artifacts()
+    store = open_store()
+    X_test = transform_features(store.frame(rows=preprocessing['test_rows']), preprocessing)
+    y_test = store.target(rows=preprocessing['test_rows']).to_numpy()
+    print(f"\nTest set: {X_test.shape[0]} rows x {X_test.shape[1]} features")
+
+    measure_memory = n_workers > 0 and sys.platform.startswith('linux')
+    results = {}
+    for name, model in models.items():
+        if not is_compilable(model):
+            print(f"\n>>> {name}: not a tree ensemble, skipped")
+            continue
+
+        print(f"\n>>> {name}")
+        pickle_path = os.path.join(MODELS_DIR, preprocessing['model_files'][name])
+        compact_path = os.path.join(MODELS_DIR, compact_filename(name))
+        with span('save_compact', model=name):
+            stats = save_compact(model, compact_path, metadata={'model': name})
+        compact = load_compact(compact_path)
+
+        pickle_bytes = os.path.getsize(pickle_path)
+        compact_bytes = os.path.getsize(compact_path)
+        nodes_before = sum(s['nodes_before'] for s in stats)
+        nodes_after = sum(s['nodes_after'] for s in stats)
+        print(f"  Size:   {pickle_bytes/1024:,.1f} KB pickled -> {compact_bytes/1024:,.1f} KB "
+              f"compact ({pickle_bytes/compact_bytes:.1f}x smaller)")
+        print(f"  Nodes:  {nodes_before:,} -> {nodes_after:,} "
+              f"({sum(s['unreachable'] for s in stats)} unreachable, "
+              f"{sum(s['collapsed'] for s in stats)} collapsed)")
+        print(f"  Leaves: {sum(s['leaves'] for s in stats):,} stored as "
+              f"{sum(s['unique_leaf_values'] for s in stats):,} distinct values")
+
+        exact = compare_predictions(model, compact, X_test, y_test)
+        print(f"  Accuracy: sklearn {exact['accuracy']*100:.2f}%, compact "
+              f"{exact['compact_accuracy']*100:.2f}% "
+              f"(max prob diff {exact['max_abs_proba_diff']:.3g}, "
+              f"{exact['changed_predictions']} changed predictions)")
+
+        # float32 leaf values: smaller table, probabilities no longer exact
+        with tempfile.TemporaryDirectory() as tmp:
+            f32_path = os.path.join(tmp, 'model.kmf')
+            save_compact(model, f32_path, value_dtype=np.float32)
+            f32_bytes = os.path.getsize(f32_path)
+            f32 = compare_predictions(model, load_compact(f32_path), X_test, y_test)
+        print(f"  float32 leaves: {f32_bytes/1024:,.1f} KB, max prob diff "
+              f"{f32['max_abs_proba_diff']:.3g}, {f32['changed_predictions']} changed predictions")
+
+        entry = {
+            'pickle_bytes': pickle_bytes,
+            'compact_bytes': compact_bytes,
+            'size_ratio': pickle_bytes / compact_bytes,
+            'members': stats,
+            'exact': exact,
+            'float32_leaves': dict(f32, compact_bytes=f32_bytes)
+        }
+
+        if measure_memory:
+            with span('worker_memory', model=name):
+                entry['worker_memory'] = {
+                    'pickle': measure_worker_memory('pickle', pickle_path, X_test, n_workers),
+                    'compact': measure_worker_memory('compact', compact_path, X_test, n_workers)
+                }
+            memory = entry['worker_memory']
+            print(f"  Per-worker private memory ({n_workers} workers): "
+                  f"pickle {memory['pickle']['private_growth_kb']:,.0f} KB, "
+                  f"compact {memory['compact']['private_growth_kb']:,.0f} KB "
+                  f"(mapped model: {memory['compact']['mapping_shared_kb']:,.0f} KB shared, "
+                  f"{memory['compact']['mapping_private_kb']:,.0f} KB private)")
+
+        results[name] = entry
+
+    with open('kepler/compact_model_report.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[+] Saved: kepler/compact_model_report.json")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert tree models to the compact format and report")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Scoring processes per format for the memory check (0 to skip)")
+    args = parser.parse_args()
+    main(args.workers)
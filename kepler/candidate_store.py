@@ -0,0 +1,122 @@
+"""
+Candidate Store
+Columnar copy of the scored candidates with precomputed sort orders, for the web API
+
+Script 10 writes kepler/candidate_store/ next to scored_candidates.csv. The
+frontend's candidate API (projectonasa/models/candidateStore.js) reads it
+into typed arrays once and answers filtered, sorted, paginated queries
+without parsing CSV or sorting per request:
+
+    meta.json                 rows, columns and their files, sort indexes,
+                              value ranges, category counts
+    <column>.f64              numeric column, float64 little-endian (NaN = missing)
+    <column>.u8               categorical column (e.g. koi_disposition) as codes
+                              into meta's categories; 255 = missing
+    <column>.offsets.u32      string column (e.g. kepoi_name): n + 1 byte offsets
+    <column>.utf8             ... into the concatenated UTF-8 values
+    <column>.sort.u32         row numbers in ascending order of the column,
+                              missing values last (meta: `valid` = non-missing rows)
+
+Every numeric column and the row id get a sort index. A query sorted by a
+column walks its index from either end. A range filter on that same column
+becomes two binary searches over the index.
+
+The store is written to a temporary directory. The old store is then renamed
+aside, the new one renamed into place and only then is the old one deleted,
+so readers never see a half-written store. The store directory is missing
+only between the two renames; a reader that hits that gap or is loading the
+old store at that moment fails once and succeeds on its next load.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+CANDIDATE_STORE_DIR = 'kepler/candidate_store'
+META_FILE = 'meta.json'
+
+# String columns with at most this many distinct values are stored as uint8 codes
+MAX_CATEGORIES = 254
+MISSING_CODE = 255
+
+
+def _write(store_dir, name, array):
+    array.tofile(os.path.join(store_dir, name))
+    return name
+
+
+def write_candidate_store(scored, store_dir=CANDIDATE_STORE_DIR, row_id='kepoi_name'):
+    """
+    Writes scored candidates as a columnar store.
+
+    Args:
+        scored (pd.DataFrame): Output of script 10 (one row per candidate).
+        store_dir (str): Output directory (replaced).
+        row_id (str): Identifier column, stored as strings with a sort index.
+
+    Returns:
+        dict: The store's meta.json.
+    """
+    tmp_dir = store_dir.rstrip('/') + '.tmp'
+    old_dir = store_dir.rstrip('/') + '.old'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    n = len(scored)
+    columns, sort_indexes, ranges, counts = [], {}, {}, {}
+    for col in scored.columns:
+        values = scored[col]
+        if pd.api.types.is_numeric_dtype(values):
+            data = values.to_numpy(dtype='<f8')
+            columns.append({'name': col, 'type': 'float64', 'file': _write(tmp_dir, f'{col}.f64', data)})
+            valid = ~np.isnan(data)
+            # Stable argsort puts NaN last
+            order = np.argsort(data, kind='stable').astype('<u4')
+            sort_indexes[col] = {'file': _write(tmp_dir, f'{col}.sort.u32', order), 'valid': int(valid.sum())}
+            if valid.any():
+                ranges[col] = [float(data[valid].min()), float(data[valid].max())]
+            continue
+
+        strings = values.astype('string')
+        distinct = strings.dropna().unique()
+        if col != row_id and len(distinct) <= MAX_CATEGORIES:
+            categories = sorted(distinct)
+            codes = pd.Categorical(strings, categories=categories).codes
+            codes = np.where(codes < 0, MISSING_CODE, codes).astype(np.uint8)
+            columns.append({'name': col, 'type': 'category', 'file': _write(tmp_dir, f'{col}.u8', codes),
+                            'categories': list(categories)})
+            counts[col] = {cat: int((codes == i).sum()) for i, cat in enumerate(categories)}
+            continue
+
+        encoded = [s.encode('utf-8') for s in strings.fillna('')]
+        offsets = np.zeros(n + 1, dtype='<u4')
+        offsets[1:] = np.cumsum([len(s) for s in encoded])
+        _write(tmp_dir, f'{col}.utf8', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        columns.append({'name': col, 'type': 'string', 'offsets': _write(tmp_dir, f'{col}.offsets.u32', offsets),
+                        'data': f'{col}.utf8'})
+        if col == row_id:
+            order = np.argsort(strings.fillna('').to_numpy(dtype=object), kind='stable').astype('<u4')
+            sort_indexes[col] = {'file': _write(tmp_dir, f'{col}.sort.u32', order), 'valid': n}
+
+    meta = {
+        'version': 1,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'rows': n,
+        'row_id': row_id,
+        'columns': columns,
+        'sort_indexes': sort_indexes,
+        'ranges': ranges,
+        'category_counts': counts,
+    }
+    with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(store_dir):
+        os.rename(store_dir, old_dir)
+    os.rename(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
@@ -0,0 +1,164 @@
+"""
+Cascade Inference
+Cheap linear model first, tree ensemble only for candidates it is unsure about
+
+Every candidate is scored by the logistic regression, in one matrix product
+for all rows and all fold models. Rows whose probability falls inside the
+uncertainty band [low, high] are re-scored by the tree ensemble and take
+its probability. Everything else keeps the linear model's probability.
+
+The band is calibrated on the out-of-fold probabilities script 4 saves
+(oof_predictions.csv), so it is chosen on predictions the models did not
+train on. calibrate_band() evaluates every (low, high) pair on a quantile
+grid of the linear model's OOF probabilities. It uses prefix sums over the
+rows sorted by that probability, so each pair costs O(1). It returns the
+band that escalates the fewest rows while keeping the cascade's OOF accuracy
+within `tolerance` of the tree ensemble alone.
+
+The calibrated band is saved as kepler/models/cascade.json next to the models.
+"""
+import json
+import os
+
+import numpy as np
+from scipy.special import expit
+from sklearn.linear_model import LogisticRegression
+
+from cv_engine import FoldEnsemble
+from preprocessing import MODELS_DIR
+from tree_compiler import compile_model
+
+CASCADE_FILE = 'cascade.json'
+
+# OOF accuracy the cascade may lose against the second stage alone
+DEFAULT_TOLERANCE = 0.002
+
+# Candidate band edges: quantiles of the first stage's OOF probabilities
+THRESHOLD_GRID = 201
+
+
+class LinearScorer:
+    """
+    Positive-class probability of a binary LogisticRegression (or a fold
+    ensemble of them) from one matrix product over all members.
+
+    Equal to the model's predict_proba(X)[:, 1] up to floating-point rounding.
+    """
+
+    def __init__(self, model):
+        members = model.fold_models if isinstance(model, FoldEnsemble) else [model]
+        if not all(isinstance(m, LogisticRegression) and list(m.classes_) == [0, 1] for m in members):
+            raise TypeError("LinearScorer needs binary LogisticRegression models with classes [0, 1]")
+        self.coef = np.column_stack([m.coef_[0] for m in members])
+        self.intercept = np.array([m.intercept_[0] for m in members])
+
+    def predict_positive(self, X):
+        return expit(np.asarray(X) @ self.coef + self.intercept).mean(axis=1)
+
+
+class Cascade:
+    """
+    Two-stage scorer.
+
+    Args:
+        first: Fitted LogisticRegression or FoldEnsemble of them.
+        second: Fitted model with predict_proba (sklearn or compiled).
+        low, high (float): Uncertainty band on the first stage's probability.
+    """
+
+    def __init__(self, first, second, low, high):
+        self.first = LinearScorer(first)
+        self.second = second
+        self.low = low
+        self.high = high
+        self.classes_ = np.array([0, 1])
+        self._positive = list(second.classes_).index(1)
+
+    def score(self, X):
+        """
+        Returns:
+            tuple: (positive-class probability, bool mask of rows sent to the second stage)
+        """
+        proba = self.first.predict_positive(X)
+        escalated = (proba >= self.low) & (proba <= self.high)
+        if escalated.any():
+            proba[escalated] = self.second.predict_proba(np.asarray(X)[escalated])[:, self._positive]
+        return proba, escalated
+
+    def predict_proba(self, X):
+        proba, _ = self.score(X)
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X):
+        return (self.score(X)[0] >= 0.5).astype(int)
+
+
+def calibrate_band(first_proba, second_proba, y, tolerance=DEFAULT_TOLERANCE, grid=THRESHOLD_GRID):
+    """
+    Narrowest uncertainty band meeting the accuracy target on OOF data.
+
+    Args:
+        first_proba (np.ndarray): OOF positive probability of the first stage.
+        second_proba (np.ndarray): OOF positive probability of the second stage.
+        y (np.ndarray): Labels.
+        tolerance (float): Accuracy the cascade may lose against the second stage.
+        grid (int): Quantiles of first_proba tried as band edges.
+
+    Returns:
+        dict: low, high, escalated fraction and OOF accuracy of the cascade,
+            the first stage and the second stage.
+    """
+    y = np.asarray(y).astype(bool)
+    order = np.argsort(first_proba, kind='stable')
+    p = np.asarray(first_proba)[order]
+    correct_first = (p >= 0.5) == y[order]
+    correct_second = (np.asarray(second_proba)[order] >= 0.5) == y[order]
+    gain = np.concatenate([[0], np.cumsum(correct_second.astype(np.int64) - correct_first)])
+    n = len(p)
+
+    edges = np.unique(np.concatenate([np.quantile(p, np.linspace(0, 1, grid)), [0.5]]))
+    lows, highs = edges[edges <= 0.5], edges[edges >= 0.5]
+    start = np.searchsorted(p, lows, side='left')[:, None]
+    end = np.searchsorted(p, highs, side='right')[None, :]
+    escalated = end - start
+    accuracy = (correct_first.sum() + gain[end] - gain[start]) / n
+
+    first_accuracy = correct_first.mean()
+    second_accuracy = correct_second.mean()
+    feasible = accuracy >= second_accuracy - tolerance
+    # Fewest escalated rows, then best accuracy
+    cost = np.where(feasible, escalated - accuracy / 2, np.inf)
+    i, j = np.unravel_index(np.argmin(cost), cost.shape)
+    return {
+        'low': float(lows[i]),
+        'high': float(highs[j]),
+        'escalated_fraction': float(escalated[i, j] / n),
+        'oof_accuracy': float(accuracy[i, j]),
+        'first_oof_accuracy': float(first_accuracy),
+        'second_oof_accuracy': float(second_accuracy),
+        'tolerance': tolerance,
+    }
+
+
+def save_config(config, path=os.path.join(MODELS_DIR, CASCADE_FILE)):
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+def load_config(path=os.path.join(MODELS_DIR, CASCADE_FILE)):
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_cascade(models, config):
+    """
+    Cascade from the models saved by script 4 and a saved config.
+
+    The second stage is compiled (tree_compiler.py, bit-identical output)
+    when config['compiled'] is set: escalated rows come in small batches,
+    where the compiled predictor is faster than sklearn's.
+    """
+    second = models[config['second']]
+    if config.get('compiled'):
+        second = compile_model(second)
+    return Cascade(models[config['first']], second, config['low'], config['high'])
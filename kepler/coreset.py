@@ -0,0 +1,183 @@
+"""
+Coreset Sampling
+Stratified, class-balanced training subsets with importance weights
+
+A coreset is a small sample of the training rows that a model can be fitted
+on in place of all of them. It is drawn per class of is_exoplanet, with an
+equal share per class. Each row gets an importance weight equal to the
+number of training rows it stands for. Fitting with those weights restores
+the catalog's class balance, so a model trained on the coreset targets the
+same decision boundary as one trained on everything. Meanwhile the minority
+class is represented by as many distinct rows as the majority.
+
+Optionally, sampling leans toward hard examples: rows a pilot logistic
+regression gets wrong or is unsure about. The pilot is fitted on a small
+stratified sample and scores a candidate pool a few times the coreset size,
+not the whole catalog. Rows are drawn from the pool with probability
+proportional to their hardness, and their weights are divided by it, which
+keeps the weighted coreset unbiased.
+
+Apart from one pass over the target vector, the cost of every step grows
+with the coreset size, not the catalog size.
+"""
+import numpy as np
+from scipy.stats import norm
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from preprocessing import fit_cleaning, apply_cleaning
+
+# Candidate pool for hard-example sampling, in multiples of the coreset size
+POOL_FACTOR = 5
+
+# Rows in the pilot model's training sample
+PILOT_SIZE = 1000
+
+# Added to every hardness so easy rows keep a non-zero sampling probability
+HARDNESS_FLOOR = 0.05
+
+
+def class_rows(y):
+    """Row numbers of each class, e.g. {0: array([...]), 1: array([...])}."""
+    y = np.asarray(y)
+    return {c: np.flatnonzero(y == c) for c in np.unique(y)}
+
+
+def balanced_sizes(class_counts, size):
+    """
+    Rows to draw per class: an equal share each, with what a small class
+    cannot fill given to the others.
+
+    Args:
+        class_counts (dict): class -> available rows.
+        size (int): Total rows to draw.
+
+    Returns:
+        dict: class -> rows to draw.
+    """
+    sizes = {c: 0 for c in class_counts}
+    remaining = min(size, sum(class_counts.values()))
+    open_classes = sorted(class_counts, key=lambda c: class_counts[c])
+    while remaining > 0 and open_classes:
+        share = remaining // len(open_classes)
+        extra = remaining - share * len(open_classes)
+        c = open_classes.pop(0)
+        take = min(class_counts[c] - sizes[c], share + (1 if extra else 0))
+        sizes[c] += take
+        remaining -= take
+    return sizes
+
+
+def hardness(X, y, pilot_rows, pool_rows):
+    """
+    1 - pilot probability of the true class, for the pool rows.
+
+    Args:
+        X (callable): rows -> pd.DataFrame of engineered features (e.g. store.frame).
+        y (np.ndarray): Target of all rows.
+        pilot_rows (np.ndarray): Rows the pilot model is fitted on.
+        pool_rows (np.ndarray): Rows to score.
+
+    Returns:
+        np.ndarray: Hardness in [0, 1] per pool row.
+    """
+    pilot = X(pilot_rows)
+    cleaning = fit_cleaning(pilot)
+    scaler = StandardScaler().fit(apply_cleaning(pilot, cleaning))
+    model = LogisticRegression(max_iter=1000, class_weight='balanced')
+    model.fit(scaler.transform(apply_cleaning(pilot, cleaning)), y[pilot_rows])
+    proba = model.predict_proba(scaler.transform(apply_cleaning(X(pool_rows), cleaning)))
+    true_class = np.searchsorted(model.classes_, y[pool_rows])
+    return 1.0 - proba[np.arange(len(pool_rows)), true_class]
+
+
+def stratified_coreset(y, rows, size, X=None, hard=False, random_state=42):
+    """
+    Class-balanced coreset of `rows` with importance weights.
+
+    Args:
+        y (np.ndarray): Target of all rows.
+        rows (np.ndarray): Rows the coreset is drawn from (the training split).
+        size (int): Coreset size.
+        X (callable): rows -> engineered features; needed when hard is set.
+        hard (bool): Lean toward rows a pilot model finds hard.
+        random_state (int): Seed.
+
+    Returns:
+        tuple: (sorted coreset row numbers, importance weights in the same
+            order; the weights sum to len(rows))
+    """
+    rng = np.random.default_rng(random_state)
+    y = np.asarray(y)
+    by_class = {c: rows[members] for c, members in class_rows(y[rows]).items()}
+    class_totals = {c: len(r) for c, r in by_class.items()}
+    sizes = balanced_sizes(class_totals, size)
+
+    hardness_by_class = None
+    if hard:
+        if X is None:
+            raise ValueError("Hard-example sampling needs the features (X)")
+        pool_sizes = balanced_sizes(class_totals, POOL_FACTOR * size)
+        pools = {c: rng.choice(by_class[c], pool_sizes[c], replace=False) for c in by_class}
+        pool = np.concatenate(list(pools.values()))
+        # The pilot trains on pool rows too: its hardness only has to rank them
+        pilot_rows = np.sort(rng.choice(pool, min(PILOT_SIZE, len(pool)), replace=False))
+        scores = np.split(hardness(X, y, pilot_rows, pool) + HARDNESS_FLOOR,
+                          np.cumsum([len(r) for r in pools.values()])[:-1])
+        hardness_by_class = dict(zip(pools, scores))
+        by_class = pools
+
+    chosen, weights = [], []
+    for c, members in by_class.items():
+        n = sizes[c]
+        if n == 0:
+            continue
+        if hardness_by_class is None:
+            picked = rng.choice(members, n, replace=False)
+            w = np.ones(n)
+        else:
+            p = hardness_by_class[c] / hardness_by_class[c].sum()
+            # Weighted sampling without replacement (exponential keys)
+            picked_idx = np.argsort(rng.exponential(size=len(members)) / p)[:n]
+            picked = members[picked_idx]
+            # Inverse inclusion probability: a row drawn with probability
+            # ~ n * p_i stands for 1 / (n * p_i) rows of the pool
+            w = 1.0 / np.minimum(n * p[picked_idx], 1.0)
+        w *= class_totals[c] / w.sum()
+        chosen.append(picked)
+        weights.append(w)
+
+    chosen = np.concatenate(chosen)
+    weights = np.concatenate(weights)
+    order = np.argsort(chosen)
+    return chosen[order], weights[order]
+
+
+def stratified_sample(y, rows, size, random_state=42):
+    """Sample of `rows` with the classes in their catalog proportions (for evaluation)."""
+    rng = np.random.default_rng(random_state)
+    y = np.asarray(y)
+    if size >= len(rows):
+        return np.sort(rows)
+    picked = []
+    for c, members in class_rows(y[rows]).items():
+        n = int(round(size * len(members) / len(rows)))
+        picked.append(rng.choice(rows[members], min(n, len(members)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def wilson_interval(successes, n, confidence=0.95):
+    """
+    Wilson score interval for a binomial proportion (e.g. accuracy).
+
+    Returns:
+        tuple: (low, high)
+    """
+    if n == 0:
+        return 0.0, 1.0
+    z = norm.ppf(0.5 + confidence / 2)
+    p = successes / n
+    denom = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return float(center - half), float(center + half)
@@ -0,0 +1,147 @@
+"""
+Out-of-Fold Cross-Validation Engine
+Fits each CV fold once and keeps everything the fold produced
+
+cross_val_score() refits the model on every fold and throws away the fold
+models and their predictions, so script 4 used to pay for one full fit plus
+three fold fits per model. This engine fits each fold once and keeps:
+- out-of-fold probabilities for every training row (overfit checks, threshold tuning)
+- the fold models themselves, usable as an averaged ensemble for test scoring
+- per-fold train/validation accuracy and fit time
+
+Folds are the same StratifiedKFold splits cross_val_score(cv=k) uses for a
+classifier, so CV accuracy is comparable with earlier runs.
+"""
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+
+from instrumentation import record
+
+
+class FoldEnsemble:
+    """
+    Averages predict_proba over the fold models of one CV run.
+
+    Exposes the parts of the sklearn classifier API the pipeline uses
+    (classes_, predict, predict_proba, feature_importances_).
+    """
+
+    def __init__(self, fold_models):
+        self.fold_models = list(fold_models)
+        self.classes_ = self.fold_models[0].classes_
+
+    def predict_proba(self, X):
+        proba = self.fold_models[0].predict_proba(X)
+        for model in self.fold_models[1:]:
+            proba = proba + model.predict_proba(X)
+        return proba / len(self.fold_models)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    @property
+    def feature_importances_(self):
+        if not hasattr(self.fold_models[0], 'feature_importances_'):
+            raise AttributeError('fold models do not expose feature_importances_')
+        return np.mean([m.feature_importances_ for m in self.fold_models], axis=0)
+
+
+class CVResult:
+    """Everything one out-of-fold CV run produced for a single model."""
+
+    def __init__(self, fold_models, oof_proba, fold_scores, fold_train_scores,
+                 fit_seconds, test_proba=None):
+        self.fold_models = fold_models
+        self.oof_proba = oof_proba
+        self.fold_scores = np.asarray(fold_scores)
+        self.fold_train_scores = np.asarray(fold_train_scores)
+        self.fit_seconds = np.asarray(fit_seconds)
+        self.test_proba = test_proba
+
+    @property
+    def cv_mean(self):
+        return self.fold_scores.mean()
+
+    @property
+    def cv_std(self):
+        return self.fold_scores.std()
+
+    def oof_accuracy(self, y):
+        """Accuracy of the pooled out-of-fold predictions."""
+        classes = self.fold_models[0].classes_
+        return accuracy_score(y, classes[np.argmax(self.oof_proba, axis=1)])
+
+    def ensemble(self):
+        return FoldEnsemble(self.fold_models)
+
+
+def _fit_fold(model, X, y, train_idx, val_idx, X_test):
+    """Fits one fold and returns its model, predictions and scores."""
+    start = time.perf_counter()
+    fold_model = clone(model)
+    fold_model.fit(X[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - start
+
+    val_proba = fold_model.predict_proba(X[val_idx])
+    train_score = accuracy_score(y[train_idx], fold_model.predict(X[train_idx]))
+    val_score = accuracy_score(y[val_idx], fold_model.classes_[np.argmax(val_proba, axis=1)])
+    test_proba = fold_model.predict_proba(X_test) if X_test is not None else None
+
+    return fold_model, val_proba, train_score, val_score, fit_seconds, test_proba
+
+
+def cross_validate_oof(model, X, y, n_splits=3, X_test=None, n_jobs=-1, name=None):
+    """
+    Runs k-fold CV, fitting each fold exactly once.
+
+    Args:
+        model: Unfitted sklearn classifier (cloned per fold).
+        X (np.ndarray): Training features.
+        y (array-like): Training labels.
+        n_splits (int): Number of stratified folds.
+        X_test (np.ndarray): Optional test features; each fold model scores them
+            and the averaged probabilities are returned as test_proba.
+        n_jobs (int): Folds fitted in parallel (joblib semantics).
+        name (str): Model name used in trace records.
+
+    Returns:
+        CVResult: Fold models, out-of-fold probabilities and fold scores.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    folds = list(StratifiedKFold(n_splits=n_splits).split(X, y))
+
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(model, X, y, train_idx, val_idx, X_test)
+        for train_idx, val_idx in folds
+    )
+
+    fold_models, fold_scores, fold_train_scores, fit_seconds = [], [], [], []
+    oof_proba = None
+    test_proba = None
+    for fold, ((train_idx, val_idx), output) in enumerate(zip(folds, outputs)):
+        fold_model, val_proba, train_score, val_score, seconds, fold_test_proba = output
+        if oof_proba is None:
+            oof_proba = np.zeros((len(y), val_proba.shape[1]))
+        oof_proba[val_idx] = val_proba
+
+        if fold_test_proba is not None:
+            test_proba = fold_test_proba if test_proba is None else test_proba + fold_test_proba
+
+        fold_models.append(fold_model)
+        fold_scores.append(val_score)
+        fold_train_scores.append(train_score)
+        fit_seconds.append(seconds)
+        record('cv_fold', seconds, model=name, fold=fold, rows=len(train_idx),
+               val_accuracy=val_score)
+
+    if test_proba is not None:
+        test_proba = test_proba / n_splits
+
+    return CVResult(fold_models, oof_proba, fold_scores, fold_train_scores,
+                    fit_seconds, test_proba=test_proba)
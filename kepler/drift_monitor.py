@@ -0,0 +1,220 @@
+"""
+Feature Drift Monitor
+Binned reference histograms of the training features and streaming PSI/KS scores
+
+Script 4 builds a DriftReference from the profile of its training rows
+(profiler.py): for each engineered feature, bin edges at the training
+deciles and the training count per bin, plus one bin for missing values
+(NaN or inf). The reference is saved next to the models.
+
+A DriftMonitor keeps one count array per feature, the same shape as the
+reference, and adds each scored batch to it. Memory does not grow with the
+stream, and an update is one searchsorted per feature plus a bincount.
+After every update it recomputes, from the counts alone:
+
+    PSI = sum_i (a_i - e_i) * ln(a_i / e_i)      (bin shares, smoothed)
+    KS  = max_i |A_i - E_i|                      (cumulative bin shares)
+
+and raises an alert for every feature that crosses PSI_THRESHOLD or
+KS_THRESHOLD (once per crossing, after MIN_ROWS rows). With decay < 1 the
+counts are down-weighted before each batch, so the scores track recent
+batches instead of everything since the monitor started.
+"""
+import json
+
+import numpy as np
+
+from instrumentation import record
+
+# Equal-frequency bins per feature (fewer when the feature has few distinct values)
+DEFAULT_BINS = 10
+
+# Common PSI reading: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant shift
+PSI_THRESHOLD = 0.25
+KS_THRESHOLD = 0.15
+
+# Rows seen before any alert can fire (PSI is noisy on small samples)
+MIN_ROWS = 200
+
+# Floor on bin shares so empty bins do not make PSI infinite
+PSI_EPSILON = 1e-4
+
+
+def psi(expected, actual):
+    """
+    Population stability index per row of two (features x bins) count arrays.
+    """
+    e = np.maximum(expected / expected.sum(axis=1, keepdims=True), PSI_EPSILON)
+    a = np.maximum(actual / np.maximum(actual.sum(axis=1, keepdims=True), 1e-300), PSI_EPSILON)
+    return ((a - e) * np.log(a / e)).sum(axis=1)
+
+
+def ks(expected, actual):
+    """
+    Kolmogorov-Smirnov distance between binned distributions, per row.
+    """
+    e = np.cumsum(expected, axis=1) / expected.sum(axis=1, keepdims=True)
+    a = np.cumsum(actual, axis=1) / np.maximum(actual.sum(axis=1, keepdims=True), 1e-300)
+    return np.abs(a - e).max(axis=1)
+
+
+class DriftReference:
+    """
+    Training histograms: per feature, interior bin edges and counts.
+
+    counts has one row per feature and n_slots columns. Feature j uses
+    slots 0..len(edges[j]) for finite values (slot = number of edges <= x)
+    and the last slot for NaN/inf; slots in between are always empty.
+    """
+
+    def __init__(self, columns, edges, counts):
+        self.columns = list(columns)
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.counts = np.asarray(counts, dtype=np.float64)
+
+    @property
+    def n_slots(self):
+        return self.counts.shape[1]
+
+    @property
+    def rows(self):
+        return int(self.counts[0].sum()) if len(self.columns) else 0
+
+    def bin_counts(self, X):
+        """
+        Histogram of a batch on the reference bins.
+
+        Args:
+            X (np.ndarray): Features in reference column order, shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: Counts, shape (n_features, n_slots).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        slots = np.empty(X.shape, dtype=np.int64)
+        for j, edges in enumerate(self.edges):
+            slots[:, j] = np.searchsorted(edges, X[:, j], side='right')
+        slots[~np.isfinite(X)] = self.n_slots - 1
+        flat = slots + np.arange(X.shape[1]) * self.n_slots
+        counts = np.bincount(flat.ravel(), minlength=X.shape[1] * self.n_slots)
+        return counts.reshape(X.shape[1], self.n_slots).astype(np.float64)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'columns': self.columns,
+                'edges': [e.tolist() for e in self.edges],
+                'counts': self.counts.tolist(),
+            }, f)
+
+
+def build_reference(profile, columns=None, n_bins=DEFAULT_BINS):
+    """
+    Reference histograms from a profile of the training rows.
+
+    Edges are the training quantiles at 1/n_bins, 2/n_bins, ... (duplicates
+    dropped), and the counts come straight from the profile's value counts,
+    so no second pass over the data is needed.
+
+    Args:
+        profile (DataProfile): Profile of the training features.
+        columns (list): Features to monitor (default: all numeric columns).
+        n_bins (int): Target bins per feature.
+
+    Returns:
+        DriftReference
+    """
+    columns = profile.numeric_columns if columns is None else list(columns)
+    quantiles = np.arange(1, n_bins) / n_bins
+    edges = []
+    for col in columns:
+        column_edges = [profile.quantile(col, q) for q in quantiles]
+        edges.append(np.unique([e for e in column_edges if not np.isnan(e)]))
+
+    n_slots = max(len(e) for e in edges) + 2
+    counts = np.zeros((len(columns), n_slots))
+    for j, col in enumerate(columns):
+        stats = profile.columns[col]
+        slots = np.searchsorted(edges[j], stats['values'], side='right')
+        counts[j, :len(edges[j]) + 1] = np.bincount(slots, weights=stats['counts'],
+                                                    minlength=len(edges[j]) + 1)
+        counts[j, -1] = profile.null_count(col) + profile.inf_count(col)
+    return DriftReference(columns, edges, counts)
+
+
+def load_reference(path):
+    with open(path) as f:
+        data = json.load(f)
+    return DriftReference(data['columns'], data['edges'], data['counts'])
+
+
+class DriftMonitor:
+    """
+    Streaming histograms of scored batches, compared against a reference.
+
+    Args:
+        reference (DriftReference): Training histograms.
+        psi_threshold (float): PSI at which a feature alerts.
+        ks_threshold (float): Binned KS distance at which a feature alerts.
+        min_rows (int): Rows needed before alerts fire.
+        decay (float): Weight kept by the existing counts at each update
+            (1.0 = all rows since the start count equally).
+    """
+
+    def __init__(self, reference, psi_threshold=PSI_THRESHOLD, ks_threshold=KS_THRESHOLD,
+                 min_rows=MIN_ROWS, decay=1.0):
+        self.reference = reference
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.min_rows = min_rows
+        self.decay = decay
+        self.counts = np.zeros_like(reference.counts)
+        self.rows_seen = 0
+        self.alerting = np.zeros(len(reference.columns), dtype=bool)
+        self.psi = np.zeros(len(reference.columns))
+        self.ks = np.zeros(len(reference.columns))
+
+    def update(self, X):
+        """
+        Adds a batch and returns the alerts it triggered.
+
+        Args:
+            X (pd.DataFrame or np.ndarray): Batch features; a DataFrame is
+                reordered to the reference columns.
+
+        Returns:
+            list: One dict per feature that crossed a threshold with this batch.
+        """
+        if hasattr(X, 'columns'):
+            X = X[self.reference.columns].to_numpy(dtype=np.float64)
+        batch = self.reference.bin_counts(X)
+        self.counts *= self.decay
+        self.counts += batch
+        self.rows_seen += len(X)
+
+        self.psi = psi(self.reference.counts, self.counts)
+        self.ks = ks(self.reference.counts, self.counts)
+        if self.rows_seen < self.min_rows:
+            return []
+
+        drifted = (self.psi >= self.psi_threshold) | (self.ks >= self.ks_threshold)
+        alerts = []
+        for j in np.flatnonzero(drifted & ~self.alerting):
+            alert = {'feature': self.reference.columns[j], 'psi': float(self.psi[j]),
+                     'ks': float(self.ks[j]), 'rows_seen': self.rows_seen}
+            record('drift_alert', 0.0, **alert)
+            alerts.append(alert)
+        self.alerting = drifted
+        return alerts
+
+    def scores(self):
+        """
+        Current drift score of every feature, worst PSI first.
+
+        Returns:
+            list: dicts with feature, psi, ks and alert flag.
+        """
+        order = np.argsort(-self.psi)
+        return [{'feature': self.reference.columns[j], 'psi': float(self.psi[j]),
+                 'ks': float(self.ks[j]), 'alert': bool(self.alerting[j])}
+                for j in order]
@@ -0,0 +1,226 @@
+"""
+Experiment Store
+Append-only SQLite record of every training run, with indexed queries across runs
+
+Script 4 overwrites model_comparison.csv and training_results.json on every
+run. In addition it appends the run here: its configuration, a hash of the
+training data, the metrics of every model, stage timings and the paths of
+the artifacts it wrote. Rows are only ever inserted, so every run stays
+comparable with every other.
+
+Tables (kepler/experiments.sqlite):
+
+    runs      run_id, started_at, script, data_hash, best_model,
+              duration_seconds, config (JSON), artifacts (JSON)
+    params    run_id, key, value     - the config flattened to dotted keys
+    metrics   run_id, model, name, value
+    timings   run_id, stage, seconds
+
+Indexes on metrics(name, model, value), params(key, value), runs(started_at)
+and runs(data_hash) keep filtered queries (e.g. test accuracy of Gradient
+Boosting above 0.92 on one dataset with cv_folds = 5) to index lookups when
+there are thousands of runs.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+EXPERIMENTS_DB = 'kepler/experiments.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    script TEXT NOT NULL,
+    data_hash TEXT,
+    best_model TEXT,
+    duration_seconds REAL,
+    config TEXT NOT NULL,
+    artifacts TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    model TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_runs_data ON runs(data_hash);
+CREATE INDEX IF NOT EXISTS idx_params_key ON params(key, value, run_id);
+CREATE INDEX IF NOT EXISTS idx_metrics_name ON metrics(name, model, value);
+CREATE INDEX IF NOT EXISTS idx_metrics_run ON metrics(run_id);
+CREATE INDEX IF NOT EXISTS idx_timings_run ON timings(run_id);
+"""
+
+
+def data_hash(*arrays):
+    """SHA-1 over the bytes of the given arrays (e.g. the feature matrix and target)."""
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.dtype, array.shape)).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _flatten(config, prefix=''):
+    """{'models': {'RF': {'n_estimators': 50}}} -> {'models.RF.n_estimators': '50'}"""
+    flat = {}
+    for key, value in config.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        else:
+            flat[name] = json.dumps(value, default=str)
+    return flat
+
+
+class ExperimentStore:
+    """
+    Connection to the experiment database (created on first use).
+
+    Args:
+        path (str): SQLite file.
+    """
+
+    def __init__(self, path=EXPERIMENTS_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def log_run(self, script, config, metrics, timings=None, artifacts=None, data_hash=None,
+                best_model=None, duration_seconds=None, started_at=None):
+        """
+        Appends one run in a single transaction.
+
+        Args:
+            script (str): Script that produced the run.
+            config (dict): Run configuration (nested dicts allowed).
+            metrics (dict): model -> {metric name -> value}.
+            timings (dict): stage -> seconds.
+            artifacts (dict): artifact name -> path.
+            data_hash (str): Hash of the training data (data_hash()).
+            best_model (str): Name of the selected model.
+            duration_seconds (float): Wall time of the run.
+            started_at (float): Start time (epoch seconds, default now).
+
+        Returns:
+            int: run_id
+        """
+        started = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started_at or time.time()))
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (started_at, script, data_hash, best_model, duration_seconds, config, artifacts) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (started, script, data_hash, best_model, duration_seconds,
+                 json.dumps(config, default=str), json.dumps(artifacts or {})))
+            run_id = cursor.lastrowid
+            self.conn.executemany('INSERT INTO params VALUES (?, ?, ?)',
+                                  [(run_id, key, value) for key, value in _flatten(config).items()])
+            self.conn.executemany('INSERT INTO metrics VALUES (?, ?, ?, ?)',
+                                  [(run_id, model, name, None if value is None else float(value))
+                                   for model, values in metrics.items() for name, value in values.items()])
+            self.conn.executemany('INSERT INTO timings VALUES (?, ?, ?)',
+                                  [(run_id, stage, float(seconds)) for stage, seconds in (timings or {}).items()])
+        return run_id
+
+    def query(self, metric=None, model=None, min_value=None, max_value=None, params=None,
+              data_hash=None, since=None, last=None):
+        """
+        Metrics of the runs matching every given filter, oldest run first.
+
+        Args:
+            metric (str): Metric name, e.g. 'test_accuracy' (default: all).
+            model (str): Model name (default: all).
+            min_value, max_value (float): Bounds on the metric value.
+            params (dict): Config key (dotted, as flattened) -> required value.
+            data_hash (str): Only runs on this data.
+            since (str): Only runs started at or after this ISO timestamp.
+            last (int): Only the most recent `last` matching runs.
+
+        Returns:
+            pd.DataFrame: run_id, started_at, data_hash, best_model, model,
+                metric, value.
+        """
+        where, args = [], []
+        for column, value in (('m.name', metric), ('m.model', model), ('r.data_hash', data_hash)):
+            if value is not None:
+                where.append(f'{column} = ?')
+                args.append(value)
+        if min_value is not None:
+            where.append('m.value >= ?')
+            args.append(min_value)
+        if max_value is not None:
+            where.append('m.value <= ?')
+            args.append(max_value)
+        if since is not None:
+            where.append('r.started_at >= ?')
+            args.append(since)
+        for key, value in (params or {}).items():
+            where.append('r.run_id IN (SELECT run_id FROM params WHERE key = ? AND value = ?)')
+            args.extend([key, json.dumps(value, default=str)])
+
+        source = 'FROM metrics m JOIN runs r ON r.run_id = m.run_id'
+        if last is not None:
+            # The newest `last` runs among those passing the other filters
+            matching = source + (' WHERE ' + ' AND '.join(where) if where else '')
+            where.append(f'r.run_id IN (SELECT DISTINCT r.run_id {matching} ORDER BY r.run_id DESC LIMIT ?)')
+            args = args + args + [int(last)]
+
+        sql = f'SELECT r.run_id, r.started_at, r.data_hash, r.best_model, m.model, m.name AS metric, m.value {source}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY r.run_id, m.model, m.name'
+        return pd.read_sql_query(sql, self.conn, params=args)
+
+    def run(self, run_id):
+        """Everything recorded for one run (latest run when run_id is None)."""
+        if run_id is None:
+            row = self.conn.execute('SELECT MAX(run_id) FROM runs').fetchone()
+            run_id = row[0]
+            if run_id is None:
+                return None
+        row = self.conn.execute('SELECT run_id, started_at, script, data_hash, best_model, duration_seconds, '
+                                'config, artifacts FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        if row is None:
+            return None
+        metrics = {}
+        for model, name, value in self.conn.execute('SELECT model, name, value FROM metrics WHERE run_id = ?',
+                                                    (run_id,)):
+            metrics.setdefault(model, {})[name] = value
+        timings = dict(self.conn.execute('SELECT stage, seconds FROM timings WHERE run_id = ?', (run_id,)))
+        return {
+            'run_id': row[0], 'started_at': row[1], 'script': row[2], 'data_hash': row[3],
+            'best_model': row[4], 'duration_seconds': row[5], 'config': json.loads(row[6]),
+            'artifacts': json.loads(row[7]), 'metrics': metrics, 'timings': timings,
+        }
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
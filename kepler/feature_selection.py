@@ -0,0 +1,168 @@
+"""
+Feature Selection
+mRMR ranking and redundancy pruning from a cached feature correlation matrix
+
+Many engineered features carry the same information (koi_period /
+orbital_velocity / koi_sma, periapsis / apoapsis distance, the koi_*mag
+bands). Selection works from two arrays computed once on the cleaned
+training rows:
+
+    corr       |Spearman rho| between every pair of features
+    relevance  |Spearman rho| between each feature and the target
+
+Spearman (Pearson on ranks) is used because most features are heavily skewed
+and the models only see their order through the tree splits. Both arrays are
+cached in kepler/models/feature_correlation.npz under a fingerprint of the
+training matrix, so ranking and pruning for any subset size costs nothing
+after the first run.
+
+mrmr_rank() orders features greedily by max-relevance min-redundancy:
+
+    score_j = relevance_j - mean_{s in selected} corr[j, s]
+
+so the first k features of the ranking are the reduced set of size k.
+prune_redundant() drops, from any ordering, each feature correlated above a
+threshold with one kept before it.
+"""
+import hashlib
+import os
+
+import numpy as np
+from scipy.stats import rankdata
+
+from preprocessing import MODELS_DIR
+
+CORRELATION_FILE = 'feature_correlation.npz'
+
+# |rho| above which two features are treated as duplicates of each other
+REDUNDANCY_THRESHOLD = 0.95
+
+
+def fingerprint(X, y):
+    """SHA-1 of the feature matrix, target and column names."""
+    digest = hashlib.sha1()
+    digest.update('\0'.join(X.columns).encode())
+    digest.update(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(y, dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def spearman_matrix(X, y):
+    """
+    Absolute Spearman correlations among features and against the target.
+
+    Args:
+        X (pd.DataFrame): Cleaned features (finite values).
+        y (array-like): Binary target.
+
+    Returns:
+        tuple: (corr (n_features, n_features), relevance (n_features,)).
+            Constant features get 0 everywhere and 1 on the diagonal.
+    """
+    ranks = rankdata(np.column_stack([X.to_numpy(dtype=np.float64), np.asarray(y, dtype=np.float64)]),
+                     axis=0)
+    ranks -= ranks.mean(axis=0)
+    norms = np.sqrt((ranks ** 2).sum(axis=0))
+    ranks /= np.where(norms > 0, norms, 1.0)
+    full = np.abs(ranks.T @ ranks)
+    np.fill_diagonal(full, 1.0)
+    return full[:-1, :-1], full[:-1, -1]
+
+
+class CorrelationCache:
+    """
+    Feature correlations and target relevance for one training matrix.
+
+    Attributes:
+        columns (list): Feature names.
+        corr (np.ndarray): |rho| between features, shape (n, n).
+        relevance (np.ndarray): |rho| of each feature with the target.
+        fingerprint (str): fingerprint() of the data they were computed on.
+    """
+
+    def __init__(self, columns, corr, relevance, fingerprint):
+        self.columns = list(columns)
+        self.corr = np.asarray(corr)
+        self.relevance = np.asarray(relevance)
+        self.fingerprint = fingerprint
+
+    def save(self, path):
+        np.savez(path, columns=np.array(self.columns), corr=self.corr,
+                 relevance=self.relevance, fingerprint=np.array(self.fingerprint))
+
+    def redundant_pairs(self, threshold=REDUNDANCY_THRESHOLD):
+        """Feature pairs with |rho| >= threshold, most correlated first."""
+        i, j = np.nonzero(np.triu(self.corr >= threshold, k=1))
+        order = np.argsort(-self.corr[i, j], kind='stable')
+        return [(self.columns[i[k]], self.columns[j[k]], float(self.corr[i[k], j[k]])) for k in order]
+
+
+def load_correlations(X, y, path=os.path.join(MODELS_DIR, CORRELATION_FILE)):
+    """
+    Cached correlations for (X, y), recomputed and saved when the cache is
+    missing or was built on different data.
+
+    Returns:
+        tuple: (CorrelationCache, bool cache hit)
+    """
+    key = fingerprint(X, y)
+    if os.path.exists(path):
+        with np.load(path) as data:
+            if str(data['fingerprint']) == key:
+                return CorrelationCache(data['columns'].tolist(), data['corr'], data['relevance'], key), True
+
+    corr, relevance = spearman_matrix(X, y)
+    cache = CorrelationCache(X.columns, corr, relevance, key)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    cache.save(path)
+    return cache, False
+
+
+def mrmr_rank(corr, relevance):
+    """
+    Greedy max-relevance min-redundancy ordering of all features.
+
+    Args:
+        corr (np.ndarray): |correlation| between features, shape (n, n).
+        relevance (np.ndarray): |correlation| of each feature with the target.
+
+    Returns:
+        tuple: (order, scores) - feature indices in selection order and the
+            mRMR score each had when it was picked.
+    """
+    n = len(relevance)
+    selected = np.zeros(n, dtype=bool)
+    redundancy = np.zeros(n)
+    order, scores = [], []
+    for k in range(n):
+        score = relevance - (redundancy / k if k else 0.0)
+        score[selected] = -np.inf
+        best = int(np.argmax(score))
+        order.append(best)
+        scores.append(float(score[best]))
+        selected[best] = True
+        redundancy += corr[:, best]
+    return np.array(order), np.array(scores)
+
+
+def prune_redundant(order, corr, threshold=REDUNDANCY_THRESHOLD):
+    """
+    Drops each feature whose |rho| with an earlier kept feature is >= threshold.
+
+    Args:
+        order (array-like): Feature indices, most preferred first.
+        corr (np.ndarray): |correlation| between features.
+        threshold (float): Redundancy threshold.
+
+    Returns:
+        tuple: (kept indices in order, dict dropped index -> kept index it duplicates)
+    """
+    kept, dropped = [], {}
+    for j in order:
+        if kept:
+            closest = kept[int(np.argmax(corr[j, kept]))]
+            if corr[j, closest] >= threshold:
+                dropped[int(j)] = closest
+                continue
+        kept.append(int(j))
+    return kept, dropped
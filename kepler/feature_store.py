@@ -0,0 +1,124 @@
+"""
+Engineered Feature Store
+Contiguous float32 feature matrix that later stages memory-map instead of parsing CSV
+
+Script 3 writes kepler/feature_store/ next to kepler_engineered.csv:
+
+    features.npy   float32 (n_rows, n_features), C order
+    target.npy     is_exoplanet per row
+    meta.json      column names, target name, shape and the kepoi_name of
+                   every row (row i of the matrix is row i of the CSV)
+
+open_store() maps both .npy files read-only. Opening costs a header read
+rather than a parse of the whole CSV, and every process that opens the store
+shares the same page-cache pages. FeatureStore.frame() wraps the mapping in
+a DataFrame without copying and column() returns one feature as a strided
+view; selecting a subset of rows or columns copies only the selection.
+
+Values are stored as float32, the precision the tree models compute in.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = 'kepler/feature_store'
+FEATURES_FILE = 'features.npy'
+TARGET_FILE = 'target.npy'
+META_FILE = 'meta.json'
+
+
+def write_store(features, target, row_ids, store_dir=STORE_DIR):
+    """
+    Writes the engineered features as a memory-mappable store.
+
+    Args:
+        features (pd.DataFrame): Numeric feature columns.
+        target (pd.Series): Target per row.
+        row_ids (pd.Series): Stable row identifiers (kepoi_name).
+        store_dir (str): Output directory.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    matrix = np.lib.format.open_memmap(os.path.join(store_dir, FEATURES_FILE), mode='w+',
+                                       dtype=np.float32, shape=features.shape)
+    for j, col in enumerate(features.columns):
+        matrix[:, j] = features[col].to_numpy(dtype=np.float32)
+    matrix.flush()
+    del matrix
+
+    np.save(os.path.join(store_dir, TARGET_FILE), target.to_numpy())
+    with open(os.path.join(store_dir, META_FILE), 'w') as f:
+        json.dump({
+            'columns': list(features.columns),
+            'target': target.name,
+            'shape': list(features.shape),
+            'dtype': 'float32',
+            'row_id': row_ids.name,
+            'row_ids': row_ids.astype(str).tolist(),
+        }, f)
+
+
+class FeatureStore:
+    """
+    Read-only view of a feature store.
+
+    Attributes:
+        X (np.memmap): Feature matrix, shape (n_rows, n_features).
+        y (np.memmap): Target per row.
+        columns (list): Feature names.
+        row_ids (np.ndarray): Row identifier per row.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.X = np.load(os.path.join(store_dir, FEATURES_FILE), mmap_mode='r')
+        self.y = np.load(os.path.join(store_dir, TARGET_FILE), mmap_mode='r')
+        self.columns = self.meta['columns']
+        self.row_ids = np.asarray(self.meta['row_ids'])
+        self._column_index = {col: j for j, col in enumerate(self.columns)}
+
+    @property
+    def shape(self):
+        return self.X.shape
+
+    def column(self, name):
+        """One feature as a strided view of the mapping."""
+        return self.X[:, self._column_index[name]]
+
+    def frame(self, rows=None, columns=None):
+        """
+        Features as a DataFrame indexed by row number.
+
+        Args:
+            rows: Optional slice or array of row numbers.
+            columns (list): Optional subset of feature names.
+
+        Returns:
+            pd.DataFrame: Backed by the mapping when all columns are kept and
+            rows is None or a slice.
+        """
+        columns = self.columns if columns is None else list(columns)
+        index = pd.RangeIndex(len(self.X))
+        X = self.X
+        if rows is not None:
+            index = index[rows]
+            X = X[rows]
+        if columns != self.columns:
+            X = X[:, [self._column_index[col] for col in columns]]
+        return pd.DataFrame(np.asarray(X), index=index, columns=columns, copy=False)
+
+    def target(self, rows=None):
+        """Target as a Series indexed by row number."""
+        index = pd.RangeIndex(len(self.y))
+        y = self.y
+        if rows is not None:
+            index = index[rows]
+            y = y[rows]
+        return pd.Series(np.asarray(y), index=index, name=self.meta['target'], copy=False)
+
+
+def open_store(store_dir=STORE_DIR):
+    """Memory-maps the feature store written by script 3."""
+    return FeatureStore(store_dir)
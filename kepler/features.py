@@ -0,0 +1,259 @@
+"""
+Kepler Feature Definitions
+Base feature list and the engineered feature formulas used by script 3
+
+Every engineered feature is declared once in FEATURE_GROUPS with the
+columns it needs, its formula, its physical reasoning and a vectorized
+compute function. engineer_features() applies them in order, so the same
+definitions serve the feature stage and any later stage that needs to
+engineer features for new rows.
+"""
+import numpy as np
+
+from instrumentation import span
+
+
+BASE_FEATURES = [
+    # Orbital properties
+    'koi_period', 'koi_sma', 'koi_eccen', 'koi_incl', 'koi_prad',
+
+    # Transit properties
+    'koi_duration', 'koi_depth', 'koi_ror', 'koi_impact',
+
+    # Stellar properties
+    'koi_steff', 'koi_slogg', 'koi_srad', 'koi_smass', 'koi_smet',
+
+    # Photometry (brightness in different bands)
+    'koi_kepmag', 'koi_gmag', 'koi_rmag', 'koi_imag', 'koi_jmag', 'koi_hmag', 'koi_kmag',
+
+    # Derived/calculated
+    'koi_teq', 'koi_insol', 'koi_dor', 'koi_model_snr',
+
+    # Count features
+    'koi_count', 'koi_num_transits',
+
+    # False positive flags (important!)
+    'koi_fpflag_nt', 'koi_fpflag_ss', 'koi_fpflag_co', 'koi_fpflag_ec',
+
+    # Sky coordinates
+    'ra', 'dec'
+]
+
+FP_FLAGS = ['koi_fpflag_nt', 'koi_fpflag_ss', 'koi_fpflag_co', 'koi_fpflag_ec']
+
+
+def _depth_consistency(df):
+    expected_depth = (df['koi_ror'] ** 2) * 1e6  # Convert to ppm
+    return np.abs(df['koi_depth'] - expected_depth) / expected_depth
+
+
+def _main_sequence_deviation(df):
+    # Roughly: Teff ∝ M^0.5 for main sequence stars
+    expected_teff = 5778 * (df['koi_smass'] ** 0.5)  # Solar Teff = 5778K
+    return np.abs(df['koi_steff'] - expected_teff) / expected_teff
+
+
+FEATURE_GROUPS = [
+    ('A. PLANET-STAR RELATIONSHIP FEATURES', [
+        {
+            'name': 'planet_star_radius_ratio',
+            'requires': ['koi_prad', 'koi_srad'],
+            'compute': lambda df: df['koi_prad'] / (df['koi_srad'] * 109.1),  # Convert solar radii to Earth radii
+            'formula': 'koi_prad / (koi_srad * 109.1)',
+            'reasoning': 'Ratio of planet to star size. True planets have specific size ratios; large ratios may indicate stellar companion',
+            'message': 'Planet/star size ratio'
+        },
+        {
+            'name': 'planet_density_proxy',
+            'requires': ['koi_prad', 'koi_smass'],
+            # Assuming planet mass correlates with star mass for estimation
+            'compute': lambda df: df['koi_smass'] / (df['koi_prad'] ** 3),
+            'formula': 'koi_smass / (koi_prad^3)',
+            'reasoning': 'Density proxy. Rocky planets have higher density than gas giants; helps distinguish planet types',
+            'message': 'Helps distinguish rocky vs gas planets'
+        },
+        {
+            'name': 'insol_teq_ratio',
+            'requires': ['koi_insol', 'koi_teq'],
+            'compute': lambda df: df['koi_insol'] / (df['koi_teq'] ** 4),
+            'formula': 'koi_insol / (koi_teq^4)',
+            'reasoning': 'Stefan-Boltzmann relationship. Inconsistencies may indicate false positives',
+            'message': 'Stefan-Boltzmann consistency check'
+        },
+    ]),
+    ('B. ORBITAL DYNAMICS FEATURES', [
+        {
+            'name': 'orbital_velocity',
+            'requires': ['koi_sma', 'koi_period'],
+            'compute': lambda df: (2 * np.pi * df['koi_sma']) / df['koi_period'],
+            'formula': '(2pi * koi_sma) / koi_period',
+            'reasoning': 'Orbital velocity. Unusually high values may indicate unstable orbits or measurement errors',
+            'message': 'v = 2pir/T'
+        },
+        {
+            'name': 'hill_sphere_approx',
+            'requires': ['koi_sma', 'koi_smass'],
+            # Simplified: r_hill ≈ a * (m_planet / (3 * m_star))^(1/3), using stellar mass as proxy
+            'compute': lambda df: df['koi_sma'] * (1 / (3 * df['koi_smass'])) ** (1/3),
+            'formula': 'koi_sma * (1 / (3 * koi_smass))^(1/3)',
+            'reasoning': 'Hill sphere approximation. Indicates orbital stability region',
+            'message': 'Orbital stability indicator'
+        },
+        {
+            'name': 'periapsis_distance',
+            'requires': ['koi_eccen', 'koi_sma'],
+            'compute': lambda df: df['koi_sma'] * (1 - df['koi_eccen']),
+            'formula': 'koi_sma * (1 - koi_eccen)',
+            'reasoning': 'Closest approach to star. Affects temperature and tidal forces',
+            'message': 'Orbital extreme (closest)'
+        },
+        {
+            'name': 'apoapsis_distance',
+            'requires': ['koi_eccen', 'koi_sma'],
+            'compute': lambda df: df['koi_sma'] * (1 + df['koi_eccen']),
+            'formula': 'koi_sma * (1 + koi_eccen)',
+            'reasoning': 'Farthest distance from star. Extreme orbits may indicate false positives',
+            'message': 'Orbital extreme (farthest)'
+        },
+    ]),
+    ('C. TRANSIT GEOMETRY FEATURES', [
+        {
+            'name': 'depth_consistency',
+            'requires': ['koi_depth', 'koi_ror'],
+            'compute': _depth_consistency,
+            'formula': 'abs(koi_depth - (koi_ror^2 * 1e6)) / (koi_ror^2 * 1e6)',
+            'reasoning': 'Transit depth should equal (Rp/Rs)^2. Large deviations indicate problems',
+            'message': 'Geometric consistency check'
+        },
+        {
+            'name': 'duration_impact_relation',
+            'requires': ['koi_impact', 'koi_duration', 'koi_period'],
+            # For central transits (b=0), duration is longer
+            'compute': lambda df: df['koi_duration'] * (1 + df['koi_impact'] ** 2),
+            'formula': 'koi_duration * (1 + koi_impact^2)',
+            'reasoning': 'Duration depends on impact parameter. Helps identify grazing transits',
+            'message': 'Grazing transit detector'
+        },
+        {
+            'name': 'transit_snr',
+            'requires': ['koi_depth', 'koi_num_transits'],
+            'compute': lambda df: df['koi_depth'] * np.sqrt(df['koi_num_transits']),
+            'formula': 'koi_depth * sqrt(koi_num_transits)',
+            'reasoning': 'SNR improves with sqrt(N) transits. Higher SNR = more confident detection',
+            'message': 'Detection confidence metric'
+        },
+    ]),
+    ('D. STELLAR PROPERTIES FEATURES', [
+        {
+            'name': 'stellar_density',
+            'requires': ['koi_slogg', 'koi_srad'],
+            # ρ = g / (G * R^2), log(g) = log(ρ) + log(G*R^2)
+            'compute': lambda df: 10**df['koi_slogg'] / (df['koi_srad'] ** 2),
+            'formula': '10^koi_slogg / (koi_srad^2)',
+            'reasoning': 'Stellar density from surface gravity. Helps identify stellar type',
+            'message': 'Star type indicator'
+        },
+        {
+            'name': 'main_sequence_deviation',
+            'requires': ['koi_steff', 'koi_smass'],
+            'compute': _main_sequence_deviation,
+            'formula': 'abs(koi_steff - (5778 * koi_smass^0.5)) / (5778 * koi_smass^0.5)',
+            'reasoning': 'Deviation from main sequence. Large deviations may indicate evolved stars',
+            'message': 'Star evolution indicator'
+        },
+        {
+            'name': 'metallicity_temp',
+            'requires': ['koi_smet', 'koi_steff'],
+            'compute': lambda df: df['koi_smet'] * (df['koi_steff'] / 5778),
+            'formula': 'koi_smet * (koi_steff / 5778)',
+            'reasoning': 'Metal-rich stars (high metallicity) more likely to have planets',
+            'message': 'Planet formation indicator'
+        },
+    ]),
+    ('E. COLOR AND PHOTOMETRY FEATURES', [
+        {
+            'name': 'g_r_color',
+            'requires': ['koi_gmag', 'koi_rmag'],
+            'compute': lambda df: df['koi_gmag'] - df['koi_rmag'],
+            'formula': 'koi_gmag - koi_rmag',
+            'reasoning': 'g-r color index. Indicates star temperature/type',
+            'message': 'Optical color index'
+        },
+        {
+            'name': 'r_i_color',
+            'requires': ['koi_rmag', 'koi_imag'],
+            'compute': lambda df: df['koi_rmag'] - df['koi_imag'],
+            'formula': 'koi_rmag - koi_imag',
+            'reasoning': 'r-i color index. Another temperature indicator',
+            'message': 'Another color index'
+        },
+        {
+            'name': 'j_k_color',
+            'requires': ['koi_jmag', 'koi_kmag'],
+            'compute': lambda df: df['koi_jmag'] - df['koi_kmag'],
+            'formula': 'koi_jmag - koi_kmag',
+            'reasoning': 'J-K color. Less affected by extinction than optical colors',
+            'message': 'Infrared color index'
+        },
+    ]),
+    ('F. STATISTICAL/DETECTION FEATURES', [
+        {
+            'name': 'is_multiplanet_system',
+            'requires': ['koi_count'],
+            'compute': lambda df: (df['koi_count'] > 1).astype(int),
+            'formula': 'koi_count > 1',
+            'reasoning': 'Multi-planet systems more likely to be real (planets rarely come alone)',
+            'message': 'Multiple planets = higher confidence'
+        },
+        {
+            'name': 'total_fp_flags',
+            'requires': FP_FLAGS,
+            'compute': lambda df: df['koi_fpflag_nt'] + df['koi_fpflag_ss'] + df['koi_fpflag_co'] + df['koi_fpflag_ec'],
+            'formula': 'sum of all false positive flags',
+            'reasoning': 'More FP flags = higher chance of being false positive',
+            'message': 'Combined false positive indicator'
+        },
+        {
+            'name': 'snr_per_transit',
+            'requires': ['koi_model_snr', 'koi_num_transits'],
+            'compute': lambda df: df['koi_model_snr'] / np.sqrt(df['koi_num_transits']),
+            'formula': 'koi_model_snr / sqrt(koi_num_transits)',
+            'reasoning': 'SNR normalized by number of transits. Indicates signal strength',
+            'message': 'Per-transit signal strength'
+        },
+    ]),
+]
+
+
+def engineer_features(df_work, verbose=True):
+    """
+    Adds every engineered feature whose required columns are present.
+
+    Args:
+        df_work (pd.DataFrame): Frame holding the base features. Modified in place.
+        verbose (bool): Print one line per group and feature, as script 3 does.
+
+    Returns:
+        dict: Documentation ({'formula', 'reasoning'}) for each feature created.
+    """
+    engineered_features = {}
+
+    for group, specs in FEATURE_GROUPS:
+        if verbose:
+            print(f"\n>>> {group}")
+
+        for spec in specs:
+            if not all(col in df_work.columns for col in spec['requires']):
+                continue
+
+            with span('feature_formula', feature=spec['name'], rows=len(df_work)):
+                df_work[spec['name']] = spec['compute'](df_work)
+
+            engineered_features[spec['name']] = {
+                'formula': spec['formula'],
+                'reasoning': spec['reasoning']
+            }
+            if verbose:
+                print(f"[+] {spec['name']}: {spec['message']}")
+
+    return engineered_features
@@ -0,0 +1,250 @@
+"""
+Pipeline Instrumentation
+Timed spans, row/column counts and peak-RSS samples for the kepler scripts
+
+Tracing is OFF unless the KEPLER_TRACE environment variable is set:
+    KEPLER_TRACE=1            -> write to kepler/trace/
+    KEPLER_TRACE=<directory>  -> write to that directory
+
+Output (per directory):
+    trace.jsonl     - one JSON object per finished span, appended across runs
+    <script>.prom   - OpenMetrics text file with stage latency totals,
+                      rewritten when the script exits
+
+When tracing is disabled, span() hands back a shared no-op context manager,
+so instrumented code costs one function call per span.
+
+time_call() is the benchmark timer shared by the scripts that report
+latencies (8, 11, 13, 14); it is independent of tracing.
+
+Usage:
+    from instrumentation import span
+
+    with span('clean', rows=len(X)) as s:
+        ...
+        s.set(cols=X.shape[1])
+"""
+import atexit
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+DEFAULT_TRACE_DIR = 'kepler/trace'
+
+# Span attributes that split a stage's metrics into separate series
+SUBJECT_ATTRS = ('model', 'feature', 'figure')
+
+# Each time_call() timing repeats until this much wall time has been spent (at least 3 runs)
+MIN_SECONDS = 0.2
+
+
+def _peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process in bytes, or None
+    when the platform does not expose it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _NoopSpan:
+    """Stand-in returned by span() when tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed region of a script. Attributes are written with the span."""
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.start = None
+
+    def set(self, **attrs):
+        """Attach extra attributes (e.g. rows/cols known only at the end)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer.stack
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        self.tracer.stack.pop()
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer.emit(self.name, duration, self.attrs, parent=self.parent)
+        return False
+
+
+class Tracer:
+    """Writes finished spans as JSON lines and aggregates stage metrics."""
+
+    def __init__(self, trace_dir, script):
+        self.trace_dir = trace_dir
+        self.script = script
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stack = []
+        self.stages = {}
+        os.makedirs(trace_dir, exist_ok=True)
+        self._trace_file = open(os.path.join(trace_dir, 'trace.jsonl'), 'a', buffering=1)
+        atexit.register(self.close)
+
+    def emit(self, name, duration, attrs, parent=None):
+        """Record one finished span (also used for externally timed work)."""
+        peak_rss = _peak_rss_bytes()
+        record = {
+            'ts': time.time(),
+            'run_id': self.run_id,
+            'script': self.script,
+            'span': name,
+            'parent': parent,
+            'duration_s': duration,
+            'peak_rss_bytes': peak_rss,
+        }
+        record.update(attrs)
+        self._trace_file.write(json.dumps(record, default=str) + '\n')
+
+        subject = next((str(attrs[key]) for key in SUBJECT_ATTRS if key in attrs), '')
+        stage = self.stages.setdefault((name, subject), {'count': 0, 'sum': 0.0, 'rows': None})
+        stage['count'] += 1
+        stage['sum'] += duration
+        if 'rows' in attrs:
+            stage['rows'] = attrs['rows']
+
+    def write_metrics(self):
+        """Write the OpenMetrics text file for this script."""
+        lines = [
+            '# TYPE kepler_stage_duration_seconds summary',
+            '# UNIT kepler_stage_duration_seconds seconds',
+            '# HELP kepler_stage_duration_seconds Wall-clock time spent in each pipeline stage.',
+        ]
+        for (name, subject), stage in self.stages.items():
+            labels = f'script="{self.script}",stage="{name}",subject="{subject}"'
+            lines.append(f'kepler_stage_duration_seconds_count{{{labels}}} {stage["count"]}')
+            lines.append(f'kepler_stage_duration_seconds_sum{{{labels}}} {stage["sum"]:.6f}')
+
+        lines.append('# TYPE kepler_stage_rows gauge')
+        lines.append('# HELP kepler_stage_rows Rows processed by the last run of each stage.')
+        for (name, subject), stage in self.stages.items():
+            if stage['rows'] is not None:
+                labels = f'script="{self.script}",stage="{name}",subject="{subject}"'
+                lines.append(f'kepler_stage_rows{{{labels}}} {stage["rows"]}')
+
+        peak_rss = _peak_rss_bytes()
+        if peak_rss is not None:
+            lines.append('# TYPE kepler_peak_rss_bytes gauge')
+            lines.append('# UNIT kepler_peak_rss_bytes bytes')
+            lines.append('# HELP kepler_peak_rss_bytes Peak resident set size of the script.')
+            lines.append(f'kepler_peak_rss_bytes{{script="{self.script}"}} {peak_rss}')
+        lines.append('# EOF')
+
+        with open(os.path.join(self.trace_dir, f'{self.script}.prom'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        if self._trace_file.closed:
+            return
+        self.write_metrics()
+        self._trace_file.close()
+
+
+def _script_name():
+    name = os.path.splitext(os.path.basename(sys.argv[0] or 'interactive'))[0]
+    return name or 'interactive'
+
+
+def _make_tracer():
+    setting = os.environ.get('KEPLER_TRACE', '').strip()
+    if setting in ('', '0', 'false', 'False'):
+        return None
+    trace_dir = DEFAULT_TRACE_DIR if setting in ('1', 'true', 'True') else setting
+    return Tracer(trace_dir, _script_name())
+
+
+_TRACER = _make_tracer()
+
+
+def enabled():
+    """True when KEPLER_TRACE is set for this process."""
+    return _TRACER is not None
+
+
+def span(name, **attrs):
+    """
+    Times the enclosed block as a named stage.
+
+    Args:
+        name (str): Stage name (e.g. 'clean', 'fit').
+        **attrs: Extra attributes recorded with the span (rows, cols, model...).
+
+    Returns:
+        A context manager; its set() method adds attributes before exit.
+    """
+    if _TRACER is None:
+        return _NOOP_SPAN
+    return Span(_TRACER, name, attrs)
+
+
+def record(name, duration, **attrs):
+    """
+    Records work that was timed elsewhere (e.g. inside a worker process).
+
+    Args:
+        name (str): Stage name.
+        duration (float): Elapsed seconds.
+        **attrs: Extra attributes recorded with the span.
+    """
+    if _TRACER is None:
+        return
+    parent = _TRACER.stack[-1].name if _TRACER.stack else None
+    _TRACER.emit(name, duration, attrs, parent=parent)
+
+
+def time_call(fn, min_seconds=MIN_SECONDS):
+    """
+    Median wall time of fn() over repeated runs.
+
+    Args:
+        fn: Callable taking no arguments.
+        min_seconds (float): Keep repeating until this much time has passed
+            (at least 3 runs).
+
+    Returns:
+        float: Median seconds per call.
+    """
+    times = []
+    deadline = time.perf_counter() + min_seconds
+    while len(times) < 3 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(statistics.median(times))
@@ -0,0 +1,294 @@
+"""
+Compact Model Format
+Quantized, memory-mappable storage for the tree ensembles
+
+A pickled sklearn forest keeps every node as a 64-byte record plus a float64
+value array, and every process that joblib.load()s it gets a private copy.
+save_compact() writes the compiled node tables (see tree_compiler.py) into
+one .kmf file instead:
+
+    feature     smallest unsigned int that holds n_features
+    threshold   float32
+    left        smallest unsigned int that holds the node count
+    leaf_value  index into a deduplicated table of leaf outputs
+    value       unique leaf outputs (float64 by default)
+
+and prunes each tree on the way:
+- thresholds are rounded down to float32. sklearn compares float32 inputs
+  against float64 thresholds, and x > t holds exactly when x is greater than
+  the largest float32 <= t, so this rounding changes no prediction
+- nodes that no float32 input can reach (given the splits above them) are
+  replaced by their reachable child
+- splits whose two children are leaves with the same output become a leaf
+
+load_compact() maps the file read-only and builds CompiledEnsemble objects
+on views of the mapping. Pages are only read, never written, so any number
+of scoring processes share one physical copy through the page cache.
+(predict_proba_one() builds per-process Python lists on first use; batch
+predict_proba() works on the mapped arrays directly.)
+
+File layout: 8-byte magic, uint32 format version, uint32 header length,
+JSON header, then each array at a 64-byte aligned offset from the start of
+the data section. The header records kind, classes, feature count and, per
+member (one for a plain model, one per fold for a FoldEnsemble), boosting
+constants and the offset/dtype/shape of its arrays.
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from cv_engine import FoldEnsemble
+from preprocessing import model_filename
+from tree_compiler import (CompiledEnsemble, CompiledFoldEnsemble,
+                           ensemble_spec, tree_leaf_values)
+
+MAGIC = b'KEPLERMF'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+EXTENSION = '.kmf'
+
+_PREAMBLE = struct.Struct('<8sII')
+_ARRAYS = ('feature', 'threshold', 'left', 'leaf_value', 'value', 'roots')
+
+
+def quantize_thresholds(threshold):
+    """
+    Largest float32 not above each float64 threshold.
+
+    For any float32 x, x > threshold is equivalent to x > the returned value.
+
+    Args:
+        threshold (np.ndarray): float64 split thresholds.
+
+    Returns:
+        np.ndarray: float32 thresholds.
+    """
+    t32 = threshold.astype(np.float32)
+    rounded_up = t32.astype(np.float64) > threshold
+    t32[rounded_up] = np.nextafter(t32[rounded_up], np.float32(-np.inf))
+    return t32
+
+
+def _index_dtype(max_value):
+    return np.min_scalar_type(max(int(max_value), 0))
+
+
+def _compact_tree(estimator, kind, stats):
+    """
+    Prunes one fitted tree in float32 threshold space.
+
+    Returns:
+        Nested tuples: ('leaf', value_row) or ('split', feature, threshold, left, right).
+    """
+    tree = estimator.tree_
+    children_left, children_right = tree.children_left, tree.children_right
+    # Python ints keep the per-branch bound dicts cheap to copy
+    feature = tree.feature.tolist()
+    threshold = quantize_thresholds(tree.threshold)
+    values = tree_leaf_values(estimator, kind)
+
+    def build(node, lower, upper):
+        # Inputs reaching this node satisfy lower[f] < x[f] <= upper[f]
+        if children_left[node] == -1:
+            return ('leaf', values[node])
+        f, t = feature[node], threshold[node]
+        lo, hi = lower.get(f, -np.inf), upper.get(f, np.inf)
+        if lo >= t:
+            stats['unreachable'] += 1
+            return build(children_right[node], lower, upper)
+        if hi <= t:
+            stats['unreachable'] += 1
+            return build(children_left[node], lower, upper)
+
+        left = build(children_left[node], lower, {**upper, f: t})
+        right = build(children_right[node], {**lower, f: t}, upper)
+        if left[0] == 'leaf' and right[0] == 'leaf' and np.array_equal(left[1], right[1]):
+            stats['collapsed'] += 1
+            return left
+        return ('split', f, t, left, right)
+
+    return build(0, {}, {})
+
+
+def compact_member(model, value_dtype=np.float64):
+    """
+    Builds the compact arrays for one fitted forest or boosting model.
+
+    Args:
+        model: Fitted RandomForestClassifier or binary GradientBoostingClassifier.
+        value_dtype: dtype of the leaf value table. float64 keeps predictions
+            bit-identical; float32 trades the last digits for size.
+
+    Returns:
+        tuple: (member dict with arrays and constants, stats dict)
+    """
+    kind, estimators, init_raw, learning_rate = ensemble_spec(model)
+    stats = {'nodes_before': 0, 'unreachable': 0, 'collapsed': 0}
+
+    features, thresholds, lefts, leaf_rows, roots = [], [], [], [], []
+    is_leaf = []
+    max_depth = 0
+    for estimator in estimators:
+        stats['nodes_before'] += estimator.tree_.node_count
+        root = _compact_tree(estimator, kind, stats)
+        offset = len(features)
+        roots.append(offset)
+
+        # Breadth-first so the right child is always left + 1
+        order, depth = [root], [0]
+        for i, node in enumerate(order):  # the list grows while we walk it
+            if node[0] == 'leaf':
+                features.append(0)
+                thresholds.append(np.inf)
+                lefts.append(offset + i)
+                leaf_rows.append(node[1])
+                is_leaf.append(True)
+                max_depth = max(max_depth, depth[i])
+            else:
+                features.append(node[1])
+                thresholds.append(node[2])
+                lefts.append(offset + len(order))
+                leaf_rows.append(None)
+                is_leaf.append(False)
+                order.extend(node[3:])
+                depth.extend([depth[i] + 1] * 2)
+
+    n_nodes = len(features)
+    is_leaf = np.asarray(is_leaf)
+    leaf_table = np.asarray([row for row in leaf_rows if row is not None]).astype(value_dtype)
+    unique_values, inverse = np.unique(leaf_table, axis=0, return_inverse=True)
+    leaf_value = np.zeros(n_nodes, dtype=_index_dtype(len(unique_values) - 1))
+    leaf_value[is_leaf] = inverse.reshape(-1)
+
+    node_dtype = _index_dtype(n_nodes - 1)
+    member = {
+        'kind': kind,
+        'max_depth': max_depth,
+        'init_raw': float(init_raw),
+        'learning_rate': float(learning_rate),
+        'feature': np.asarray(features, dtype=_index_dtype(model.n_features_in_ - 1)),
+        'threshold': np.asarray(thresholds, dtype=np.float32),
+        'left': np.asarray(lefts, dtype=node_dtype),
+        'leaf_value': leaf_value,
+        'value': unique_values,
+        'roots': np.asarray(roots, dtype=node_dtype),
+    }
+    stats.update({
+        'nodes_after': n_nodes,
+        'leaves': int(is_leaf.sum()),
+        'unique_leaf_values': len(unique_values),
+    })
+    return member, stats
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def save_compact(model, path, value_dtype=np.float64, metadata=None):
+    """
+    Writes a fitted model in the compact format.
+
+    Args:
+        model: RandomForestClassifier, GradientBoostingClassifier or FoldEnsemble of either.
+        path (str): Output file (.kmf).
+        value_dtype: dtype of the leaf value table (see compact_member()).
+        metadata (dict): Optional JSON-serializable extras stored in the header.
+
+    Returns:
+        list: Per-member pruning statistics.
+    """
+    is_fold = isinstance(model, FoldEnsemble)
+    sklearn_members = model.fold_models if is_fold else [model]
+
+    members, stats, blobs = [], [], []
+    data_size = 0
+    for sklearn_member in sklearn_members:
+        member, member_stats = compact_member(sklearn_member, value_dtype)
+        stats.append(member_stats)
+        entry = {key: member[key] for key in ('kind', 'max_depth', 'init_raw', 'learning_rate')}
+        entry['arrays'] = {}
+        for name in _ARRAYS:
+            array = np.ascontiguousarray(member[name])
+            data_size = _align(data_size)
+            entry['arrays'][name] = {'offset': data_size, 'dtype': array.dtype.str,
+                                     'shape': list(array.shape)}
+            blobs.append((data_size, array))
+            data_size += array.nbytes
+        members.append(entry)
+
+    header = json.dumps({
+        'fold_ensemble': is_fold,
+        'classes': model.classes_.tolist(),
+        'n_features': int(sklearn_members[0].n_features_in_),
+        'members': members,
+        'metadata': metadata or {},
+    }).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    with open(path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for offset, array in blobs:
+            f.seek(data_start + offset)
+            f.write(array.tobytes())
+        f.truncate(data_start + data_size)
+    return stats
+
+
+def read_header(path):
+    """
+    Reads the JSON header of a .kmf file.
+
+    Returns:
+        tuple: (header dict, byte offset of the data section)
+    """
+    with open(path, 'rb') as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compact model file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported format version {version}")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    return header, _align(_PREAMBLE.size + header_len)
+
+
+def load_compact(path):
+    """
+    Maps a .kmf file read-only and returns a predictor backed by the mapping.
+
+    Args:
+        path (str): File written by save_compact().
+
+    Returns:
+        CompiledEnsemble or CompiledFoldEnsemble
+    """
+    header, data_start = read_header(path)
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    compiled = []
+    for member in header['members']:
+        arrays = {}
+        for name, spec in member['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=data_start + spec['offset']).reshape(spec['shape'])
+        compiled.append(CompiledEnsemble(
+            member['kind'], header['classes'], arrays['feature'], arrays['threshold'],
+            arrays['left'], arrays['value'], arrays['roots'], member['max_depth'],
+            header['n_features'], init_raw=member['init_raw'],
+            learning_rate=member['learning_rate'], leaf_value=arrays['leaf_value']))
+
+    if header['fold_ensemble']:
+        return CompiledFoldEnsemble(compiled)
+    return compiled[0]
+
+
+def compact_filename(name):
+    """File name for a model's compact form, e.g. 'Random Forest' -> 'random_forest.kmf'."""
+    return os.path.splitext(model_filename(name))[0] + EXTENSION
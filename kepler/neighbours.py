@@ -0,0 +1,205 @@
+"""
+Neighbour Index
+Most similar CONFIRMED and FALSE POSITIVE KOIs in the standardized feature space
+
+The index holds the labelled KOIs of the feature store, cleaned and scaled
+with the preprocessing saved by script 4 (so distances are in training
+standard deviations), with one sub-index per disposition. A query returns
+the k nearest KOIs of each disposition for a whole batch of rows at once.
+
+Three kinds of sub-index:
+
+    balltree  sklearn BallTree on the full feature vectors (exact)
+    brute     distances to every indexed row, one matrix product per block
+              of queries (exact)
+    approx    BallTree on a PCA projection keeping APPROX_VARIANCE of the
+              variance; the candidates * k nearest projected points are
+              re-ranked by their exact distance. Recall is below 1 and is
+              measured by script 13.
+
+With 50+ dimensions a tree prunes little unless the data lie close to a
+low-dimensional subspace, so which kind is fastest depends on the catalog;
+script 13 times all three.
+
+The index is saved next to the models (neighbour_index.joblib) with the
+scaler statistics it was built with, so a stale index is detected after the
+models are retrained.
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from sklearn.neighbors import BallTree
+
+from preprocessing import MODELS_DIR, transform_features
+
+NEIGHBOUR_INDEX_FILE = 'neighbour_index.joblib'
+
+DISPOSITIONS = ('CONFIRMED', 'FALSE POSITIVE')
+
+KINDS = ('balltree', 'brute', 'approx')
+
+LEAF_SIZE = 40
+
+# Share of the variance the approx projection keeps, and candidates per neighbour
+APPROX_VARIANCE = 0.9
+APPROX_CANDIDATES = 10
+
+# Query rows per distance block of the brute kind
+BRUTE_BLOCK = 256
+
+
+class _BallTreeIndex:
+    """BallTree over the full scaled vectors."""
+
+    def __init__(self, X, leaf_size=LEAF_SIZE):
+        self.tree = BallTree(X, leaf_size=leaf_size)
+
+    def query(self, X, k):
+        return self.tree.query(X, k=k)
+
+
+class _BruteIndex:
+    """Exact search by blocks of |q|^2 - 2 q.x + |x|^2 distance matrices."""
+
+    def __init__(self, X):
+        self.X = np.ascontiguousarray(X)
+        self.sq_norms = (self.X ** 2).sum(axis=1)
+
+    def query(self, X, k):
+        distances = np.empty((len(X), k))
+        neighbours = np.empty((len(X), k), dtype=np.intp)
+        for start in range(0, len(X), BRUTE_BLOCK):
+            block = X[start:start + BRUTE_BLOCK]
+            d2 = self.sq_norms[None, :] - 2 * block @ self.X.T + (block ** 2).sum(axis=1)[:, None]
+            nearest = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            d2 = np.take_along_axis(d2, nearest, axis=1)
+            order = np.argsort(d2, axis=1, kind='stable')
+            distances[start:start + len(block)] = np.sqrt(np.maximum(np.take_along_axis(d2, order, axis=1), 0))
+            neighbours[start:start + len(block)] = np.take_along_axis(nearest, order, axis=1)
+        return distances, neighbours
+
+
+class _ApproxIndex:
+    """BallTree over a PCA projection, candidates re-ranked in the full space."""
+
+    def __init__(self, X, variance=APPROX_VARIANCE, candidates=APPROX_CANDIDATES, leaf_size=LEAF_SIZE):
+        self.X = np.ascontiguousarray(X)
+        self.pca = PCA(n_components=variance, svd_solver='full', random_state=42).fit(X)
+        self.tree = BallTree(self.pca.transform(X), leaf_size=leaf_size)
+        self.candidates = candidates
+
+    def query(self, X, k):
+        n_candidates = min(len(self.X), k * self.candidates)
+        _, candidates = self.tree.query(self.pca.transform(X), k=n_candidates)
+        distances = np.sqrt(((self.X[candidates] - X[:, None, :]) ** 2).sum(axis=2))
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+
+class NeighbourIndex:
+    """
+    Per-disposition nearest-neighbour index of labelled KOIs.
+
+    Attributes:
+        kind (str): 'balltree', 'brute' or 'approx'.
+        ids (dict): disposition -> kepoi_name of every indexed row.
+        scaler_mean (np.ndarray): Scaler mean the vectors were scaled with.
+    """
+
+    def __init__(self, X, ids, dispositions, kind='balltree', scaler_mean=None, **options):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown index kind: {kind}")
+        self.kind = kind
+        self.scaler_mean = scaler_mean
+        self.ids = {}
+        self.indexes = {}
+        ids = np.asarray(ids)
+        dispositions = np.asarray(dispositions)
+        for disposition in DISPOSITIONS:
+            rows = np.flatnonzero(dispositions == disposition)
+            self.ids[disposition] = ids[rows]
+            index_class = {'balltree': _BallTreeIndex, 'brute': _BruteIndex, 'approx': _ApproxIndex}[kind]
+            self.indexes[disposition] = index_class(X[rows], **options)
+
+    @property
+    def size(self):
+        return sum(len(ids) for ids in self.ids.values())
+
+    def query(self, X, k=5, exclude=None):
+        """
+        k nearest KOIs of each disposition for every row of X.
+
+        Args:
+            X (np.ndarray): Scaled features, shape (n_rows, n_features).
+            k (int): Neighbours per disposition.
+            exclude (array-like): Optional kepoi_name per row of X; a KOI is
+                never returned as its own neighbour.
+
+        Returns:
+            dict: disposition -> (distances, kepoi_names), each (n_rows, k).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        results = {}
+        for disposition, index in self.indexes.items():
+            ids = self.ids[disposition]
+            extra = 1 if exclude is not None else 0
+            distances, rows = index.query(X, min(k + extra, len(ids)))
+            names = ids[rows]
+            if extra:
+                # Drop the self-match where there is one, otherwise the last neighbour
+                is_self = names == np.asarray(exclude)[:, None]
+                drop = np.where(is_self.any(axis=1), is_self.argmax(axis=1), names.shape[1] - 1)
+                keep = np.arange(names.shape[1])[None, :] != drop[:, None]
+                distances = distances[keep].reshape(len(X), -1)
+                names = names[keep].reshape(len(X), -1)
+            results[disposition] = (distances, names)
+        return results
+
+    def matches(self, preprocessing):
+        """True when the index was built with this preprocessing's scaler."""
+        return self.scaler_mean is not None and np.array_equal(self.scaler_mean, preprocessing['scaler'].mean_)
+
+    def save(self, path=os.path.join(MODELS_DIR, NEIGHBOUR_INDEX_FILE)):
+        joblib.dump(self, path)
+
+
+def labelled_rows(store, catalog_path='kepler/kepler_raw.csv'):
+    """
+    Rows of the feature store with a CONFIRMED or FALSE POSITIVE disposition.
+
+    Dispositions come from the raw catalog, joined on the store's row ids
+    (kepoi_name).
+
+    Returns:
+        tuple: (row numbers, kepoi_names, dispositions)
+    """
+    catalog = pd.read_csv(catalog_path, usecols=['kepoi_name', 'koi_disposition'])
+    disposition = pd.Series(store.row_ids).map(catalog.set_index('kepoi_name')['koi_disposition'])
+    rows = np.flatnonzero(disposition.isin(DISPOSITIONS).to_numpy())
+    return rows, store.row_ids[rows], disposition.to_numpy()[rows]
+
+
+def build_index(store, preprocessing, kind='balltree', **options):
+    """
+    NeighbourIndex over the labelled KOIs of the feature store.
+
+    Args:
+        store (FeatureStore): Engineered features (feature_store.py).
+        preprocessing (dict): As returned by load_artifacts().
+        kind (str): 'balltree', 'brute' or 'approx'.
+        **options: leaf_size (trees), variance and candidates (approx).
+
+    Returns:
+        NeighbourIndex
+    """
+    rows, ids, dispositions = labelled_rows(store)
+    X = transform_features(store.frame(rows=rows), preprocessing)
+    return NeighbourIndex(X, ids, dispositions, kind=kind,
+                          scaler_mean=preprocessing['scaler'].mean_.copy(), **options)
+
+
+def load_index(path=os.path.join(MODELS_DIR, NEIGHBOUR_INDEX_FILE)):
+    return joblib.load(path)
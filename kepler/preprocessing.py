@@ -0,0 +1,155 @@
+"""
+Model Preprocessing
+Cleaning statistics, scaling and model persistence shared by the training stages
+
+Script 4 cleans the engineered features (inf -> NaN -> median, clip to the
+0.1%/99.9% quantiles) and standardizes them before training. The statistics
+behind those steps are fitted once, saved next to the models in
+kepler/models/, and re-applied unchanged by any later stage that scores or
+updates the models.
+"""
+import os
+import re
+
+import joblib
+import numpy as np
+import pandas as pd
+
+MODELS_DIR = 'kepler/models'
+PREPROCESSING_FILE = 'preprocessing.joblib'
+DRIFT_REFERENCE_FILE = 'drift_reference.json'
+
+CLIP_QUANTILES = (0.001, 0.999)
+
+
+def fit_cleaning(X, profile=None):
+    """
+    Computes the cleaning statistics for a feature frame.
+
+    Args:
+        X (pd.DataFrame): Engineered features (no target column).
+        profile (DataProfile): Optional profile of X (profiler.py). The
+            statistics are then read from it instead of scanning X; they are
+            identical either way.
+
+    Returns:
+        dict: columns, medians and clip bounds per column.
+    """
+    if profile is not None:
+        return _cleaning_from_profile(profile.select(list(X.columns)))
+
+    X = X.replace([np.inf, -np.inf], np.nan)
+    medians = X.median()
+    X = X.fillna(medians)
+    low, high = CLIP_QUANTILES
+    return {
+        'columns': list(X.columns),
+        'medians': medians,
+        'clip_low': X.quantile(low),
+        'clip_high': X.quantile(high),
+    }
+
+
+def _cleaning_from_profile(profile):
+    """fit_cleaning() statistics from a profile: inf and NaN rows count as the median."""
+    columns = list(profile.columns)
+    medians = profile.medians(columns)
+    low, high = CLIP_QUANTILES
+    clip_low, clip_high = {}, {}
+    for col in columns:
+        filled = (medians[col], profile.null_count(col) + profile.inf_count(col))
+        clip_low[col] = profile.quantile(col, low, fill=filled)
+        clip_high[col] = profile.quantile(col, high, fill=filled)
+    return {
+        'columns': columns,
+        'medians': medians,
+        'clip_low': pd.Series(clip_low, dtype=np.float64),
+        'clip_high': pd.Series(clip_high, dtype=np.float64),
+    }
+
+
+def apply_cleaning(X, cleaning):
+    """
+    Replaces inf, fills NaN with the fitted medians and clips to the fitted bounds.
+
+    Args:
+        X (pd.DataFrame): Engineered features with the fitted columns.
+        cleaning (dict): Output of fit_cleaning().
+
+    Returns:
+        pd.DataFrame: Cleaned copy of X.
+    """
+    X = X[cleaning['columns']].replace([np.inf, -np.inf], np.nan)
+    X = X.fillna(cleaning['medians'])
+    return X.clip(cleaning['clip_low'], cleaning['clip_high'], axis=1)
+
+
+def transform_features(X, preprocessing):
+    """
+    Cleans and scales engineered features with saved preprocessing.
+
+    Args:
+        X (pd.DataFrame): Engineered features.
+        preprocessing (dict): As returned by load_artifacts().
+
+    Returns:
+        np.ndarray: Scaled feature matrix, columns in training order.
+    """
+    return preprocessing['scaler'].transform(apply_cleaning(X, preprocessing['cleaning']))
+
+
+def mean_shift(X, scaler):
+    """
+    Standardized shift of each feature's mean against the fitted scaler.
+
+    Args:
+        X (pd.DataFrame): Cleaned features.
+        scaler (StandardScaler): Scaler fitted on the training data.
+
+    Returns:
+        pd.Series: |mean(X) - scaler.mean_| / scaler.scale_ per feature.
+    """
+    shift = np.abs(X.mean().values - scaler.mean_) / scaler.scale_
+    return pd.Series(shift, index=X.columns)
+
+
+def model_filename(name):
+    """File name for a model, e.g. 'Random Forest' -> 'random_forest.joblib'."""
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_') + '.joblib'
+
+
+def save_artifacts(models, preprocessing, best_model, models_dir=MODELS_DIR, drift_reference=None):
+    """
+    Persists fitted models and the preprocessing they were trained with.
+
+    Args:
+        models (dict): Model name -> fitted estimator.
+        preprocessing (dict): columns, cleaning stats, scaler and split rows.
+        best_model (str): Name of the best model.
+        models_dir (str): Output directory.
+        drift_reference (DriftReference): Optional training histograms
+            (drift_monitor.py), saved as drift_reference.json.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    preprocessing = dict(preprocessing, best_model=best_model,
+                         model_files={name: model_filename(name) for name in models})
+    joblib.dump(preprocessing, os.path.join(models_dir, PREPROCESSING_FILE))
+    for name, model in models.items():
+        joblib.dump(model, os.path.join(models_dir, model_filename(name)))
+    if drift_reference is not None:
+        drift_reference.save(os.path.join(models_dir, DRIFT_REFERENCE_FILE))
+
+
+def load_artifacts(models_dir=MODELS_DIR):
+    """
+    Loads what save_artifacts() wrote.
+
+    Returns:
+        tuple: (models dict, preprocessing dict)
+    """
+    preprocessing = joblib.load(os.path.join(models_dir, PREPROCESSING_FILE))
+    models = {
+        name: joblib.load(os.path.join(models_dir, filename))
+        for name, filename in preprocessing['model_files'].items()
+    }
+    return models, preprocessing
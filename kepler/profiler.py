@@ -0,0 +1,444 @@
+"""
+Data-Quality Profiler
+Null/inf counts, moments, quantiles and distinct counts in one pass per stage
+
+profile_frame() walks a DataFrame once, in row chunks. Each chunk's numeric
+block is handled as a single 2-D array: one isnan/isinf mask, column-wise
+min/max/sum, and one column-wise sort that yields every column's distinct
+values and their counts. Chunk profiles are merged exactly: counts add,
+means and variances combine with Chan's parallel formula, and the value
+counts are merged by value, so quantiles, medians and distinct counts are
+exact rather than sketched (memory grows with the number of distinct
+values, which for the KOI catalog is at most the row count).
+
+Profiles are saved as a readable JSON summary plus an .npz of the value
+counts (see DataProfile.save()), so later stages read null/inf counts,
+medians and clip quantiles from the artifact instead of rescanning:
+script 2 writes kepler/raw_profile.json, script 3 writes
+kepler/engineered_profile.json and script 4 fits its cleaning statistics
+from it.
+
+Medians and quantiles reproduce pandas' Series.median()/quantile() exactly
+(same interpolation arithmetic; for float32 columns the median's midpoint
+is taken in float32, as pandas does), so statistics fitted from a profile
+are identical to the ones fitted from the data.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Rows per chunk in profile_frame() (bounds the temporary mask arrays)
+CHUNK_ROWS = 65536
+
+# Quantiles listed in the JSON summary (any quantile can be computed on load)
+SUMMARY_QUANTILES = (0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999)
+
+
+def _merge_counts(values_a, counts_a, values_b, counts_b):
+    """Merges two sorted (value, count) tables."""
+    values, inverse = np.unique(np.concatenate([values_a, values_b]), return_inverse=True)
+    counts = np.bincount(inverse.reshape(-1), weights=np.concatenate([counts_a, counts_b]),
+                         minlength=len(values))
+    return values, counts.astype(np.int64)
+
+
+def _merge_numeric(a, b):
+    """Combines the statistics of two disjoint row sets."""
+    n = a['count'] + b['count']
+    merged = {
+        'kind': 'numeric',
+        'nulls': a['nulls'] + b['nulls'],
+        'pos_inf': a['pos_inf'] + b['pos_inf'],
+        'neg_inf': a['neg_inf'] + b['neg_inf'],
+        'count': n,
+        'min': np.fmin(a['min'], b['min']),
+        'max': np.fmax(a['max'], b['max']),
+        'dtype': a.get('dtype', 'float64'),
+    }
+    if a['count'] == 0 or b['count'] == 0:
+        merged['mean'], merged['m2'] = (b['mean'], b['m2']) if a['count'] == 0 else (a['mean'], a['m2'])
+    else:
+        delta = b['mean'] - a['mean']
+        merged['mean'] = a['mean'] + delta * b['count'] / n
+        merged['m2'] = a['m2'] + b['m2'] + delta ** 2 * a['count'] * b['count'] / n
+    merged['values'], merged['counts'] = _merge_counts(a['values'], a['counts'],
+                                                       b['values'], b['counts'])
+    return merged
+
+
+def _profile_numeric_block(A):
+    """
+    Statistics for every column of a 2-D float block in one vectorized pass.
+
+    Returns:
+        list: One statistics dict per column.
+    """
+    is_nan = np.isnan(A)
+    is_inf = np.isinf(A)
+    finite = ~(is_nan | is_inf)
+    n = finite.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(finite, A, 0.0).sum(axis=0) / n
+        m2 = (np.where(finite, A - mean, 0.0) ** 2).sum(axis=0)
+    # NaN sorts last, so each column's finite values are its first n entries
+    ordered = np.sort(np.where(finite, A, np.nan), axis=0)
+
+    columns = []
+    for j in range(A.shape[1]):
+        values = ordered[:n[j], j]
+        if len(values):
+            starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+            counts = np.diff(np.r_[starts, len(values)])
+            values = values[starts]
+        else:
+            counts = np.empty(0, dtype=np.int64)
+        columns.append({
+            'kind': 'numeric',
+            'nulls': int(is_nan[:, j].sum()),
+            'pos_inf': int((is_inf[:, j] & (A[:, j] > 0)).sum()),
+            'neg_inf': int((is_inf[:, j] & (A[:, j] < 0)).sum()),
+            'count': int(n[j]),
+            'mean': mean[j] if n[j] else np.nan,
+            'm2': m2[j] if n[j] else 0.0,
+            'min': values[0] if len(values) else np.nan,
+            'max': values[-1] if len(values) else np.nan,
+            'values': values,
+            'counts': counts.astype(np.int64),
+        })
+    return columns
+
+
+def _lerp(a, b, t):
+    """numpy's linear interpolation (exact arithmetic of np.quantile)."""
+    with np.errstate(invalid='ignore'):  # inf - inf when both ends are infinite
+        diff_b_a = b - a
+    if t >= 0.5:
+        return b - diff_b_a * (1 - t)
+    return a + diff_b_a * t
+
+
+class DataProfile:
+    """
+    Per-column data-quality statistics of a table.
+
+    Numeric columns keep null/inf counts, finite count, min/max, mean, the
+    sum of squared deviations, the sorted distinct finite values with
+    their counts and the dtype the median is computed in ('float32' for
+    float32 columns, else 'float64'). Other columns keep null and distinct
+    counts.
+    """
+
+    def __init__(self, rows, columns):
+        self.rows = int(rows)
+        self.columns = columns  # column name -> statistics dict
+
+    # ------------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------------
+
+    @classmethod
+    def from_chunk(cls, df):
+        """Profiles one chunk of rows."""
+        numeric = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+        stats = dict(zip(numeric, _profile_numeric_block(df[numeric].to_numpy(dtype=np.float64))))
+
+        columns = {}
+        for col in df.columns:
+            if col in stats:
+                columns[col] = stats[col]
+                columns[col]['dtype'] = 'float32' if df[col].dtype == np.float32 else 'float64'
+            else:
+                present = df[col].dropna()
+                columns[col] = {'kind': 'other', 'nulls': int(len(df) - len(present)),
+                                'distinct_values': set(present.unique())}
+        return cls(len(df), columns)
+
+    def merge(self, other):
+        """
+        Profile of the rows of both profiles (same columns, disjoint rows).
+
+        Returns:
+            DataProfile
+        """
+        if list(self.columns) != list(other.columns):
+            raise ValueError("Profiles with different columns cannot be merged")
+        columns = {}
+        for col, a in self.columns.items():
+            b = other.columns[col]
+            if a['kind'] != b['kind']:
+                raise ValueError(f"Column {col} is numeric in one profile only")
+            if a['kind'] == 'numeric':
+                columns[col] = _merge_numeric(a, b)
+            elif 'distinct_values' not in a or 'distinct_values' not in b:
+                raise ValueError(f"Loaded profiles keep no distinct values for {col}")
+            else:
+                columns[col] = {'kind': 'other', 'nulls': a['nulls'] + b['nulls'],
+                                'distinct_values': a['distinct_values'] | b['distinct_values']}
+        return DataProfile(self.rows + other.rows, columns)
+
+    def with_columns(self, other):
+        """Adds the columns of a profile of the same rows (other wins on clashes)."""
+        if other.rows != self.rows:
+            raise ValueError("Profiles describe different rows")
+        return DataProfile(self.rows, {**self.columns, **other.columns})
+
+    def select(self, columns):
+        """Profile restricted to the given columns, in that order."""
+        return DataProfile(self.rows, {col: self.columns[col] for col in columns})
+
+    def filled(self, fill_values):
+        """
+        Profile of the same rows after fillna(fill_values), without a rescan.
+
+        Args:
+            fill_values (dict or pd.Series): Column -> value for its NaNs.
+
+        Returns:
+            DataProfile
+        """
+        columns = dict(self.columns)
+        for col, value in dict(fill_values).items():
+            stats = columns[col]
+            if stats['kind'] != 'numeric' or stats['nulls'] == 0 or np.isnan(value):
+                continue
+            constant = _profile_numeric_block(np.full((stats['nulls'], 1), float(value)))[0]
+            merged = _merge_numeric(dict(stats, nulls=0), constant)
+            columns[col] = merged
+        return DataProfile(self.rows, columns)
+
+    def as_float32(self):
+        """
+        Profile of the same rows after casting numeric columns to float32.
+
+        Distinct values that round to the same float32 are merged and values
+        beyond the float32 range become +/-inf, exactly as the cast does.
+        """
+        columns = dict(self.columns)
+        for col in self.numeric_columns:
+            stats = self.columns[col]
+            with np.errstate(over='ignore'):
+                rounded = stats['values'].astype(np.float32).astype(np.float64)
+            finite = np.isfinite(rounded)
+            values, inverse = np.unique(rounded[finite], return_inverse=True)
+            counts = np.bincount(inverse.reshape(-1), weights=stats['counts'][finite],
+                                 minlength=len(values)).astype(np.int64)
+            n = int(counts.sum())
+            mean = (values * counts).sum() / n if n else np.nan
+            columns[col] = dict(
+                stats, dtype='float32', values=values, counts=counts, count=n, mean=mean,
+                m2=(counts * (values - mean) ** 2).sum() if n else 0.0,
+                min=values[0] if n else np.nan, max=values[-1] if n else np.nan,
+                pos_inf=stats['pos_inf'] + int(stats['counts'][rounded == np.inf].sum()),
+                neg_inf=stats['neg_inf'] + int(stats['counts'][rounded == -np.inf].sum()))
+        return DataProfile(self.rows, columns)
+
+    # ------------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------------
+
+    @property
+    def numeric_columns(self):
+        return [col for col, stats in self.columns.items() if stats['kind'] == 'numeric']
+
+    def null_count(self, col):
+        return self.columns[col]['nulls']
+
+    def null_pct(self, col):
+        return self.columns[col]['nulls'] / self.rows * 100 if self.rows else 0.0
+
+    def inf_count(self, col):
+        stats = self.columns[col]
+        return stats.get('pos_inf', 0) + stats.get('neg_inf', 0)
+
+    def distinct(self, col):
+        stats = self.columns[col]
+        if stats['kind'] == 'numeric':
+            return len(stats['values']) + (stats['pos_inf'] > 0) + (stats['neg_inf'] > 0)
+        if 'distinct_values' in stats:
+            return len(stats['distinct_values'])
+        return stats['distinct']
+
+    def std(self, col):
+        """Sample standard deviation of the finite values (ddof=1, as pandas)."""
+        stats = self.columns[col]
+        return np.sqrt(stats['m2'] / (stats['count'] - 1)) if stats['count'] > 1 else np.nan
+
+    def _sorted_counts(self, col, include_inf, fill):
+        stats = self.columns[col]
+        values, counts = stats['values'], stats['counts']
+        if include_inf:
+            values = np.r_[-np.inf, values, np.inf]
+            counts = np.r_[stats['neg_inf'], counts, stats['pos_inf']]
+        if fill is not None and fill[1] > 0 and not np.isnan(fill[0]):
+            values, counts = _merge_counts(values, counts, np.array([fill[0]]), np.array([fill[1]]))
+        keep = counts > 0
+        return values[keep], counts[keep]
+
+    def _value_at(self, values, cumulative, rank):
+        return values[np.searchsorted(cumulative, rank, side='right')]
+
+    def quantile(self, col, q, include_inf=False, fill=None):
+        """
+        Linear-interpolated quantile, identical to pandas Series.quantile(q).
+
+        Args:
+            col (str): Numeric column.
+            q (float): Quantile in [0, 1].
+            include_inf (bool): Rank +/-inf values too (pandas does; they are
+                excluded by default).
+            fill (tuple): Optional (value, count) extra entries, e.g. the
+                median filled into count missing rows.
+
+        Returns:
+            float: NaN when the column has no values.
+        """
+        values, counts = self._sorted_counts(col, include_inf, fill)
+        n = int(counts.sum())
+        if n == 0:
+            return np.nan
+        cumulative = np.cumsum(counts)
+        # Same virtual index and interpolation as np.quantile(method='linear')
+        index = (n - 1) * q
+        index = min(max(index, 0), n - 1)
+        below = np.floor(index)
+        above = min(below + 1, n - 1)
+        return _lerp(self._value_at(values, cumulative, below),
+                     self._value_at(values, cumulative, above), index - below)
+
+    def median(self, col, include_inf=False, fill=None):
+        """Median, identical to pandas Series.median() on a column of the profiled dtype."""
+        values, counts = self._sorted_counts(col, include_inf, fill)
+        n = int(counts.sum())
+        if n == 0:
+            return np.nan
+        cumulative = np.cumsum(counts)
+        middle = self._value_at(values, cumulative, n // 2)
+        if n % 2:
+            return middle
+        # np.median averages the two middle values, in the column's dtype
+        pair = np.array([self._value_at(values, cumulative, n // 2 - 1), middle],
+                        dtype=self.columns[col].get('dtype', 'float64'))
+        return float(np.mean(pair))
+
+    def medians(self, columns=None, include_inf=False):
+        """pd.Series of medians, for fillna()."""
+        columns = self.numeric_columns if columns is None else columns
+        return pd.Series({col: self.median(col, include_inf=include_inf) for col in columns},
+                         dtype=np.float64)
+
+    def total_nulls(self, columns=None):
+        columns = self.columns if columns is None else columns
+        return sum(self.columns[col]['nulls'] for col in columns)
+
+    def total_infs(self, columns=None):
+        columns = self.columns if columns is None else columns
+        return sum(self.inf_count(col) for col in columns)
+
+    def matches(self, df):
+        """True when the profile describes a frame with df's shape and columns."""
+        return self.rows == len(df) and list(self.columns) == list(df.columns)
+
+    # ------------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------------
+
+    def summary(self):
+        """JSON-serializable per-column summary."""
+        def clean(value):
+            value = float(value)
+            return None if np.isnan(value) else value
+
+        columns = {}
+        for col, stats in self.columns.items():
+            entry = {'kind': stats['kind'], 'nulls': int(stats['nulls']),
+                     'null_pct': self.null_pct(col), 'distinct': int(self.distinct(col))}
+            if stats['kind'] == 'numeric':
+                entry.update({
+                    'dtype': stats.get('dtype', 'float64'),
+                    'pos_inf': int(stats['pos_inf']),
+                    'neg_inf': int(stats['neg_inf']),
+                    'count': int(stats['count']),
+                    'min': clean(stats['min']),
+                    'max': clean(stats['max']),
+                    'mean': clean(stats['mean']),
+                    'std': clean(self.std(col)),
+                    'quantiles': {str(q): clean(self.quantile(col, q)) for q in SUMMARY_QUANTILES},
+                })
+            columns[col] = entry
+        return {'rows': self.rows, 'columns': columns}
+
+    def save(self, path):
+        """
+        Writes the JSON summary to path and the value counts next to it (.npz).
+
+        Args:
+            path (str): e.g. 'kepler/engineered_profile.json'.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        arrays = {}
+        for i, col in enumerate(self.numeric_columns):
+            stats = self.columns[col]
+            arrays[f'values_{i}'] = stats['values']
+            arrays[f'counts_{i}'] = stats['counts']
+            arrays[f'moments_{i}'] = np.array([stats['mean'], stats['m2']])
+        np.savez_compressed(os.path.splitext(path)[0] + '.npz', **arrays)
+
+
+def load_profile(path):
+    """
+    Reads a profile written by DataProfile.save().
+
+    Returns:
+        DataProfile
+    """
+    with open(path) as f:
+        summary = json.load(f)
+    arrays = np.load(os.path.splitext(path)[0] + '.npz')
+
+    columns = {}
+    numeric_index = 0
+    for col, entry in summary['columns'].items():
+        if entry['kind'] == 'numeric':
+            mean, m2 = arrays[f'moments_{numeric_index}']
+            columns[col] = {
+                'kind': 'numeric', 'nulls': entry['nulls'], 'pos_inf': entry['pos_inf'],
+                'neg_inf': entry['neg_inf'], 'count': entry['count'],
+                'min': np.nan if entry['min'] is None else entry['min'],
+                'max': np.nan if entry['max'] is None else entry['max'],
+                'mean': mean, 'm2': m2, 'dtype': entry.get('dtype', 'float64'),
+                'values': arrays[f'values_{numeric_index}'],
+                'counts': arrays[f'counts_{numeric_index}'],
+            }
+            numeric_index += 1
+        else:
+            columns[col] = {'kind': 'other', 'nulls': entry['nulls'], 'distinct': entry['distinct']}
+    return DataProfile(summary['rows'], columns)
+
+
+def profile_frame(df, chunk_rows=CHUNK_ROWS):
+    """
+    Profiles a DataFrame chunk by chunk.
+
+    Args:
+        df (pd.DataFrame): Table to profile.
+        chunk_rows (int): Rows per chunk.
+
+    Returns:
+        DataProfile
+    """
+    profile = DataProfile.from_chunk(df.iloc[:chunk_rows])
+    for start in range(chunk_rows, len(df), chunk_rows):
+        profile = profile.merge(DataProfile.from_chunk(df.iloc[start:start + chunk_rows]))
+    return profile
+
+
+def profile_csv(path, chunk_rows=CHUNK_ROWS, **read_csv_kwargs):
+    """Profiles a CSV without loading it whole."""
+    profile = None
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, **read_csv_kwargs):
+        chunk_profile = DataProfile.from_chunk(chunk)
+        profile = chunk_profile if profile is None else profile.merge(chunk_profile)
+    return profile
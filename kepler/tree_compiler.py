@@ -0,0 +1,341 @@
+"""
+Compiled Tree Ensemble Predictor
+Flattens a trained forest/boosting ensemble into contiguous node arrays
+
+sklearn's predict_proba on RandomForestClassifier/GradientBoostingClassifier
+spends most of a single-row call on input validation and per-estimator
+Python dispatch (and thread start-up for n_jobs=-1 forests). compile_model()
+copies every tree into one struct-of-arrays node table:
+
+    feature[n]    int32    split feature (0 for leaves)
+    threshold[n]  float64  split threshold (+inf for leaves)
+    left[n]       int32    global index of the left child; the right child is
+                           left + 1 (leaves point to themselves)
+    value[n, k]   float64  leaf output (class fractions for forests, raw stage
+                           value for boosting)
+    roots[t]      int32    root node of each tree
+
+Nodes are renumbered breadth-first so siblings are adjacent, which makes one
+step down every tree a single expression:
+
+    nodes = left[nodes] + (x[feature[nodes]] > threshold[nodes])
+
+Leaves loop back to themselves (x > inf is never true), so every row can be
+pushed down all trees for max_depth steps with no masking. predict_proba()
+does that for a whole batch at once; predict_proba_one() is the short path
+for one row: it walks Python-list copies of the node table, since for a
+few dozen trees plain list indexing beats numpy's per-call overhead.
+
+The win is per-call overhead, not raw traversal speed: for batches past a
+few thousand rows sklearn's Cython loops are faster again (script 8 reports
+the crossover), so use the compiled predictor for request-sized scoring.
+
+Results are bit-identical to sklearn: inputs are cast to float32 exactly as
+sklearn does, and tree outputs are accumulated in tree order with the same
+arithmetic (forest: sum then divide by n_trees; boosting: init +
+learning_rate * value per stage, then expit). Forests fitted with n_jobs != 1
+sum their trees in thread order, so sklearn itself can differ from its own
+n_jobs=1 result in the last ulp; compare against n_jobs=1.
+
+model_format.py stores the same tables in a smaller, memory-mappable file
+(narrower dtypes, deduplicated leaf values) and loads them back as
+CompiledEnsemble objects without copying.
+"""
+import numpy as np
+from scipy.special import expit
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+
+from cv_engine import FoldEnsemble
+
+# Rows pushed through the trees at once by predict_proba (bounds the
+# (rows x trees) index arrays)
+BATCH_ROWS = 16384
+
+
+def _breadth_first_order(tree):
+    """
+    Node order that places every pair of siblings next to each other.
+
+    Returns:
+        np.ndarray: order[new_index] = original node index
+    """
+    order = [0]
+    children_left, children_right = tree.children_left, tree.children_right
+    for node in order:  # the list grows while we walk it
+        if children_left[node] != -1:
+            order.append(children_left[node])
+            order.append(children_right[node])
+    return np.asarray(order)
+
+
+def tree_leaf_values(estimator, kind):
+    """Leaf outputs of one fitted tree in the form its ensemble adds them up."""
+    tree = estimator.tree_
+    if kind == 'boosting':
+        return tree.value[:, 0, :1]
+    value = tree.value[:, 0, :estimator.n_classes_]
+    # Older sklearn stores class counts and normalizes in predict_proba;
+    # newer versions already store fractions
+    totals = value.sum(axis=1, keepdims=True)
+    if not np.allclose(totals, 1.0):
+        totals[totals == 0.0] = 1.0
+        value = value / totals
+    return value
+
+
+def ensemble_spec(model):
+    """
+    What a compiled form needs from a fitted sklearn ensemble.
+
+    Args:
+        model: Fitted RandomForestClassifier or binary GradientBoostingClassifier.
+
+    Returns:
+        tuple: (kind, list of fitted trees, init_raw, learning_rate)
+    """
+    if isinstance(model, RandomForestClassifier):
+        return 'forest', list(model.estimators_), 0.0, 1.0
+
+    if isinstance(model, GradientBoostingClassifier):
+        if model.n_trees_per_iteration_ != 1:
+            raise ValueError("Only binary GradientBoostingClassifier models can be compiled")
+        if model.init_ == 'zero':
+            init_raw = 0.0
+        elif getattr(model.init_, 'strategy', None) == 'prior':
+            # Prior-based init is the same constant for every row
+            dummy_row = np.zeros((1, model.n_features_in_), dtype=np.float32)
+            init_raw = model._raw_predict_init(dummy_row)[0, 0]
+        else:
+            raise ValueError("Only 'zero' or prior init estimators can be compiled")
+        return 'boosting', list(model.estimators_[:, 0]), init_raw, model.learning_rate
+
+    raise TypeError(f"Cannot compile {type(model).__name__}")
+
+
+class CompiledEnsemble:
+    """
+    Flat-array form of a fitted RandomForestClassifier or binary
+    GradientBoostingClassifier.
+
+    Arrays are used as given (no copies), so they may be read-only views of
+    a memory-mapped file. When leaf_value is set, value is a deduplicated
+    table and a leaf's output is value[leaf_value[node]].
+    """
+
+    def __init__(self, kind, classes, feature, threshold, left, value, roots,
+                 max_depth, n_features, init_raw=0.0, learning_rate=1.0, leaf_value=None):
+        self.kind = kind
+        self.classes_ = np.asarray(classes)
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        self.left = np.asarray(left)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots)
+        self.leaf_value = None if leaf_value is None else np.asarray(leaf_value)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.init_raw = float(init_raw)
+        self.learning_rate = float(learning_rate)
+        self._node_lists = None
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Compiles a fitted sklearn ensemble.
+
+        Args:
+            model: Fitted RandomForestClassifier or GradientBoostingClassifier.
+
+        Returns:
+            CompiledEnsemble
+        """
+        kind, estimators, init_raw, learning_rate = ensemble_spec(model)
+
+        features, thresholds, lefts, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            order = _breadth_first_order(tree)
+            new_index = np.empty(tree.node_count, dtype=np.int64)
+            new_index[order] = np.arange(tree.node_count) + offset
+
+            is_leaf = tree.children_left[order] == -1
+            features.append(np.where(is_leaf, 0, tree.feature[order]))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+            lefts.append(np.where(is_leaf, new_index[order], new_index[tree.children_left[order]]))
+            values.append(tree_leaf_values(estimator, kind)[order])
+            roots.append(offset)
+
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+
+        return cls(kind, model.classes_,
+                   np.concatenate(features).astype(np.int32),
+                   np.concatenate(thresholds),
+                   np.concatenate(lefts).astype(np.int32),
+                   np.concatenate(values),
+                   np.asarray(roots, dtype=np.int32), max_depth, model.n_features_in_,
+                   init_raw=init_raw, learning_rate=learning_rate)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _leaf_output(self, nodes):
+        """Leaf outputs for an array of leaf node indices."""
+        if self.leaf_value is None:
+            return self.value[nodes]
+        return self.value[self.leaf_value[nodes]]
+
+    def _check_input(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected shape (n_rows, {self.n_features}), got {X.shape}")
+        return X
+
+    def leaves(self, X):
+        """
+        Leaf node reached in every tree.
+
+        Args:
+            X (np.ndarray): float32 features, shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: Global leaf indices, shape (n_rows, n_trees).
+        """
+        n_rows, n_features = X.shape
+        X_flat = np.ascontiguousarray(X).ravel()
+        row_start = (np.arange(n_rows, dtype=np.int32) * n_features)[:, np.newaxis]
+        feature, threshold, left = self.feature, self.threshold, self.left
+
+        nodes = np.repeat(self.roots[np.newaxis, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            go_right = np.take(X_flat, np.take(feature, nodes) + row_start) > np.take(threshold, nodes)
+            nodes = np.take(left, nodes)
+            nodes += go_right
+        return nodes
+
+    def _raw_from_leaves(self, leaves):
+        """Boosting score: init + learning_rate * stage value, stage by stage."""
+        raw = np.full(leaves.shape[0], self.init_raw)
+        scale = self.learning_rate
+        for t in range(leaves.shape[1]):
+            raw += scale * self._leaf_output(leaves[:, t])[:, 0]
+        return raw
+
+    def _proba_from_leaves(self, leaves):
+        """Accumulates leaf outputs tree by tree, in sklearn's order."""
+        if self.kind == 'forest':
+            proba = np.zeros((leaves.shape[0], self.value.shape[1]))
+            for t in range(leaves.shape[1]):
+                proba += self._leaf_output(leaves[:, t])
+            proba /= leaves.shape[1]
+            return proba
+
+        raw = self._raw_from_leaves(leaves)
+        proba = np.empty((leaves.shape[0], 2))
+        proba[:, 1] = expit(raw)
+        proba[:, 0] = 1 - proba[:, 1]
+        return proba
+
+    def predict_proba(self, X):
+        """Class probabilities for a batch, identical to the sklearn model."""
+        X = self._check_input(X)
+        if X.shape[0] <= BATCH_ROWS:
+            return self._proba_from_leaves(self.leaves(X))
+        return np.concatenate([
+            self._proba_from_leaves(self.leaves(X[start:start + BATCH_ROWS]))
+            for start in range(0, X.shape[0], BATCH_ROWS)
+        ])
+
+    def predict_proba_one(self, x):
+        """
+        Class probabilities for a single row, skipping the batch bookkeeping.
+
+        Args:
+            x (array-like): One row of n_features values.
+
+        Returns:
+            np.ndarray: Probabilities, shape (n_classes,).
+        """
+        if self._node_lists is None:
+            self._node_lists = (self.feature.tolist(), self.threshold.tolist(),
+                                self.left.tolist(), self.roots.tolist())
+        feature, threshold, left, roots = self._node_lists
+        # float32 -> Python float is exact, so comparisons match the batch path
+        x = np.asarray(x, dtype=np.float32).reshape(-1).tolist()
+
+        nodes = []
+        for node in roots:
+            while left[node] != node:
+                node = left[node] + (x[feature[node]] > threshold[node])
+            nodes.append(node)
+
+        # cumsum adds strictly left to right, matching the per-tree accumulation
+        outputs = self._leaf_output(np.asarray(nodes))
+        if self.kind == 'forest':
+            return np.cumsum(outputs, axis=0)[-1] / len(nodes)
+        stages = self.learning_rate * outputs[:, 0]
+        stages[0] += self.init_raw
+        p = expit(np.cumsum(stages)[-1])
+        return np.array([1 - p, p])
+
+    def predict(self, X):
+        if self.kind == 'boosting':
+            # GradientBoostingClassifier thresholds the raw score at 0
+            raw = self._raw_from_leaves(self.leaves(self._check_input(X)))
+            return self.classes_[(raw >= 0).astype(int)]
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class CompiledFoldEnsemble:
+    """Compiled counterpart of cv_engine.FoldEnsemble (same averaging order)."""
+
+    def __init__(self, members):
+        self.members = list(members)
+        self.classes_ = self.members[0].classes_
+
+    def predict_proba(self, X):
+        proba = self.members[0].predict_proba(X)
+        for member in self.members[1:]:
+            proba = proba + member.predict_proba(X)
+        return proba / len(self.members)
+
+    def predict_proba_one(self, x):
+        proba = self.members[0].predict_proba_one(x)
+        for member in self.members[1:]:
+            proba = proba + member.predict_proba_one(x)
+        return proba / len(self.members)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def members(model):
+    """Fitted estimators of a model: the fold models of a FoldEnsemble, else the model itself."""
+    return model.fold_models if isinstance(model, FoldEnsemble) else [model]
+
+
+def is_compilable(model):
+    """True when every member is a fitted tree ensemble compile_model() accepts."""
+    return all(hasattr(m, 'estimators_') for m in members(model))
+
+
+def compile_model(model):
+    """
+    Compiles a fitted forest, boosting model, or fold ensemble of either.
+
+    Args:
+        model: RandomForestClassifier, GradientBoostingClassifier or FoldEnsemble.
+
+    Returns:
+        CompiledEnsemble or CompiledFoldEnsemble
+    """
+    if isinstance(model, FoldEnsemble):
+        return CompiledFoldEnsemble([CompiledEnsemble.from_sklearn(m) for m in model.fold_models])
+    return CompiledEnsemble.from_sklearn(model)
@@ -0,0 +1,207 @@
+"""
+Monte Carlo Uncertainty
+Exoplanet probability distributions from the catalog's asymmetric error bars
+
+Script 2 leaves the *_err1 / *_err2 columns out of the features, so a
+score on its own says nothing about how much it depends on noisy inputs.
+Here every candidate is perturbed N times within its error bars. Each
+perturbed copy is engineered (features.py) and scored like any other row.
+The spread of the N probabilities is the candidate's uncertainty.
+
+Each measured value is taken as the median of a split normal: err1 is the
+distance to the 84th percentile and |err2| the distance to the 16th, the
+NASA Exoplanet Archive convention. A draw is value + z * err1 for z >= 0
+and value + z * |err2| for z < 0, with z standard normal. Magnitudes with a
+single *_err are symmetric. Values without an error bar stay fixed. Draws
+are clipped to the physical range of the quantity (e.g. eccentricity in
+[0, 1], radii and periods non-negative).
+
+All draws of a chunk of candidates are stacked into one frame, so feature
+engineering, cleaning, scaling and the model each run once per chunk.
+Candidates per chunk are chosen so a chunk holds at most `max_batch` draws,
+which bounds memory whatever the catalog size or N (N itself may not exceed
+`max_batch`).
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import BASE_FEATURES, engineer_features
+from instrumentation import span
+from preprocessing import transform_features
+
+DEFAULT_DRAWS = 200
+
+# Rows (candidates x draws) scored per chunk; about 100 MB of features at 100k
+DEFAULT_MAX_BATCH = 100_000
+
+# Physical range of perturbed quantities
+PHYSICAL_BOUNDS = {
+    'koi_eccen': (0.0, 1.0),
+    'koi_incl': (0.0, 90.0),
+    **{col: (0.0, np.inf) for col in [
+        'koi_period', 'koi_sma', 'koi_duration', 'koi_depth', 'koi_ror', 'koi_prad', 'koi_impact',
+        'koi_teq', 'koi_insol', 'koi_dor', 'koi_steff', 'koi_srad', 'koi_smass',
+    ]},
+}
+
+SUMMARY_QUANTILES = [0.05, 0.16, 0.5, 0.84, 0.95]
+
+# Columns of MonteCarloScorer.summarize()
+SUMMARY_COLUMNS = (['probability_nominal', 'probability_mean', 'probability_std']
+                   + [f'probability_q{int(q * 100):02d}' for q in SUMMARY_QUANTILES]
+                   + ['fraction_exoplanet'])
+
+
+def error_columns(columns):
+    """
+    Error bars available for each base feature.
+
+    Args:
+        columns: Columns of the raw catalog.
+
+    Returns:
+        dict: feature -> (upper error column, lower error column); both are
+            the same column for symmetric errors.
+    """
+    columns = set(columns)
+    errors = {}
+    for feature in BASE_FEATURES:
+        if f'{feature}_err1' in columns and f'{feature}_err2' in columns:
+            errors[feature] = (f'{feature}_err1', f'{feature}_err2')
+        elif f'{feature}_err' in columns:
+            errors[feature] = (f'{feature}_err', f'{feature}_err')
+    return errors
+
+
+def split_normal_draws(values, sigma_plus, sigma_minus, n_draws, rng, low=None, high=None):
+    """
+    Perturbed copies of a value matrix.
+
+    Args:
+        values (np.ndarray): (n_rows, n_features) medians.
+        sigma_plus, sigma_minus (np.ndarray): Upper / lower 1-sigma distances,
+            same shape, non-negative (0 = no perturbation).
+        n_draws (int): Copies per row.
+        rng (np.random.Generator): Random source.
+        low, high (np.ndarray): Optional per-feature bounds.
+
+    Returns:
+        np.ndarray: (n_draws, n_rows, n_features)
+    """
+    z = rng.standard_normal((n_draws,) + values.shape)
+    draws = values + z * np.where(z >= 0, sigma_plus, sigma_minus)
+    if low is not None:
+        np.clip(draws, low, high, out=draws)
+    return draws
+
+
+class MonteCarloScorer:
+    """
+    Scores candidates many times within their error bars.
+
+    Args:
+        model: Fitted model with predict_proba (sklearn, fold ensemble or compiled).
+        preprocessing (dict): As returned by load_artifacts().
+        n_draws (int): Perturbed copies per candidate (at least 1).
+        max_batch (int): Upper bound on candidates x draws scored at once;
+            must be at least n_draws, since a chunk holds whole candidates.
+        random_state (int): Seed.
+    """
+
+    def __init__(self, model, preprocessing, n_draws=DEFAULT_DRAWS, max_batch=DEFAULT_MAX_BATCH, random_state=42):
+        if n_draws < 1 or max_batch < 1:
+            raise ValueError(f"n_draws ({n_draws}) and max_batch ({max_batch}) must be at least 1")
+        if n_draws > max_batch:
+            raise ValueError(f"n_draws ({n_draws}) exceeds max_batch ({max_batch})")
+        self.model = model
+        self.preprocessing = preprocessing
+        self.n_draws = n_draws
+        self.chunk_rows = max_batch // n_draws
+        self.rng = np.random.default_rng(random_state)
+        self._positive = list(model.classes_).index(1)
+        self.timings = {'draw': 0.0, 'engineer': 0.0, 'model': 0.0}
+
+    def _probability(self, base):
+        """Positive-class probability of raw base-feature rows."""
+        start = time.perf_counter()
+        with span('engineer_draws', rows=len(base)):
+            engineer_features(base, verbose=False)
+            X = transform_features(base.fillna(self.preprocessing['cleaning']['medians']), self.preprocessing)
+        self.timings['engineer'] += time.perf_counter() - start
+        start = time.perf_counter()
+        with span('score_draws', rows=len(X)):
+            proba = self.model.predict_proba(X)[:, self._positive]
+        self.timings['model'] += time.perf_counter() - start
+        return proba
+
+    def draws(self, raw):
+        """
+        Probability of every draw of every candidate, chunk by chunk.
+
+        Args:
+            raw (pd.DataFrame): Candidates in kepler_raw.csv format.
+
+        Yields:
+            tuple: (row slice of raw, (chunk rows, n_draws) probabilities)
+        """
+        errors = error_columns(raw.columns)
+        perturbed = [f for f in BASE_FEATURES if f in errors]
+        fixed = [f for f in BASE_FEATURES if f not in errors]
+        low = np.array([PHYSICAL_BOUNDS.get(f, (-np.inf, np.inf))[0] for f in perturbed])
+        high = np.array([PHYSICAL_BOUNDS.get(f, (-np.inf, np.inf))[1] for f in perturbed])
+
+        for start in range(0, len(raw), self.chunk_rows):
+            chunk = raw.iloc[start:start + self.chunk_rows]
+            n = len(chunk)
+            t0 = time.perf_counter()
+            with span('draw', rows=n, draws=self.n_draws):
+                values = chunk[perturbed].to_numpy(dtype=np.float64)
+                plus = np.nan_to_num(np.abs(chunk[[errors[f][0] for f in perturbed]].to_numpy(dtype=np.float64)))
+                minus = np.nan_to_num(np.abs(chunk[[errors[f][1] for f in perturbed]].to_numpy(dtype=np.float64)))
+                drawn = split_normal_draws(values, plus, minus, self.n_draws, self.rng, low, high)
+                # Draw-major rows: row d * n + i is draw d of candidate i
+                base = pd.DataFrame(drawn.reshape(-1, len(perturbed)), columns=perturbed)
+                for f in fixed:
+                    base[f] = np.tile(chunk[f].to_numpy(), self.n_draws)
+                base = base[BASE_FEATURES]
+            self.timings['draw'] += time.perf_counter() - t0
+            yield slice(start, start + n), self._probability(base).reshape(self.n_draws, n).T
+
+    def nominal(self, raw):
+        """Probability of the unperturbed candidates."""
+        return self._probability(raw[BASE_FEATURES].copy())
+
+    def summarize(self, raw, keep_draws=False):
+        """
+        Probability distribution summary per candidate.
+
+        Args:
+            raw (pd.DataFrame): Candidates in kepler_raw.csv format.
+            keep_draws (bool): Also return every draw (n_candidates x n_draws
+                float32; memory grows with the catalog).
+
+        Returns:
+            tuple: (pd.DataFrame with the nominal probability, mean, std,
+                quantiles and the fraction of draws classified as
+                exoplanets, one row per candidate (SUMMARY_COLUMNS; empty
+                for no candidates); draws or None)
+        """
+        parts = []
+        all_draws = np.empty((len(raw), self.n_draws), dtype=np.float32) if keep_draws else None
+        for rows, proba in self.draws(raw):
+            chunk = raw.iloc[rows]
+            quantiles = np.quantile(proba, SUMMARY_QUANTILES, axis=1)
+            parts.append(pd.DataFrame({
+                'probability_nominal': self.nominal(chunk),
+                'probability_mean': proba.mean(axis=1),
+                'probability_std': proba.std(axis=1),
+                **{f'probability_q{int(q * 100):02d}': quantiles[j] for j, q in enumerate(SUMMARY_QUANTILES)},
+                'fraction_exoplanet': (proba >= 0.5).mean(axis=1),
+            }, index=chunk.index))
+            if keep_draws:
+                all_draws[rows] = proba
+        if not parts:
+            return pd.DataFrame(columns=SUMMARY_COLUMNS, index=raw.index, dtype=np.float64), all_draws
+        return pd.concat(parts), all_draws
@@ -1,6 +1,9 @@
 const express = require("express");
 const path = require("path");
 
+// Importar rutas
+const candidatesRoutes = require("./routes/candidatesRoutes");
+
 const app = express();
 const PORT = 3000;
 
@@ -15,6 +18,8 @@ app.set("views", viewsPath);
 app.use(express.static(publicPath));
 
 // Rutas
+app.use("/", candidatesRoutes);
+
 app.get("/", (req, res) => {
   res.render("dashboard"); // Renderiza views/dashboard.ejs
 });
@@ -0,0 +1,216 @@
+const fs = require("fs");
+const path = require("path");
+
+// Columnar candidate store written by kepler/10_score_candidates.py
+// (kepler/candidate_store.py). Every file is read once into a typed array;
+// queries walk the precomputed sort indexes instead of sorting per request.
+
+const DEFAULT_STORE_DIR = path.join(__dirname, "..", "..", "kepler", "candidate_store");
+const MISSING_CODE = 255;
+
+// Short names accepted by the API for the columns users filter and sort on
+const ALIASES = {
+  probability: "exoplanet_probability",
+  period: "koi_period",
+  radius: "koi_prad",
+  disposition: "koi_disposition",
+  name: "kepoi_name",
+};
+
+// Typed view of a little-endian file; copies when the buffer is misaligned
+function readTyped(file, Type) {
+  const buf = fs.readFileSync(file);
+  if (buf.byteOffset % Type.BYTES_PER_ELEMENT === 0) {
+    return new Type(buf.buffer, buf.byteOffset, buf.length / Type.BYTES_PER_ELEMENT);
+  }
+  return new Type(new Uint8Array(buf).buffer);
+}
+
+class QueryError extends Error {}
+
+class CandidateStore {
+  constructor(dir) {
+    this.dir = dir;
+    this.meta = JSON.parse(fs.readFileSync(path.join(dir, "meta.json"), "utf8"));
+    this.rows = this.meta.rows;
+    this.columns = {};
+    for (const col of this.meta.columns) {
+      const column = { ...col };
+      if (col.type === "float64") {
+        column.values = readTyped(path.join(dir, col.file), Float64Array);
+      } else if (col.type === "category") {
+        column.values = readTyped(path.join(dir, col.file), Uint8Array);
+      } else {
+        column.offsets = readTyped(path.join(dir, col.offsets), Uint32Array);
+        column.data = fs.readFileSync(path.join(dir, col.data));
+      }
+      this.columns[col.name] = column;
+    }
+    this.sortIndexes = {};
+    for (const [name, index] of Object.entries(this.meta.sort_indexes)) {
+      this.sortIndexes[name] = {
+        order: readTyped(path.join(dir, index.file), Uint32Array),
+        valid: index.valid,
+      };
+    }
+  }
+
+  // Column name from an API name (alias or full name)
+  resolve(name) {
+    const column = ALIASES[name] || name;
+    return this.columns[column] ? column : null;
+  }
+
+  value(column, i) {
+    const col = this.columns[column];
+    if (col.type === "float64") {
+      const v = col.values[i];
+      return Number.isNaN(v) ? null : v;
+    }
+    if (col.type === "category") {
+      const code = col.values[i];
+      return code === MISSING_CODE ? null : col.categories[code];
+    }
+    return col.data.toString("utf8", col.offsets[i], col.offsets[i + 1]);
+  }
+
+  row(i) {
+    const out = {};
+    for (const name of Object.keys(this.columns)) out[name] = this.value(name, i);
+    return out;
+  }
+
+  /**
+   * Validates query parameters into a query plan.
+   *
+   * params: disposition=A,B; min_<col>/max_<col> (col may be an alias, e.g.
+   * min_probability=0.9); sort=<col>; order=asc|desc.
+   */
+  plan(params) {
+    const sort = this.resolve(params.sort || "probability");
+    if (!sort || !this.sortIndexes[sort]) throw new QueryError(`Cannot sort by '${params.sort}'`);
+    const order = params.order || (params.sort ? "asc" : "desc");
+    if (order !== "asc" && order !== "desc") throw new QueryError(`order must be asc or desc`);
+
+    const ranges = {};
+    for (const [key, raw] of Object.entries(params)) {
+      const match = /^(min|max)_(.+)$/.exec(key);
+      if (!match) continue;
+      const column = this.resolve(match[2]);
+      if (!column || this.columns[column].type !== "float64") throw new QueryError(`Cannot filter on '${match[2]}'`);
+      const bound = Number(raw);
+      if (raw === "" || Number.isNaN(bound)) throw new QueryError(`${key} must be a number`);
+      ranges[column] = ranges[column] || [-Infinity, Infinity];
+      ranges[column][match[1] === "min" ? 0 : 1] = bound;
+    }
+
+    const categories = {};
+    for (const [key, raw] of Object.entries(params)) {
+      const column = this.resolve(key);
+      if (!column || this.columns[column].type !== "category") continue;
+      const allowed = new Uint8Array(256);
+      for (const value of String(raw).split(",")) {
+        const code = this.columns[column].categories.indexOf(value.trim());
+        if (code < 0) throw new QueryError(`Unknown ${key} '${value.trim()}'`);
+        allowed[code] = 1;
+      }
+      categories[column] = allowed;
+    }
+    return { sort, order, ranges, categories };
+  }
+
+  // Stable key of a plan; a cursor is only valid for the plan it came from
+  key(plan) {
+    const ranges = Object.keys(plan.ranges).sort().map(c => [c, plan.ranges[c]]);
+    const categories = Object.keys(plan.categories).sort().map(c => [c, Array.from(plan.categories[c].keys()).filter(k => plan.categories[c][k])]);
+    return JSON.stringify([this.meta.created_at, plan.sort, plan.order, ranges, categories]);
+  }
+
+  encodeCursor(plan, position) {
+    return Buffer.from(JSON.stringify({ k: this.key(plan), p: position })).toString("base64url");
+  }
+
+  decodeCursor(plan, cursor) {
+    let state;
+    try {
+      state = JSON.parse(Buffer.from(cursor, "base64url").toString("utf8"));
+    } catch (err) {
+      throw new QueryError("Malformed cursor");
+    }
+    if (state.k !== this.key(plan)) throw new QueryError("Cursor belongs to another query or an older store");
+    return state.p;
+  }
+
+  // First position in [0, valid) of the ascending index with value >= bound (or > bound)
+  lowerBound(index, values, bound, strict) {
+    let lo = 0;
+    let hi = index.valid;
+    while (lo < hi) {
+      const mid = (lo + hi) >>> 1;
+      const v = values[index.order[mid]];
+      if (v < bound || (strict && v === bound)) lo = mid + 1;
+      else hi = mid;
+    }
+    return lo;
+  }
+
+  /**
+   * Yields the row numbers of one page in sort order and returns the cursor
+   * of the next page (null after the last one).
+   *
+   * Positions run over the sort index in the requested direction, missing
+   * values last either way. A range filter on the sort column narrows the
+   * positions by binary search; other filters are checked per row.
+   */
+  *scan(plan, cursor, limit) {
+    const index = this.sortIndexes[plan.sort];
+    const n = this.rows;
+    const desc = plan.order === "desc";
+    let start = 0;
+    let end = n;
+
+    const checks = [];
+    for (const [column, [min, max]] of Object.entries(plan.ranges)) {
+      const values = this.columns[column].values;
+      if (column === plan.sort) {
+        // Matching rows form one run [a, b) of the ascending index
+        const a = this.lowerBound(index, values, min, false);
+        const b = this.lowerBound(index, values, max, true);
+        start = desc ? index.valid - b : a;
+        end = desc ? index.valid - a : b;
+        continue;
+      }
+      checks.push(i => values[i] >= min && values[i] <= max);
+    }
+    for (const [column, allowed] of Object.entries(plan.categories)) {
+      const values = this.columns[column].values;
+      checks.push(i => allowed[values[i]] === 1);
+    }
+
+    let position = cursor ? Math.max(start, this.decodeCursor(plan, cursor)) : start;
+    let emitted = 0;
+    for (; position < end && emitted < limit; position++) {
+      let i;
+      if (position >= index.valid) i = index.order[position];
+      else i = index.order[desc ? index.valid - 1 - position : position];
+      if (checks.every(check => check(i))) {
+        emitted++;
+        yield i;
+      }
+    }
+    return position < end ? this.encodeCursor(plan, position) : null;
+  }
+}
+
+let cached = null;
+
+// Store loaded from dir, reloaded when script 10 rewrites it
+function loadStore(dir = process.env.CANDIDATE_STORE || DEFAULT_STORE_DIR) {
+  const stat = fs.statSync(path.join(dir, "meta.json"));
+  if (!cached || cached.dir !== dir || cached.mtimeMs !== stat.mtimeMs) {
+    cached = { dir, mtimeMs: stat.mtimeMs, store: new CandidateStore(dir) };
+  }
+  return cached.store;
+}
+
+module.exports = { CandidateStore, QueryError, loadStore, ALIASES };
@@ -1,4 +1,81 @@
+const CATALOG_PAGE_SIZE = 100;
+const CATALOG_COLUMNS = ["kepoi_name", "koi_disposition", "exoplanet_probability", "koi_period", "koi_prad"];
+
+// 🔹 Formatea un valor del catálogo para la tabla
+function formatCatalogValue(column, value) {
+  if (value === null || value === undefined) return "-";
+  if (column === "exoplanet_probability") return value.toFixed(3);
+  if (typeof value === "number") return value.toFixed(2);
+  return value;
+}
+
+// 🔹 Catálogo paginado en el servidor (/api/candidates): filtros, orden y cursor
+function initCatalog() {
+  const form = document.getElementById("catalogFilters");
+  const tableBody = document.getElementById("catalogBody");
+  const moreBtn = document.getElementById("catalogMore");
+  const status = document.getElementById("catalogStatus");
+  if (!form || !tableBody) return;
+
+  let query = null;
+  let nextCursor = null;
+  let loaded = 0;
+
+  function buildQuery() {
+    const params = new URLSearchParams({ limit: CATALOG_PAGE_SIZE });
+    new FormData(form).forEach((value, key) => {
+      if (value !== "") params.set(key, value);
+    });
+    return params;
+  }
+
+  async function loadPage(reset) {
+    if (reset) {
+      query = buildQuery();
+      nextCursor = null;
+      loaded = 0;
+    }
+    const params = new URLSearchParams(query);
+    if (nextCursor) params.set("cursor", nextCursor);
+
+    moreBtn.disabled = true;
+    const response = await fetch(`/api/candidates?${params}`);
+    const data = await response.json();
+    moreBtn.disabled = false;
+    if (!response.ok) {
+      status.textContent = data.error;
+      return;
+    }
+
+    if (reset) tableBody.innerHTML = ""; // Limpiar tabla
+    data.rows.forEach(candidate => {
+      const tr = document.createElement("tr");
+      CATALOG_COLUMNS.forEach(column => {
+        const td = document.createElement("td");
+        td.textContent = formatCatalogValue(column, candidate[column]);
+        td.classList.add("px-2", "py-1", "border-b", "border-planet", "text-space-star");
+        tr.appendChild(td);
+      });
+      tableBody.appendChild(tr);
+    });
+
+    loaded += data.rows.length;
+    nextCursor = data.next_cursor;
+    moreBtn.classList.toggle("hidden", !nextCursor);
+    status.textContent = `${loaded} candidates shown${nextCursor ? "" : " (end of results)"}`;
+  }
+
+  form.addEventListener("submit", e => {
+    e.preventDefault();
+    loadPage(true);
+  });
+  moreBtn.addEventListener("click", () => loadPage(false));
+  loadPage(true);
+}
+
 document.addEventListener("DOMContentLoaded", () => {
+  initCatalog();
+
   const tableBody = document.getElementById("manageCandidatesBody");
   const tempData = localStorage.getItem("tempCandidates");
 
@@ -0,0 +1,103 @@
+const express = require("express");
+const { loadStore, QueryError, ALIASES } = require("../models/candidateStore");
+const router = express.Router();
+
+const DEFAULT_LIMIT = 100;
+const MAX_LIMIT = 1000;             // JSON pages
+const MAX_STREAM_LIMIT = 1000000;   // NDJSON streams
+const LINES_PER_WRITE = 500;
+
+function getStore(res) {
+  try {
+    return loadStore();
+  } catch (err) {
+    res.status(503).json({ error: "Candidate store not found - run kepler/10_score_candidates.py" });
+    return null;
+  }
+}
+
+function parseLimit(raw, max) {
+  if (raw === undefined) return Math.min(DEFAULT_LIMIT, max);
+  const limit = Number(raw);
+  if (!Number.isInteger(limit) || limit < 1) throw new QueryError("limit must be a positive integer");
+  return Math.min(limit, max);
+}
+
+// Resolves once the response can take more data or the client has gone away
+function waitForDrain(res) {
+  return new Promise(resolve => {
+    const done = () => {
+      res.off("drain", done);
+      res.off("close", done);
+      resolve();
+    };
+    res.once("drain", done);
+    res.once("close", done);
+  });
+}
+
+const candidatesController = {
+  // Columns, sortable columns, value ranges and disposition counts (for building filters)
+  getMeta: (req, res) => {
+    const store = getStore(res);
+    if (!store) return;
+    res.json({
+      rows: store.rows,
+      created_at: store.meta.created_at,
+      columns: store.meta.columns.map(col => ({ name: col.name, type: col.type, categories: col.categories })),
+      sortable: Object.keys(store.sortIndexes),
+      ranges: store.meta.ranges,
+      category_counts: store.meta.category_counts,
+      aliases: ALIASES,
+    });
+  },
+
+  // One page of candidates: JSON by default, NDJSON with format=ndjson or Accept: application/x-ndjson
+  getCandidates: async (req, res) => {
+    const store = getStore(res);
+    if (!store) return;
+    const { limit, cursor, format, ...params } = req.query;
+    const ndjson = format === "ndjson" || (format === undefined && req.accepts(["json", "application/x-ndjson"]) === "application/x-ndjson");
+
+    let plan;
+    let maxRows;
+    try {
+      plan = store.plan(params);
+      maxRows = parseLimit(limit, ndjson ? MAX_STREAM_LIMIT : MAX_LIMIT);
+      if (cursor) store.decodeCursor(plan, cursor);
+    } catch (err) {
+      if (err instanceof QueryError) return res.status(400).json({ error: err.message });
+      throw err;
+    }
+
+    const scan = store.scan(plan, cursor, maxRows);
+    if (!ndjson) {
+      const rows = [];
+      let step = scan.next();
+      for (; !step.done; step = scan.next()) rows.push(store.row(step.value));
+      return res.json({ rows, next_cursor: step.value, sort: plan.sort, order: plan.order });
+    }
+
+    // Stream rows as they are found; the last line carries the next cursor
+    res.type("application/x-ndjson");
+    let lines = [];
+    let step = scan.next();
+    for (; !step.done; step = scan.next()) {
+      lines.push(JSON.stringify(store.row(step.value)));
+      if (lines.length === LINES_PER_WRITE) {
+        const flushed = res.write(lines.join("\n") + "\n");
+        lines = [];
+        if (!flushed) await waitForDrain(res);
+        if (res.destroyed) return;
+      }
+    }
+    lines.push(JSON.stringify({ next_cursor: step.value }));
+    res.end(lines.join("\n") + "\n");
+  },
+};
+
+// Rutas
+router.get("/api/candidates/meta", candidatesController.getMeta);
+router.get("/api/candidates", candidatesController.getCandidates);
+
+module.exports = router;